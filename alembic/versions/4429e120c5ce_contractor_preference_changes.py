@@ -0,0 +1,67 @@
+"""contractor preference changes
+
+Revision ID: 4429e120c5ce
+Revises: c962b6b151af
+Create Date: 2026-10-18 14:02:31.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '4429e120c5ce'
+down_revision: Union[str, None] = 'c962b6b151af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['contractor_profession_preferences', 'contractor_area_preferences']
+TRIGGERS = [
+    ('INSERT', 'NEW TABLE AS new_rows'),
+    ('UPDATE', 'NEW TABLE AS new_rows OLD TABLE AS old_rows'),
+    ('DELETE', 'OLD TABLE AS old_rows'),
+]
+
+
+def upgrade() -> None:
+    op.create_table('contractor_preference_changes',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('contractor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('xid', sa.BigInteger(), server_default=sa.text('pg_current_xact_id()::text::bigint'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_contractor_preference_changes_xid', 'contractor_preference_changes', ['xid'])
+    op.execute("""
+    CREATE OR REPLACE FUNCTION log_contractor_preference_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO contractor_preference_changes (contractor_id)
+            SELECT DISTINCT contractor_id FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            INSERT INTO contractor_preference_changes (contractor_id)
+            SELECT DISTINCT contractor_id FROM old_rows;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    for table in TABLES:
+        for event, transition in TRIGGERS:
+            op.execute(
+                f'CREATE OR REPLACE TRIGGER {table}_{event.lower()}_log AFTER {event} ON {table} '
+                f'REFERENCING {transition} FOR EACH STATEMENT '
+                'EXECUTE FUNCTION log_contractor_preference_change()'
+            )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for event, _ in TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_{event.lower()}_log ON {table}')
+    op.execute('DROP FUNCTION IF EXISTS log_contractor_preference_change()')
+    op.drop_index('ix_contractor_preference_changes_xid', table_name='contractor_preference_changes')
+    op.drop_table('contractor_preference_changes')
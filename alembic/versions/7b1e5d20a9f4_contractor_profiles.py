@@ -0,0 +1,123 @@
+"""contractor profiles
+
+Revision ID: 7b1e5d20a9f4
+Revises: 4429e120c5ce
+Create Date: 2026-10-18 16:40:12.220931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e5d20a9f4'
+down_revision: Union[str, None] = '4429e120c5ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['contractor_profession_preferences', 'contractor_area_preferences']
+TRIGGERS = [
+    ('INSERT', 'NEW TABLE AS new_rows'),
+    ('UPDATE', 'NEW TABLE AS new_rows OLD TABLE AS old_rows'),
+    ('DELETE', 'OLD TABLE AS old_rows'),
+]
+
+
+def upgrade() -> None:
+    op.create_table('contractor_profiles',
+    sa.Column('contractor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('professions', postgresql.ARRAY(sa.String()), nullable=True),
+    sa.Column('areas', postgresql.ARRAY(sa.String()), nullable=True),
+    sa.ForeignKeyConstraint(['contractor_id'], ['contractors.id'], initially='DEFERRED', deferrable=True),
+    sa.PrimaryKeyConstraint('contractor_id')
+    )
+    op.execute("""
+    CREATE OR REPLACE FUNCTION contractor_profile_of(
+        cid uuid, OUT professions varchar[], OUT areas varchar[]
+    ) AS $$
+        SELECT
+            (SELECT array_agg(DISTINCT w.profession)
+            FROM contractor_profession_preferences u JOIN work_units w ON w.id = u.work_unit_id
+            WHERE u.contractor_id = cid),
+            (SELECT array_agg(DISTINCT a.area)
+            FROM contractor_area_preferences a WHERE a.contractor_id = cid)
+    $$ LANGUAGE sql STABLE
+    """)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION sync_contractor_profiles(cids uuid[]) RETURNS void AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtextextended(cid::text, 0))
+        FROM (SELECT DISTINCT unnest(cids) AS cid ORDER BY 1) c;
+        DELETE FROM contractor_profiles WHERE contractor_id = ANY(cids);
+        INSERT INTO contractor_profiles (contractor_id, professions, areas)
+        SELECT c.cid, p.professions, p.areas
+        FROM (SELECT DISTINCT unnest(cids) AS cid) c, contractor_profile_of(c.cid) p
+        WHERE p.professions IS NOT NULL OR p.areas IS NOT NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION contractor_profiles_on_preferences() RETURNS trigger AS $$
+    DECLARE
+        cids uuid[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT contractor_id) INTO cids FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT contractor_id) INTO cids FROM old_rows;
+        ELSE
+            SELECT array_agg(contractor_id) INTO cids FROM (
+                SELECT contractor_id FROM new_rows UNION SELECT contractor_id FROM old_rows
+            ) r;
+        END IF;
+        IF cids IS NOT NULL THEN
+            PERFORM sync_contractor_profiles(cids);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+    CREATE OR REPLACE FUNCTION contractor_profiles_on_work_units() RETURNS trigger AS $$
+    DECLARE
+        cids uuid[];
+    BEGIN
+        SELECT array_agg(DISTINCT u.contractor_id) INTO cids
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN contractor_profession_preferences u ON u.work_unit_id = n.id
+        WHERE n.profession IS DISTINCT FROM o.profession;
+        IF cids IS NOT NULL THEN
+            PERFORM sync_contractor_profiles(cids);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        'CREATE OR REPLACE TRIGGER work_units_update_profile AFTER UPDATE ON work_units '
+        'REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows FOR EACH STATEMENT '
+        'EXECUTE FUNCTION contractor_profiles_on_work_units()'
+    )
+    for table in TABLES:
+        for event, transition in TRIGGERS:
+            op.execute(
+                f'CREATE OR REPLACE TRIGGER {table}_{event.lower()}_profile AFTER {event} ON {table} '
+                f'REFERENCING {transition} FOR EACH STATEMENT '
+                'EXECUTE FUNCTION contractor_profiles_on_preferences()'
+            )
+    op.execute('SELECT sync_contractor_profiles(ARRAY(SELECT id FROM contractors))')
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for event, _ in TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_{event.lower()}_profile ON {table}')
+    op.execute('DROP TRIGGER IF EXISTS work_units_update_profile ON work_units')
+    op.execute('DROP FUNCTION IF EXISTS contractor_profiles_on_work_units()')
+    op.execute('DROP FUNCTION IF EXISTS contractor_profiles_on_preferences()')
+    op.execute('DROP FUNCTION IF EXISTS sync_contractor_profiles(uuid[])')
+    op.execute('DROP FUNCTION IF EXISTS contractor_profile_of(uuid)')
+    op.drop_table('contractor_profiles')
@@ -0,0 +1,41 @@
+"""contractor rating changes
+
+Revision ID: b3f08c6e41d2
+Revises: 7b1e5d20a9f4
+Create Date: 2026-10-18 19:05:47.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f08c6e41d2'
+down_revision: Union[str, None] = '7b1e5d20a9f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION log_contractor_rating_change() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO contractor_preference_changes (contractor_id)
+        SELECT n.id FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.quality_rating, n.budget_rating, n.on_schedule_rating)
+            IS DISTINCT FROM (o.quality_rating, o.budget_rating, o.on_schedule_rating);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        'CREATE OR REPLACE TRIGGER contractors_update_log AFTER UPDATE ON contractors '
+        'REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows FOR EACH STATEMENT '
+        'EXECUTE FUNCTION log_contractor_rating_change()'
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS contractors_update_log ON contractors')
+    op.execute('DROP FUNCTION IF EXISTS log_contractor_rating_change()')
@@ -0,0 +1,62 @@
+"""fk and filter indexes
+
+Revision ID: c962b6b151af
+Revises: c78d3f33663e
+Create Date: 2026-10-18 10:12:44.120318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c962b6b151af'
+down_revision: Union[str, None] = 'c78d3f33663e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ('ix_booking_images_booking_id', 'booking_images', ['booking_id'], None),
+    ('ix_booking_units_booking_id', 'booking_units', ['booking_id'], None),
+    ('ix_bookings_homeowner_id', 'bookings', ['homeowner_id', 'created_at'], None),
+    ('ix_bookings_homeowner_id_open', 'bookings', ['homeowner_id'], 'is_active AND NOT is_booked'),
+    ('ix_booking_invites_contractor_id', 'booking_invites', ['contractor_id', 'accepted', 'rejected'], None),
+    ('ix_contractor_area_preferences_contractor_id', 'contractor_area_preferences', ['contractor_id'], None),
+    ('ix_contractor_profession_preferences_contractor_id', 'contractor_profession_preferences', ['contractor_id'], None),
+    ('ix_external_portfolio_images_portfolio_project_id', 'external_portfolio_images', ['portfolio_project_id'], None),
+    ('ix_external_portfolio_project_units_portfolio_project_id', 'external_portfolio_project_units', ['portfolio_project_id'], None),
+    ('ix_external_portfolio_projects_contractor_id', 'external_portfolio_projects', ['contractor_id'], None),
+    ('ix_quote_items_qoute_id', 'quote_items', ['qoute_id'], None),
+    ('ix_quote_items_booking_unit_id', 'quote_items', ['booking_unit_id'], None),
+    ('ix_material_units_quote_item_id', 'material_units', ['quote_item_id'], None),
+    ('ix_quotes_booking_id', 'quotes', ['booking_id'], None),
+    ('ix_quotes_booking_invite_id', 'quotes', ['booking_invite_id'], None),
+    ('ix_projects_contractor_id', 'projects', ['contractor_id'], None),
+    ('ix_project_images_booking_id', 'project_images', ['booking_id'], None),
+    ('ix_contractor_reviews_to_', 'contractor_reviews', ['to_'], None),
+    ('ix_homeowner_reviews_to_', 'homeowner_reviews', ['to_'], None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes build, it can't run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    for table in sorted({table for _, table, _, _ in INDEXES}):
+        op.execute(f'ANALYZE {table}')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,29 @@
+"""contractor review description scores
+
+Revision ID: e5a1c9d73b20
+Revises: b3f08c6e41d2
+Create Date: 2026-10-18 21:12:03.514207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c9d73b20'
+down_revision: Union[str, None] = 'b3f08c6e41d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'contractor_reviews',
+        sa.Column('description_scores', postgresql.ARRAY(sa.Float()), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('contractor_reviews', 'description_scores')
@@ -23,8 +23,8 @@ if config.ENV == 'prod':
     command.upgrade(alembic_cfg, "head")
     print("[migrations] done")
     print('[work units] initializing...')
-    DB().init_work_units()
-    print('[work units] done')
+    inserted = DB().init_work_units()
+    print(f'[work units] done, {inserted} new')
 
 if config.MOCK_DB:
     mocker = threading.Thread(target=mock_thread)
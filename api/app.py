@@ -5,7 +5,12 @@ from fastapi.staticfiles import StaticFiles
 import api.models as models  # noqa: F401
 from api.config import get_config
 from api.route import api
+from api.core.consistency import consistency_middleware
 from api.core.db import get_db
+from api.core.query_stats import query_stats_middleware
+from api.core import slow_query  # noqa: F401
+from api.core.review_scorer import get_review_scorer
+from api.models.matching import build_match_index
 
 
 def custom_generate_unique_id(route: APIRoute):
@@ -33,6 +38,11 @@ def start():
     def startup():
         db = get_db()
         db.init_db()
+        catalog = db.load_work_unit_catalog()
+        print(f"[work units] catalog loaded, {len(catalog)} units")
+        build_match_index(db.engine)
+        # loads the model now rather than on the first review
+        get_review_scorer()
 
         if config.ENV != "prod":
             import shutil
@@ -44,6 +54,15 @@ def start():
             os.makedirs(upload_dir)
         app.mount(f"{config.ROOT_PATH}/img", StaticFiles(directory="img"), name="static")
 
+    @app.on_event("shutdown")
+    async def shutdown():
+        await get_db().dispose_async()
+        scorer = get_review_scorer()
+        if scorer:
+            scorer.close(timeout=10)
 
+
+    app.middleware("http")(consistency_middleware)
+    app.middleware("http")(query_stats_middleware)
     app.include_router(api)
     return app
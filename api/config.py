@@ -1,7 +1,8 @@
 import os
+import tempfile
 from fastapi import Depends
 from pydantic import Field
-from typing import Annotated, Optional
+from typing import Annotated, Dict, Optional
 from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -27,8 +28,87 @@ class Config(BaseSettings):
     POSTGRES_PORT: int
     POSTGRES_HOST: str
 
+    # optional read replica for `ReadSessionDB` routes, same user/password/db as the primary
+    POSTGRES_REPLICA_HOST: Optional[str] = Field(default=None)
+    POSTGRES_REPLICA_PORT: int = Field(default=5432)
+    # how long a read carrying a consistency token waits for the replica before using the primary
+    REPLICA_MAX_WAIT_MS: int = Field(default=200)
+    REPLICA_POLL_MS: int = Field(default=20)
+
     API_PORT: int
 
+    # per engine and per uvicorn worker, the sync and async engines each get one pool
+    # size + overflow should stay under the anyio threadpool (40) and, summed over
+    # workers and engines, under Postgres max_connections
+    DB_POOL_SIZE: int = Field(default=10)
+    DB_POOL_MAX_OVERFLOW: int = Field(default=10)
+    DB_POOL_TIMEOUT: int = Field(default=30)
+    DB_POOL_RECYCLE: int = Field(default=1800)
+    DB_POOL_PRE_PING: bool = Field(default=True)
+
+    # per request SQL: warn past this many statements, or when one statement repeats this often
+    SQL_STATEMENT_BUDGET: int = Field(default=20)
+    SQL_REPEAT_THRESHOLD: int = Field(default=5)
+
+    # cached principals expire with the token's exp or this TTL, whichever is first. A user
+    # change only clears the worker that made it: the TTL is how long the others lag
+    AUTH_CACHE_SIZE: int = Field(default=10_000)
+    AUTH_CACHE_TTL_SECONDS: int = Field(default=60)
+
+    # bcrypt runs on its own pool: "thread" or "process"
+    PASSWORD_HASH_POOL: str = Field(default="thread")
+    PASSWORD_HASH_WORKERS: int = Field(default=2)
+    # waiting jobs beyond the running ones before /token sheds load with 503 (0 = unbounded)
+    PASSWORD_HASH_MAX_QUEUE: int = Field(default=64)
+
+    # mounts /internal/* (metrics, diagnostics), unauthenticated: only enable where the
+    # public ingress can't reach it
+    INTERNAL_ROUTES: bool = Field(default=False)
+
+    # statements slower than this land in LOGGER_FILE with their EXPLAIN plan (-1 disables)
+    SLOW_QUERY_MS: int = Field(default=500)
+    SLOW_QUERY_EXPLAIN: bool = Field(default=True)
+    SLOW_QUERY_LOG_MAX_BYTES: int = Field(default=10 * 1024 * 1024)
+    SLOW_QUERY_LOG_BACKUPS: int = Field(default=5)
+
+    # seconds between work unit catalog version checks, the catalog reloads when it changed
+    # (-1 never checks again after the first load)
+    WORK_UNIT_CATALOG_CHECK_SECONDS: int = Field(default=60)
+    # contractor_preference_changes rows older than this are pruned when the match index is built
+    MATCH_CHANGES_RETENTION_HOURS: int = Field(default=24)
+    # the match index's ratings are published here as memory-mapped files shared by the
+    # workers of a node, each new index maps the latest version unless it is older than
+    # half the retention (empty: every worker keeps its own copy)
+    MATCH_SNAPSHOT_DIR: str = Field(default=os.path.join(tempfile.gettempdir(), "match-index"))
+    # seconds between checks for a newer published version, the index is rebuilt on one
+    MATCH_SNAPSHOT_CHECK_SECONDS: int = Field(default=5)
+    # RecommendationEngine static vector for sort=recommended, added to each request's
+    # `weights` before the softmax, eg {"on_schedule_rating": 1} (empty: ratings weigh the same)
+    SEARCH_RANK_WEIGHTS: Dict[str, float] = Field(default={})
+
+    # trained RatingRegressor state dict (torch.save), contractor review descriptions are scored
+    # with it in the background after the review is saved (empty: no scoring)
+    REVIEW_SCORER_WEIGHTS: str = Field(default="")
+    # a batch runs once it has this many texts or its first text waited this long
+    REVIEW_SCORER_MAX_BATCH: int = Field(default=16)
+    REVIEW_SCORER_MAX_WAIT_MS: int = Field(default=20)
+    # torch / onnxruntime intra-op threads for the scoring batches
+    REVIEW_SCORER_THREADS: int = Field(default=2)
+    # "fp32", "int8" (dynamically quantized), "onnx", "onnx-int8" (need onnxruntime) or "auto":
+    # at startup each available one is timed and the fastest within REVIEW_SCORER_MAX_ERROR
+    # (max abs error against fp32) is kept, and saved with the exports for the other workers
+    REVIEW_SCORER_BACKEND: str = Field(default="auto")
+    REVIEW_SCORER_MAX_ERROR: float = Field(default=0.05)
+    # ONNX exports and the "auto" choice, one directory per weights file version
+    REVIEW_SCORER_EXPORT_DIR: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "review-scorer")
+    )
+    # texts waiting beyond this are dropped, their reviews stay unscored (0 = unbounded)
+    REVIEW_SCORER_MAX_QUEUE: int = Field(default=1024)
+
+    # /quiz is revalidated with its ETag once this is up
+    QUIZ_MAX_AGE_SECONDS: int = Field(default=300)
+
     LOGGER_FILE: str = Field(default="logs/backend.log")
     DATE_FORMAT: str = Field(default="%d %b %Y | %H:%M:%S")
     LOGGER_FORMAT: str = Field(default="%(asctime)s | %(message)s")
@@ -1,10 +1,28 @@
 from typing import Annotated
 from fastapi import Depends, Security
-from api.core.auth.utils import validate_token_scopes, validate_user_login
+from api.core.auth.cache import UserPrincipal
+from api.core.auth.utils import (
+    validate_token_scopes,
+    validate_token_scopes_async,
+    validate_user_login,
+)
 from api.models.user import User
 
 PasswordAuthUser = Annotated[User, Depends(validate_user_login)]
 
-TokenAuthContractor = Annotated[User, Security(validate_token_scopes, scopes=["contractor"])]
-TokenAuthHomeowner = Annotated[User, Security(validate_token_scopes, scopes=["homeowner"])]
-TokenAuthUser = Annotated[User, Security(validate_token_scopes, scopes=[])]
+TokenAuthContractor = Annotated[
+    UserPrincipal, Security(validate_token_scopes, scopes=["contractor"])
+]
+TokenAuthHomeowner = Annotated[
+    UserPrincipal, Security(validate_token_scopes, scopes=["homeowner"])
+]
+TokenAuthUser = Annotated[UserPrincipal, Security(validate_token_scopes, scopes=[])]
+
+# for async routes
+AsyncTokenAuthContractor = Annotated[
+    UserPrincipal, Security(validate_token_scopes_async, scopes=["contractor"])
+]
+AsyncTokenAuthHomeowner = Annotated[
+    UserPrincipal, Security(validate_token_scopes_async, scopes=["homeowner"])
+]
+AsyncTokenAuthUser = Annotated[UserPrincipal, Security(validate_token_scopes_async, scopes=[])]
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
+import threading
+import time
+from typing import Optional
+import uuid
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from api.config import get_config
+from api.models.user import User, UserRole
+
+
+class UserPrincipal(BaseModel):
+    """
+    Slim snapshot of the authenticated user, returned by the token dependencies
+    instead of the full `User` row
+    """
+
+    id: uuid.UUID
+    email: str
+    role: UserRole
+
+    @staticmethod
+    def from_user(user: User):
+        return UserPrincipal(id=user.id, email=user.email, role=user.role)
+
+
+@dataclass(frozen=True)
+class PrincipalEntry:
+    token_data: BaseModel
+    principal: UserPrincipal
+    expires_at: float
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of verified access tokens, keyed by the token's sha256 digest.
+
+    Entries live until the token's `exp` claim (or `ttl` seconds, whichever comes
+    first). A hit skips both the JWT decode and the `users` lookup.
+
+    Per process: a committed user change drops that process's entries only, other
+    workers keep serving theirs until `ttl`, which bounds how long a demoted or
+    deleted user's tokens still pass there.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, PrincipalEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[PrincipalEntry]:
+        key = PrincipalCache.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, token: str, token_data: BaseModel, principal: UserPrincipal, exp: int | None):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        key = PrincipalCache.digest(token)
+        with self._lock:
+            self._entries[key] = PrincipalEntry(token_data, principal, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, id: uuid.UUID | None = None, email: str | None = None):
+        """Drop every cached token that belongs to the user"""
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if entry.principal.id == id or entry.principal.email == email
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache()
+def get_principal_cache():
+    config = get_config()
+    return PrincipalCache(config.AUTH_CACHE_SIZE, config.AUTH_CACHE_TTL_SECONDS)
+
+
+# session.info key of the (id, email) of users changed by the session's transaction
+_CHANGED_USERS = "principal_cache_changed_users"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(_mapper, _connection, target: User):
+    # dropped at commit: dropped at flush, a request still reading the committed row could
+    # cache it again meanwhile
+    session = object_session(target)
+    if session is None:
+        get_principal_cache().invalidate(id=target.id, email=target.email)
+        return
+    session.info.setdefault(_CHANGED_USERS, []).append((target.id, target.email))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    for id, email in session.info.pop(_CHANGED_USERS, ()):
+        get_principal_cache().invalidate(id=id, email=email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session):
+    session.info.pop(_CHANGED_USERS, None)
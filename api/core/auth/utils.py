@@ -2,14 +2,16 @@ from datetime import datetime, timedelta
 from typing import Annotated
 import uuid
 from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
     SecurityScopes,
 )
 from jose import JWTError, jwt
-from api.core.db import SessionDB
-from api.core.utils import verify_password
+from api.core.auth.cache import UserPrincipal, get_principal_cache
+from api.core.db import AsyncSessionDB, SessionDB
+from api.core.utils import PasswordHasherBusy, verify_password_async
 from api.config import Config, SessionConfig, get_config
 from api.core.error import APIError
 from pydantic import BaseModel, validator, ValidationError
@@ -35,6 +37,7 @@ class TokenData(BaseModel):
     id: uuid.UUID
     email: str
     scopes: list[str] = []
+    exp: int | None = None
 
     @validator("id")
     def validate_id(cls, value):
@@ -52,7 +55,8 @@ class TokenData(BaseModel):
         email = payload.get("sub", None)
         id = payload.get("id", None)
         scope = payload.get("scopes", "")
-        return TokenData(email=email, id=uuid.UUID(id), scopes=scope.split())
+        exp = payload.get("exp", None)
+        return TokenData(email=email, id=uuid.UUID(id), scopes=scope.split(), exp=exp)
 
 
 def create_access_token(
@@ -65,40 +69,97 @@ def create_access_token(
     return jwt.encode(to_encode, config.JWT_SECRET, algorithm=config.JWT_ALGO)
 
 
-def validate_token_scopes(
-    security_scopes: SecurityScopes,
-    token: SessionToken,
-    config: SessionConfig,
-    db: SessionDB,
-) -> User:
+def _auth_header(security_scopes: SecurityScopes):
     if security_scopes.scopes:
-        auth_header = f'Bearer scope="{security_scopes.scope_str}'
-    else:
-        auth_header = "Bearer"
+        return f'Bearer scope="{security_scopes.scope_str}'
+    return "Bearer"
+
+
+def _decode_token(token: str, auth_header: str) -> TokenData:
     try:
-        token_data = TokenData.decode(token)
+        return TokenData.decode(token)
     except (JWTError, ValidationError) as e:
         print(f"JWT error: {e}")
         raise APIError.TokenException(auth_header)
 
-    user = User.by_email(token_data.email, db)
+
+def _cache_principal(token: str, token_data: TokenData, user: User | None, auth_header: str):
+    """The principal of `token`'s `user`, cached until the token expires"""
     if user is None:
         raise APIError.TokenException(auth_header)
     if user.id != token_data.id:
         raise APIError.TokenException(auth_header)
+    principal = UserPrincipal.from_user(user)
+    get_principal_cache().put(token, token_data, principal, token_data.exp)
+    return principal
+
+
+def _check_scopes(
+    security_scopes: SecurityScopes,
+    token_data: TokenData,
+    principal: UserPrincipal,
+    auth_header: str,
+) -> UserPrincipal:
     for scope in security_scopes.scopes:
         if scope not in token_data.scopes:
             raise APIError.TokenException(auth_header)
-        elif UserRole(scope) != user.role:
+        elif UserRole(scope) != principal.role:
             raise APIError.TokenException(auth_header)
-    return user
+    return principal
+
+
+def validate_token_scopes(
+    security_scopes: SecurityScopes,
+    token: SessionToken,
+    config: SessionConfig,
+    db: SessionDB,
+) -> UserPrincipal:
+    auth_header = _auth_header(security_scopes)
+    entry = get_principal_cache().get(token)
+    if entry is not None:
+        return _check_scopes(security_scopes, entry.token_data, entry.principal, auth_header)
+    token_data = _decode_token(token, auth_header)
+    user = User.by_email(token_data.email, db)
+    principal = _cache_principal(token, token_data, user, auth_header)
+    return _check_scopes(security_scopes, token_data, principal, auth_header)
 
 
-def validate_user_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: SessionDB):
-    user = User.by_email(form_data.username, db)
+async def validate_token_scopes_async(
+    security_scopes: SecurityScopes,
+    token: SessionToken,
+    config: SessionConfig,
+    db: AsyncSessionDB,
+) -> UserPrincipal:
+    """
+    `validate_token_scopes` for async routes: a cache hit never leaves the event
+    loop, a miss reads the user on the async engine instead of a threadpool
+    worker holding a sync connection
+    """
+    auth_header = _auth_header(security_scopes)
+    entry = get_principal_cache().get(token)
+    if entry is not None:
+        return _check_scopes(security_scopes, entry.token_data, entry.principal, auth_header)
+    token_data = _decode_token(token, auth_header)
+    user = await User.by_email_async(token_data.email, db)
+    principal = _cache_principal(token, token_data, user, auth_header)
+    return _check_scopes(security_scopes, token_data, principal, auth_header)
+
+
+async def validate_user_login(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: SessionDB
+):
+    """
+    Async so the bcrypt check awaits the hasher pool instead of parking an anyio
+    worker thread for its whole duration
+    """
+    user = await run_in_threadpool(User.by_email, form_data.username, db)
     if user is None:
         raise APIError.CredentialsException
-    if not verify_password(form_data.password, user.password):
+    try:
+        verified = await verify_password_async(form_data.password, user.password)
+    except PasswordHasherBusy:
+        raise APIError.PasswordHasherBusy
+    if not verified:
         raise APIError.CredentialsException
     if len(form_data.scopes) != 1:
         raise APIError.PermissionException
@@ -0,0 +1,70 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+import re
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlmodel import Session
+
+CONSISTENCY_HEADER = "X-Consistency-Token"
+
+_LSN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+
+@dataclass
+class RequestConsistency:
+    """
+    Per request read-your-writes state
+    - `token`: LSN the client last saw committed on the primary, if it sent one
+    - `committed`: whether this request committed anything on the primary
+    """
+
+    token: Optional[str] = None
+    committed: bool = False
+
+
+_current: ContextVar[Optional[RequestConsistency]] = ContextVar(
+    "request_consistency", default=None
+)
+
+
+def parse_token(token: Optional[str]):
+    """LSN string (`16/B374D848`) or None when missing or malformed"""
+    if token and _LSN.match(token):
+        return token.upper()
+    return None
+
+
+def current_token():
+    state = _current.get()
+    return state.token if state else None
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(_session):
+    state = _current.get()
+    if state is not None:
+        state.committed = True
+
+
+async def consistency_middleware(request: Request, call_next):
+    """
+    Reads `X-Consistency-Token` for `ReadSessionDB`, and after a request that
+    committed on the primary returns the primary's current WAL LSN in the same
+    header so the client's next read can wait for the replica to replay it
+    """
+    from api.core.db import get_db
+
+    # the state object is shared with the route (threadpool or task), so flags
+    # set there are visible here even though contextvar writes are not
+    state = RequestConsistency(token=parse_token(request.headers.get(CONSISTENCY_HEADER)))
+    reset = _current.set(state)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(reset)
+    if state.committed and response.status_code < 400:
+        async with get_db().async_engine.connect() as connection:
+            lsn = (await connection.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+        response.headers[CONSISTENCY_HEADER] = str(lsn)
+    return response
@@ -1,32 +1,120 @@
+import asyncio
+from collections import Counter
 from functools import lru_cache
+import time
 from pydantic import PostgresDsn
-from typing import Annotated, Any
+from typing import Annotated, Any, Optional
 from fastapi import Depends
 from sqlalchemy.ext.declarative import declarative_base
 from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from api.config import get_config
+from api.core.consistency import current_token
+from api.core.pool import MeteredAsyncQueuePool, MeteredQueuePool, PoolMetrics
+from api.models.quiz.catalog import refresh_work_unit_catalog
 from api.models.quiz.utils import create_work_units
 
 
 class DB:
     engine: Engine
-    
+    async_engine: AsyncEngine
+
     def __init__(self):
         config = get_config()
         db_url = PostgresDsn(
             f"postgresql://{config.POSTGRES_USER}:{config.POSTGRES_PASSWORD}@{config.POSTGRES_HOST}:5432/{config.POSTGRES_DB}"
         )
-        self.engine = (
-            create_engine(
-                db_url.unicode_string(),
-                echo=True,
+        pool = dict(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+        self.engine = create_engine(
+            db_url.unicode_string(),
+            echo=config.DEBUG,
+            poolclass=MeteredQueuePool,
+            **pool,
+        )
+        # same database thru asyncpg, used by the async read routes
+        async_db_url = db_url.unicode_string().replace(
+            "postgresql://", "postgresql+asyncpg://", 1
+        )
+        self.async_engine = create_async_engine(
+            async_db_url,
+            echo=config.DEBUG,
+            poolclass=MeteredAsyncQueuePool,
+            **pool,
+        )
+        PoolMetrics("sync").attach(self.engine.pool)
+        PoolMetrics("async").attach(self.async_engine.sync_engine.pool)
+
+        # optional streaming replica, only `ReadSessionDB` routes use it
+        self.read_engine = None
+        if config.POSTGRES_REPLICA_HOST:
+            replica_url = PostgresDsn(
+                f"postgresql+asyncpg://{config.POSTGRES_USER}:{config.POSTGRES_PASSWORD}@{config.POSTGRES_REPLICA_HOST}:{config.POSTGRES_REPLICA_PORT}/{config.POSTGRES_DB}"
             )
-            if config.DEBUG
-            else create_engine(
-                db_url.unicode_string(),
+            self.read_engine = create_async_engine(
+                replica_url.unicode_string(),
+                echo=config.DEBUG,
+                poolclass=MeteredAsyncQueuePool,
+                **pool,
             )
-        )
+            PoolMetrics("replica").attach(self.read_engine.sync_engine.pool)
+        self.read_routing = Counter()
+
+    def pool_stats(self):
+        engines = [self.async_engine, self.read_engine]
+        pools = [self.engine.pool] + [e.sync_engine.pool for e in engines if e is not None]
+        return [pool.metrics.stats(pool) for pool in pools]
+
+    async def dispose_async(self):
+        # asyncpg connections are bound to the event loop that opened them
+        await self.async_engine.dispose()
+        if self.read_engine is not None:
+            await self.read_engine.dispose()
+
+    async def replica_caught_up(self, lsn: str):
+        query = text("SELECT pg_last_wal_replay_lsn() >= CAST(CAST(:lsn AS text) AS pg_lsn)")
+        async with self.read_engine.connect() as connection:
+            # NULL when the "replica" is not in recovery, never treat it as caught up
+            return bool((await connection.execute(query, {"lsn": lsn})).scalar())
+
+    async def read_engine_for(self, token: Optional[str]):
+        """
+        Engine a read should go to
+        - no replica configured: the primary
+        - no consistency token: the replica
+        - token: the replica once it replayed the token's LSN, polling for up to
+        REPLICA_MAX_WAIT_MS, otherwise the primary
+        """
+        if self.read_engine is None:
+            return self.async_engine
+        config = get_config()
+        try:
+            if token is None:
+                self.read_routing["replica"] += 1
+                return self.read_engine
+            deadline = time.monotonic() + config.REPLICA_MAX_WAIT_MS / 1000
+            while True:
+                if await self.replica_caught_up(token):
+                    self.read_routing["replica_after_wait"] += 1
+                    return self.read_engine
+                if time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(config.REPLICA_POLL_MS / 1000)
+            self.read_routing["primary_lagging"] += 1
+        except (OSError, DBAPIError) as e:
+            print(f"[replica] unreachable, reading from primary: {e}")
+            self.read_routing["primary_unreachable"] += 1
+        return self.async_engine
+
     def create_base(self):
         import api.models as models  # noqa: F401
         base = declarative_base()
@@ -43,11 +131,20 @@ class DB:
             SQLModel.metadata.drop_all(self.engine)
             SQLModel.metadata.create_all(self.engine)
             models.WorkUnit.init_table(self.engine)
+            models.ContractorPreferenceChange.init_table(self.engine)
+            models.ContractorProfile.init_table(self.engine)
             self.init_work_units()
 
     def init_work_units(self):
         with Session(self.engine) as db:
-            create_work_units(db)
+            inserted = create_work_units(db)
+            # ids change when the table is recreated, don't keep serving the old ones
+            refresh_work_unit_catalog(db, force=True)
+            return inserted
+
+    def load_work_unit_catalog(self):
+        with Session(self.engine) as db:
+            return refresh_work_unit_catalog(db)
 
 @lru_cache()
 def get_db():
@@ -60,3 +157,20 @@ def get_session_db():
 
 
 SessionDB = Annotated[Session, Depends(get_session_db)]
+
+
+async def get_async_session_db():
+    async with AsyncSession(get_db().async_engine, autoflush=False) as session:
+        yield session
+
+
+AsyncSessionDB = Annotated[AsyncSession, Depends(get_async_session_db)]
+
+
+async def get_read_session_db():
+    engine = await get_db().read_engine_for(current_token())
+    async with AsyncSession(engine, autoflush=False) as session:
+        yield session
+
+
+ReadSessionDB = Annotated[AsyncSession, Depends(get_read_session_db)]
@@ -25,6 +25,12 @@ class APIError:
                 headers={"WWW-Authenticate": header},
             )
 
+    PasswordHasherBusy = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins or signups, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
     SignupException = HTTPException(
         status_code=status.HTTP_400_BAD_REQUEST,
         detail="Email already registered",
@@ -43,6 +49,25 @@ class APIError:
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    InvalidSearchCursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid search cursor, or one made for another sort",
+    )
+
+    InvalidSearchWeights = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=(
+            "Search weights must look like quality_rating:2,on_schedule_rating:1, "
+            "each between -100 and 100"
+        ),
+    )
+
+    QuizBranchNotFound = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="No such area, location, category or subcategory in the quiz",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
     HomeownerNotFound = HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Homeowner not found",
@@ -0,0 +1,48 @@
+import argparse
+import sys
+from sqlmodel import Session
+from api.core.db import get_db
+from api.models.contractor import ContractorProfile
+
+
+def check(db: Session, fix: bool = False, show: int = 10):
+    """
+    Compares every contractor's stored profile with the one computed from its
+    preferences, prints the drifted ones and, with `fix`, recomputes them.
+    Returns the number of drifted contractors
+    """
+    drifted = ContractorProfile.drift(db)
+    for cid, professions, areas, expected_professions, expected_areas in drifted[:show]:
+        print(f"[contractor profiles] {cid}")
+        if professions != expected_professions:
+            print(f"   professions {professions} expected {expected_professions}")
+        if areas != expected_areas:
+            print(f"   areas {areas} expected {expected_areas}")
+    if len(drifted) > show:
+        print(f"[contractor profiles] ... and {len(drifted) - show} more")
+    if drifted and fix:
+        ContractorProfile.sync([row[0] for row in drifted], db)
+        db.commit()
+        print(f"[contractor profiles] {len(drifted)} recomputed")
+    return len(drifted)
+
+
+def main():
+    """
+    Verify contractor_profiles against the preference tables
+
+        poetry run check-contractor-profiles --fix
+    """
+    parser = argparse.ArgumentParser(description="contractor_profiles consistency check")
+    parser.add_argument("--fix", action="store_true", help="recompute drifted profiles")
+    parser.add_argument("--show", type=int, default=10, help="drifted contractors to print")
+    args = parser.parse_args()
+
+    with Session(get_db().engine) as db:
+        drifted = check(db, fix=args.fix, show=args.show)
+    print(f"[contractor profiles] {drifted} drifted")
+    sys.exit(1 if drifted and not args.fix else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import re
+import threading
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from api.config import get_config
+
+_PARAMS = re.compile(r"%\(\w+\)s|\$\d+|\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str):
+    """Statement with bind params and literals collapsed, so N+1 loops compare equal"""
+    return _SPACES.sub(" ", _PARAMS.sub("?", statement)).strip()
+
+
+@dataclass
+class RequestQueryStats:
+    scope: dict = field(default_factory=dict)
+    statements: int = 0
+    seconds: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int):
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+class RouteQueryStats:
+    """Per route totals, keyed by `METHOD /path/{template}`"""
+
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, stats: RequestQueryStats, over_budget: bool, repeated: bool):
+        with self._lock:
+            entry = self.routes.setdefault(
+                route,
+                {
+                    "requests": 0,
+                    "statements": 0,
+                    "max_statements": 0,
+                    "db_ms": 0.0,
+                    "over_budget": 0,
+                    "repeated_statements": 0,
+                },
+            )
+            entry["requests"] += 1
+            entry["statements"] += stats.statements
+            entry["max_statements"] = max(entry["max_statements"], stats.statements)
+            entry["db_ms"] += stats.seconds * 1000
+            entry["over_budget"] += over_budget
+            entry["repeated_statements"] += repeated
+
+    def stats(self):
+        with self._lock:
+            return {
+                route: {
+                    **entry,
+                    "avg_statements": entry["statements"] / entry["requests"],
+                    "avg_db_ms": entry["db_ms"] / entry["requests"],
+                }
+                for route, entry in sorted(
+                    self.routes.items(), key=lambda item: -item[1]["statements"]
+                )
+            }
+
+    def clear(self):
+        with self._lock:
+            self.routes.clear()
+
+
+route_query_stats = RouteQueryStats()
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def route_name(scope: dict):
+    """`METHOD /path/{template}` once routed, the raw path before that"""
+    route = scope.get("route")
+    return f"{scope.get('method')} {route.path if route else scope.get('path')}"
+
+
+def current_route():
+    stats = _current.get()
+    return route_name(stats.scope) if stats else None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, _cursor, statement, _parameters, _context, _executemany):
+    stats = _current.get()
+    if stats is None or not conn.info.get("query_start"):
+        return
+    stats.seconds += time.perf_counter() - conn.info["query_start"].pop()
+    stats.statements += 1
+    stats.fingerprints[fingerprint(statement)] += 1
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """
+    Counts SQL statements and DB time per request
+    - non-prod responses carry `X-SQL-Statements` and `X-SQL-Time-Ms`
+    - totals per route are kept for `/internal/db/queries`
+    - logs a warning past SQL_STATEMENT_BUDGET statements or when one statement
+    fingerprint repeats SQL_REPEAT_THRESHOLD times (the usual N+1 shape)
+    """
+    config = get_config()
+    # mutated from the route's thread/task, contextvar writes there don't come back
+    stats = RequestQueryStats(scope=request.scope)
+    reset = _current.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(reset)
+
+    name = route_name(request.scope)
+    repeated = stats.repeated(config.SQL_REPEAT_THRESHOLD)
+    over_budget = stats.statements > config.SQL_STATEMENT_BUDGET
+    if over_budget:
+        print(
+            f"[sql] {name}: {stats.statements} statements "
+            f"(budget {config.SQL_STATEMENT_BUDGET}), {stats.seconds * 1000:.1f}ms"
+        )
+    for statement, count in repeated:
+        print(f"[sql] {name}: same statement {count}x: {statement[:200]}")
+    if "route" in request.scope:
+        route_query_stats.record(name, stats, over_budget, bool(repeated))
+
+    if config.ENV != "prod":
+        response.headers["X-SQL-Statements"] = str(stats.statements)
+        response.headers["X-SQL-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+    return response
@@ -0,0 +1,212 @@
+import bisect
+from concurrent.futures import Future
+from functools import lru_cache
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+import uuid
+
+
+class ReviewScorerBusy(Exception):
+    pass
+
+
+class Histogram:
+    """Counts per bucket, `bounds` are the inclusive upper bounds, the last bucket has none"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def stats(self):
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class ReviewScorer:
+    """
+    Scores review texts on its own thread, never the request's: `submit` queues a
+    text and returns a Future. The worker takes the first queued text plus whatever
+    arrives until `max_batch` texts or `max_wait_ms` after the first was queued,
+    runs `predict` once over the batch and hands the results to `write`.
+
+    - `predict(texts)` -> one row of scores per text
+    - `write([(key, scores), ...])` stores a batch's results, eg in contractor_reviews
+    - `max_queue` caps the texts waiting, beyond it `submit` fails fast with
+    ReviewScorerBusy (0 = unbounded)
+    """
+
+    BATCH_BOUNDS = (1, 2, 4, 8, 16, 32, 64)
+    MS_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(
+        self,
+        predict: Callable[[List[str]], Sequence[Sequence[float]]],
+        write: Callable[[List[Tuple[uuid.UUID, List[float]]]], None],
+        max_batch: int,
+        max_wait_ms: int,
+        max_queue: int,
+    ):
+        self.predict = predict
+        self.write = write
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batch_sizes = Histogram(self.BATCH_BOUNDS)
+        self.queue_wait = Histogram(self.MS_BOUNDS)
+        self.latency = Histogram(self.MS_BOUNDS)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="review-scorer", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: uuid.UUID, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self.max_queue and self._queue.qsize() >= self.max_queue:
+                self.rejected += 1
+                raise ReviewScorerBusy()
+            self.submitted += 1
+        self._queue.put((key, text, time.perf_counter(), future))
+        return future
+
+    def close(self, timeout: float = None):
+        """Scores what is already queued, then stops the worker"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> Optional[list]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(remaining > 0, max(remaining, 0))
+            except queue.Empty:
+                break
+            if item is None:
+                self._closed = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._closed:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                scores = self.predict([text for _, text, _, _ in batch])
+                results = [
+                    (key, [float(value) for value in row])
+                    for (key, _, _, _), row in zip(batch, scores)
+                ]
+                self.write(results)
+            except Exception as e:
+                print(f"[review scorer] batch of {len(batch)} failed: {e!r}")
+                with self._lock:
+                    self.failed += len(batch)
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            with self._lock:
+                self.completed += len(batch)
+                self.batch_sizes.add(len(batch))
+                for _, _, queued, _ in batch:
+                    self.queue_wait.add((started - queued) * 1000)
+                    self.latency.add((done - queued) * 1000)
+            for (_, _, _, future), (_, values) in zip(batch, results):
+                future.set_result(values)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_queue": self.max_queue,
+                "depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "batch_size": self.batch_sizes.stats(),
+                "queue_wait_ms": self.queue_wait.stats(),
+                "latency_ms": self.latency.stats(),
+            }
+
+
+def write_description_scores(scores: List[Tuple[uuid.UUID, List[float]]]):
+    from sqlmodel import Session
+    from api.core.db import get_db
+    from api.models.review import ContractorReview
+
+    with Session(get_db().engine) as db:
+        ContractorReview.set_description_scores(scores, db)
+        db.commit()
+
+
+@lru_cache()
+def get_review_scorer() -> Optional[ReviewScorer]:
+    """The process's ReviewScorer, None unless REVIEW_SCORER_WEIGHTS is set"""
+    from api.config import get_config
+
+    config = get_config()
+    if not config.REVIEW_SCORER_WEIGHTS:
+        return None
+    # torch and transformers are only needed when reviews are scored
+    import torch
+    from transformers import BertTokenizer
+    from api.core.search_engine.rating_export import select_backend
+    from api.core.search_engine.text_scaler_engine import RatingRegressor, predictor
+
+    weights = config.REVIEW_SCORER_WEIGHTS
+    model = RatingRegressor()
+    model.load_state_dict(torch.load(weights, map_location="cpu"))
+    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+    print(f"[review scorer] loaded {weights}")
+    # exports are reused until the weights file changes
+    stat = os.stat(weights)
+    version = hashlib.sha1(f"{os.path.abspath(weights)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    directory = os.path.join(config.REVIEW_SCORER_EXPORT_DIR, version.hexdigest()[:16])
+    backend = select_backend(
+        model,
+        directory,
+        config.REVIEW_SCORER_BACKEND,
+        config.REVIEW_SCORER_THREADS,
+        config.REVIEW_SCORER_MAX_ERROR,
+    )
+    return ReviewScorer(
+        predictor(backend, tokenizer),
+        write_description_scores,
+        config.REVIEW_SCORER_MAX_BATCH,
+        config.REVIEW_SCORER_MAX_WAIT_MS,
+        config.REVIEW_SCORER_MAX_QUEUE,
+    )
@@ -1,9 +1,15 @@
 from transformers import BertTokenizer
-from api.core.search_engine.text_scaler_engine import RatingRegressor, TextScalerEngine
+from api.core.search_engine.text_scaler_engine import (
+    EmbeddingCache,
+    RatingRegressor,
+    TextScalerEngine,
+)
 
 tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
 model = RatingRegressor()
+# BERT runs once per review, later runs only embed the new ones
+cache = EmbeddingCache.for_model("review_embeddings", model.bert, tokenizer)
 
-engine = TextScalerEngine(imputed_df, model, tokenizer)
+engine = TextScalerEngine(imputed_df, model, tokenizer, cache=cache)
 train_loader, val_loader = engine.create_data_loaders()
 engine.train(train_loader, val_loader)
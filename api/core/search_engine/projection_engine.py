@@ -1,60 +1,139 @@
+import itertools
 import numpy as np
 import api.core.search_engine.utils as utils
-import pandas as pd
-import json
+
+# the ContractorRating columns, in matrix column order
+RATING_LABELS = ("quality_rating", "budget_rating", "on_schedule_rating")
+
+
+def read_rows(rows, width: int, count: int = None, chunk: int = 1024):
+    """
+    (id, *values) rows, eg a Core `select(Contractor.id, Contractor.quality_rating, ...)`
+    result or a server-side (`yield_per`) one, read `chunk` rows at a time into a
+    preallocated float32 matrix. Without `count` the matrix grows by doubling.
+    :return: (ids, N x width matrix)
+    """
+    ids = []
+    matrix = np.empty((count or chunk, width), dtype=np.float32)
+    rows = iter(rows)
+    while block := list(itertools.islice(rows, chunk)):
+        n = len(ids)
+        if n + len(block) > len(matrix):
+            grown = np.empty((max(2 * len(matrix), n + len(block)), width), dtype=np.float32)
+            grown[:n] = matrix[:n]
+            matrix = grown
+        ids.extend(row[0] for row in block)
+        matrix[n : n + len(block)] = [row[1:] for row in block]
+    return ids, matrix[: len(ids)]
+
+
+class ColumnStats:
+    """
+    Count, mean and sum of squared deviations (M2) of each column of a set of rows,
+    updated a row at a time in O(D) (Welford) or merged with another set's (Chan et
+    al.), so a changed row doesn't need a pass over the others. float64, a long run
+    of updates stays within rounding of the batch computation.
+    """
+
+    def __init__(self, width: int):
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+
+    @staticmethod
+    def of(matrix: np.ndarray) -> "ColumnStats":
+        stats = ColumnStats(matrix.shape[1])
+        stats.count = len(matrix)
+        if stats.count:
+            # deviations in the matrix's dtype, sums in float64: the updates that follow
+            # start from an M2 as exact as theirs
+            stats.mean = matrix.mean(axis=0, dtype=np.float64)
+            deviations = matrix - stats.mean.astype(matrix.dtype)
+            stats.m2 = np.einsum("ij,ij->j", deviations, deviations, dtype=np.float64)
+        return stats
+
+    def merge(self, other: "ColumnStats"):
+        count = self.count + other.count
+        if not other.count:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta**2 * (self.count * other.count / count)
+        self.count = count
+
+    def add(self, row: np.ndarray):
+        self.count += 1
+        delta = row - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (row - self.mean)
+
+    def remove(self, row: np.ndarray):
+        if self.count <= 1:
+            self.__init__(len(self.mean))
+            return
+        self.count -= 1
+        delta = row - self.mean
+        self.mean = self.mean - delta / self.count
+        self.m2 = self.m2 - delta * (row - self.mean)
+
+    def replace(self, old: np.ndarray, new: np.ndarray):
+        self.remove(old)
+        self.add(new)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Population standard deviation, as np.std"""
+        if not self.count:
+            return np.zeros_like(self.m2)
+        variance = self.m2 / self.count
+        # what rounding leaves of the M2 of a column whose rows were all replaced by one
+        # value is no spread
+        variance[variance <= 1e-10 * (1 + self.mean**2)] = 0
+        return np.sqrt(variance)
 
 
 class RecommendationEngine:
-    def __init__(self, SQL_Model=None, dataset_matrix=None):
+    def __init__(
+        self, SQL_Model=None, dataset_matrix=None, labels=RATING_LABELS, ids=None, copy=True
+    ):
         """
         Recommender object that uses point to plane projection method
-        to rank several entries in the given Json file or Numpy Matrix
-        :param Json_model: File containing labels and numerical values
-        :param dataset_matrix: Alternative to a json model, you can instantiate an object with a Numpy Matrix.
-        """
-        # self.jfile = Json_model.json_dump
-        jfile_list = [contractor.model_dump_json() for contractor in SQL_Model]
-        pre_data = [json.loads(s) for s in jfile_list]
-        pre_data = pd.DataFrame(pre_data)
-        pre_data["name"] = pre_data["first_name"] + " " + pre_data["last_name"]
-        self.all_labels = [col for col in pre_data.columns if col.endswith("_rating")]
-        desired_columns = ["id", "name"] + self.all_labels
-        self.arranged_data = pre_data[desired_columns]
-        self.number_data = None
-
-        # Assuming the top level of JSON is a dictionary, count its keys
+        to rank the rows of a rating matrix.
+        :param SQL_Model: Rows (eg Contractor) with an `id` and the `labels` attributes.
+        :param dataset_matrix: Alternative to SQL_Model, an N x len(labels) matrix, eg
+         rows gathered from a prebuilt float32 rating matrix.
+        :param labels: Column labels of the matrix.
+        :param ids: Row ids returned by `recommend`, defaults to the SQL_Model ids or
+         the row numbers.
+        :param copy: False keeps a float32 `dataset_matrix` as is, NaN filling and
+         `update_row` then write to it.
+        """
+        self.all_labels = list(labels)
         if SQL_Model is not None:
-            self.D = len(self.all_labels)  # Dimension of each row.
-            self.N = None
-
-            try:
-                self.N = self.arranged_data.shape[0]
-                print("Number of entries:", self.N)
-            except ValueError as e:
-                print("An error occurred:", e)
-            try:
-                rating_df = self.arranged_data[self.all_labels]
-                self.number_data = rating_df.to_numpy()
-                self.__data_Z_score_norm()
-                print("NumPy matrix:\n", self.number_data)
-            except Exception as e:
-                print(
-                    "An error occurred when parsing the rating columns to numpy array:",
-                    e,
-                )
+            rows = ((row.id, *(getattr(row, label) for label in labels)) for row in SQL_Model)
+            self.ids, self.raw_data = read_rows(rows, len(labels), len(SQL_Model))
         else:
-            print(dataset_matrix)
-            self.number_data = np.array(dataset_matrix)
-            self.N, self.D = self.number_data.shape
-            # self.N = dataset_matrix.shape[0]
-            # self.D = dataset_matrix.shape[1]
-            # self.data = dataset_matrix
+            self.raw_data = np.array(dataset_matrix, dtype=np.float32, copy=copy)
+            self.ids = ids
             self.__replace_nan_with_column_mean()
-            self.__data_Z_score_norm()
-        # self.number_data = np.random.rand(self.N, self.D)*5
-        self.static_vector = np.zeros(self.D)
-        self.dynamic_vector = np.zeros(self.D)
-        self.normal_vector = np.zeros(self.D)
+        self.N, self.D = self.raw_data.shape
+        # z-score statistics, scoring folds them into the projection so the matrix is
+        # never rewritten, `number_data` is the normalized matrix when asked for
+        self.stats = ColumnStats.of(self.raw_data)
+        self._number_data = None
+        self._groups = None
+        self.static_vector = np.zeros(self.D, dtype=np.float32)
+        self.dynamic_vector = np.zeros(self.D, dtype=np.float32)
+        self.normal_vector = np.zeros(self.D, dtype=np.float32)
+
+    @staticmethod
+    def from_rows(rows, labels=RATING_LABELS, count: int = None):
+        """
+        Engine over (id, *ratings) rows in `labels` order, without building a model
+        per row, see `read_rows`.
+        """
+        ids, matrix = read_rows(rows, len(labels), count)
+        return RecommendationEngine(dataset_matrix=matrix, labels=labels, ids=ids, copy=False)
 
     def set_static_vector(self, importance_vector: dict):
         """
@@ -83,64 +162,226 @@ class RecommendationEngine:
         for label, value in importance_vector.items():
             if label in self.all_labels:
                 index = self.all_labels.index(label)
-                self.static_vector[index] = value
+                self.dynamic_vector[index] = value
 
-    def __update_normal_vector(self):
+    def __normal_vectors(self, dynamic_vectors: np.ndarray) -> np.ndarray:
         """
-        Method that updates the normal (to rec-plane) vector
-        based on current dynamic and static vector values.
-        The process merges vectors into one keeping the
-        order of the object's all_labels. Then applies
-        softmax function to keep operations correctly scaled.
-        If static_vector is None, then the normal vector is
-        equal to the dynamic vector.
-        :return: None
+        The normal (to rec-plane) vector of each row of `dynamic_vectors`: merged
+        with the static vector, keeping the order of all_labels, then softmax to
+        keep operations correctly scaled and unit length.
+        :param dynamic_vectors: B x D
+        :return: B x D
+        """
+        merged_vectors = self.static_vector + dynamic_vectors
+        # Apply softmax to each merged vector
+        normal_vectors = utils.softmax(merged_vectors, axis=-1).astype(np.float32)
+        normal_vectors /= np.sqrt((normal_vectors**2).sum(axis=-1, keepdims=True))
+        return normal_vectors
+
+    @property
+    def number_data(self) -> np.ndarray:
+        """Z-score normalized matrix, a column with no spread scores 0"""
+        if self._number_data is None:
+            std = self.stats.std
+            self._number_data = np.divide(
+                self.raw_data - self.stats.mean,
+                std,
+                out=np.zeros(self.raw_data.shape),
+                where=std != 0,
+            ).astype(np.float32)
+        return self._number_data
+
+    def update_row(self, row: int, values):
+        """
+        Replaces one row's ratings: the statistics move in O(D), the rescale of the
+        other rows is left to the next scoring
+        """
+        values = np.asarray(values, dtype=np.float32)
+        self.stats.replace(self.raw_data[row], values)
+        self.raw_data[row] = values
+        self._number_data = self._groups = None
+
+    def scores(self, importance_vector=None) -> np.ndarray:
         """
+        Projection of every row on the normal vector, higher ranks first
+        :return: float32 array of N scores
+        """
+        if importance_vector is not None:
+            self.set_dynamic_vector(importance_vector)
+        normal_vectors = self.__normal_vectors(self.dynamic_vector[None])
+        self.normal_vector = normal_vectors[0]
+        return self.__project(self.raw_data, normal_vectors)[0]
+
+    def scores_many(self, preferences) -> np.ndarray:
+        """
+        Projections of every row on the normal vector of each of B preference
+        (dynamic) vectors at once, the static vector applies to all of them and no
+        state is changed.
+        :param preferences: B x D, columns in all_labels order.
+        :return: B x N float32 scores, row b is `scores()` with preferences[b], bit
+         for bit
+        """
+        preferences = np.asarray(preferences, dtype=np.float32)
+        return self.__project(self.raw_data, self.__normal_vectors(preferences))
 
-        merged_vector = self.static_vector + self.dynamic_vector
-        # Apply softmax to the merged vector
-        self.normal_vector = utils.softmax(merged_vector)
-        normal_vector_magnitude = np.linalg.norm(self.normal_vector)
-        self.normal_vector /= normal_vector_magnitude
+    def __project(self, matrix: np.ndarray, normal_vectors: np.ndarray) -> np.ndarray:
+        """B x M scores of the M rows of raw `matrix` on B `normal_vectors`"""
+        # ((x - mean) / std) @ v == x @ (v / std) - mean @ (v / std)
+        std = self.stats.std
+        scales = np.divide(normal_vectors, std, out=np.zeros(normal_vectors.shape), where=std != 0)
+        scores = np.empty((len(scales), len(matrix)), dtype=np.float32)
+        scores[:] = -(scales * self.stats.mean).sum(axis=-1, keepdims=True)
+        # a column (rank one update) at a time rather than a BLAS product, whose
+        # rounding depends on where a row falls in its blocks: equal rows must score
+        # equal, ties are broken by id
+        for column, weights in zip(matrix.T, scales.T.astype(np.float32)):
+            scores += weights[:, None] * column
+        return scores
 
-    def __data_Z_score_norm(self):
-        means = np.mean(self.number_data, axis=0)
-        stds = np.std(self.number_data, axis=0)
+    def __groups(self):
+        """
+        Rows grouped by equal ratings: (distinct rows, row numbers group by group
+        in row order, group starts, group sizes)
+        """
+        if self._groups is None:
+            # lexsort is stable: equal rows stay in row order
+            members = np.lexsort(self.raw_data.T[::-1])
+            ordered = self.raw_data[members]
+            first = np.ones(self.N, dtype=bool)
+            first[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+            starts = np.flatnonzero(first)
+            sizes = np.diff(np.append(starts, self.N))
+            self._groups = (ordered[starts], members, starts, sizes)
+        return self._groups
+
+    def top_k(
+        self,
+        k: int,
+        scores: np.ndarray = None,
+        eligible: np.ndarray = None,
+        tiebreak: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Row numbers of the `k` highest `scores`, best first, in O(N + k log k):
+        argpartition finds the k-th score, only the rows at or above it are sorted.
+        :param scores: Defaults to `self.scores()`.
+        :param eligible: Optional boolean mask, other rows are never returned.
+        :param tiebreak: Optional per row key, ascending, that orders equal scores.
+         Row order otherwise.
+        """
+        if scores is None:
+            scores = self.scores()
+        rows = np.arange(len(scores)) if eligible is None else np.flatnonzero(eligible)
+        if k < len(rows):
+            kth = np.argpartition(-scores[rows], k - 1)[k - 1]
+            # keep every tie of the k-th score, the sort below decides between them
+            rows = rows[scores[rows] >= scores[rows[kth]]]
+        if tiebreak is None:
+            order = np.argsort(-scores[rows], kind="stable")
+        else:
+            order = np.lexsort((tiebreak[rows], -scores[rows]))
+        return rows[order][:k]
 
-        # Perform Z-score normalization
-        self.number_data = (self.number_data - means) / stds
+    @staticmethod
+    def __first_k(k: int, batch: np.ndarray, rows: np.ndarray, scores: np.ndarray):
+        """
+        B x k: of each batch row's candidate (row, score) pairs, the best k by score
+        then row. Every batch row has at least k candidates
+        """
+        order = np.lexsort((rows, -scores, batch))
+        batch, rows = batch[order], rows[order]
+        size = batch[-1] + 1 if len(batch) else 0
+        rank = np.arange(len(rows)) - np.searchsorted(batch, np.arange(size))[batch]
+        return rows[rank < k].reshape(-1, k)
 
-        # Handle the case where standard deviation is zero
-        self.number_data[:, stds == 0] = 0
+    def top_k_many(self, k: int, scores: np.ndarray) -> np.ndarray:
+        """
+        `top_k` of each row of B x N `scores` without a loop over them, ties in row
+        order.
+        :return: B x min(k, N) row numbers
+        """
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return np.zeros((len(scores), 0), dtype=np.intp)
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        # every tie of each k-th score is a candidate
+        batch, rows = np.nonzero(scores >= kth[:, None])
+        return self.__first_k(k, batch, rows, scores[batch, rows])
 
-        return self.number_data
+    def __top_k_grouped(self, k: int, preferences: np.ndarray) -> np.ndarray:
+        """
+        `top_k_many` from the scores of the distinct rows only: per preference, the
+        best groups until they hold k rows (and any group scoring the same as the
+        last one) are expanded to their rows, nothing else is
+        """
+        distinct, members, starts, sizes = self.__groups()
+        group_scores = self.__project(distinct, self.__normal_vectors(preferences))
+        ranked = np.sort(-group_scores, axis=1)
+        held = np.cumsum(sizes[np.argsort(-group_scores, axis=1, kind="stable")], axis=1)
+        last = np.minimum((held < k).sum(axis=1), len(distinct) - 1)
+        threshold = -ranked[np.arange(len(ranked)), last]
+        batch, groups = np.nonzero(group_scores >= threshold[:, None])
+        # each (preference, group) pair expanded to the group's rows
+        counts = sizes[groups]
+        pairs = np.repeat(np.arange(len(groups)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = members[starts[groups][pairs] + offsets]
+        return self.__first_k(k, batch[pairs], rows, group_scores[batch, groups][pairs])
 
-    def recommend(self, importance_vector=None) -> list[str]:
+    def recommend(self, importance_vector=None, k: int = None) -> list[str]:
         """
         Use this method to produce a ranked list based on the
         preferences set to object. For custom user reccomendations
         make sure to execute set_dynamic_vector first.
+        :param k: Only the k best, defaults to all of them.
         :return: list(str) Ranked-sorted list of contractor IDs
         """
-        if importance_vector is not None:
-            self.set_dynamic_vector(importance_vector)
-        self.__update_normal_vector()
-        projections = np.dot(self.number_data, self.normal_vector)
-        ranking_indices = np.argsort(projections)
-        ranking_indices = ranking_indices[::-1]
+        ranking_indices = self.top_k(self.N if k is None else k, self.scores(importance_vector))
+        if self.ids is None:
+            return ranking_indices.tolist()
+        return [self.ids[index] for index in ranking_indices]
 
-        id_numbers = self.arranged_data["id"][ranking_indices].to_list()
+    def recommend_many(self, preferences, k: int = None) -> list[list[str]]:
+        """
+        `recommend` for B preference (dynamic) vectors at once, eg to precompute
+        every homeowner's ranking. Ratings repeat a lot (small integers), so the
+        distinct rows are scored rather than all N when that saves most of the work.
+        :param preferences: B x D, columns in all_labels order, see `vectors`.
+        :param k: Only the k best of each, defaults to all of them.
+        :return: B ranked lists of contractor IDs (row numbers without ids)
+        """
+        preferences = np.asarray(preferences, dtype=np.float32).reshape(-1, self.D)
+        k = self.N if k is None else min(k, self.N)
+        if k == 0 or not len(preferences):
+            return [[] for _ in preferences]
+        if len(self.__groups()[0]) * 8 <= self.N:
+            ranking_indices = self.__top_k_grouped(k, preferences)
+        else:
+            ranking_indices = self.top_k_many(k, self.scores_many(preferences))
+        if self.ids is None:
+            return ranking_indices.tolist()
+        ids = np.empty(self.N, dtype=object)
+        ids[:] = self.ids
+        return ids[ranking_indices].tolist()
 
-        return id_numbers
+    def vectors(self, importance_vectors: list[dict]) -> np.ndarray:
+        """B x D preferences from `set_dynamic_vector` style dictionaries"""
+        vectors = np.zeros((len(importance_vectors), self.D), dtype=np.float32)
+        for row, importance_vector in enumerate(importance_vectors):
+            for label, value in importance_vector.items():
+                if label in self.all_labels:
+                    vectors[row, self.all_labels.index(label)] = value
+        return vectors
 
     def __replace_nan_with_column_mean(self):
+        if not np.isnan(self.raw_data).any():
+            return
         # Calculate the mean of each column, ignoring NaNs
-
-        col_means = np.nanmean(self.number_data, axis=0)
+        col_means = np.nanmean(self.raw_data, axis=0)
 
         # Replace NaNs with the mean of their respective column
         for i, mean in enumerate(col_means):
-            self.number_data[np.isnan(self.number_data[:, i]), i] = mean
+            self.raw_data[np.isnan(self.raw_data[:, i]), i] = mean
 
     def data_col(self, col_number: int):
         return self.number_data[:, col_number]
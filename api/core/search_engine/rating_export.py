@@ -0,0 +1,177 @@
+import fcntl
+import gc
+import os
+import statistics
+import time
+import numpy as np
+import torch
+from torch import nn
+
+# every backend `backends` can build, by name
+BACKENDS = ("onnx-int8", "onnx", "int8", "fp32")
+
+
+# Inference backends: (input_ids, attention_mask) int64 arrays -> (batch, 4) float32 scores
+class TorchBackend:
+    def __init__(self, model, name="fp32"):
+        self.model = model.eval()
+        self.name = name
+
+    def __call__(self, input_ids, attention_mask):
+        with torch.no_grad():
+            outputs = self.model(torch.from_numpy(input_ids), torch.from_numpy(attention_mask))
+        return outputs.numpy()
+
+
+class OnnxBackend:
+    def __init__(self, path, threads=None, name="onnx"):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or 0
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.name = name
+
+    def __call__(self, input_ids, attention_mask):
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        return self.session.run(["scores"], inputs)[0]
+
+
+def quantize(model):
+    """An int8 copy of `model`: Linear weights quantized, activations quantized per batch"""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, directory):
+    """
+    `model` as `rating_regressor.onnx` in `directory`, batch and sequence length
+    dynamic, plus `rating_regressor.int8.onnx` with int8 weights. Existing files
+    are kept, the directory should be per set of weights
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "rating_regressor.onnx")
+    quantized = os.path.join(directory, "rating_regressor.int8.onnx")
+    if not os.path.exists(path):
+        dummy = torch.ones((2, 8), dtype=torch.long)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        torch.onnx.export(
+            model.eval(),
+            (dummy, dummy),
+            temporary,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["scores"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "scores": {0: "batch"},
+            },
+            opset_version=14,
+        )
+        os.replace(temporary, path)
+    if not os.path.exists(quantized):
+        temporary = f"{quantized}.{os.getpid()}.tmp"
+        quantize_dynamic(path, temporary, weight_type=QuantType.QInt8)
+        os.replace(temporary, quantized)
+    return path, quantized
+
+
+def backends(model, directory, threads=None, names=BACKENDS):
+    """{name: backend} of `names`, the ONNX ones only when onnxruntime is installed"""
+    built = {}
+    if any(name.startswith("onnx") for name in names):
+        try:
+            path, quantized = export_onnx(model, directory)
+        except ImportError:
+            print("[rating regressor] onnxruntime not installed, no ONNX backends")
+        else:
+            for name, file in (("onnx", path), ("onnx-int8", quantized)):
+                if name in names:
+                    built[name] = OnnxBackend(file, threads, name)
+    if threads:
+        torch.set_num_threads(threads)
+    if "int8" in names:
+        built["int8"] = TorchBackend(quantize(model), "int8")
+    if "fp32" in names:
+        built["fp32"] = TorchBackend(model, "fp32")
+    return built
+
+
+def sample_inputs(vocab_size, batch=8, sequence=128, seed=0):
+    input_ids = np.random.default_rng(seed).integers(1, vocab_size, (batch, sequence))
+    return input_ids.astype(np.int64), np.ones((batch, sequence), dtype=np.int64)
+
+
+def max_error(backend, reference, input_ids, attention_mask):
+    """Largest absolute difference between the scores of `backend` and `reference`"""
+    expected = reference(input_ids, attention_mask)
+    return float(np.abs(backend(input_ids, attention_mask) - expected).max())
+
+
+def fastest(model, directory, input_ids, attention_mask, threads=None, tolerance=0.05, runs=5):
+    """
+    Of the backends of `model`, the fastest on (input_ids, attention_mask) whose
+    scores stay within `tolerance` of fp32's. Built and timed one at a time, only
+    the best so far is kept alive
+    """
+    reference = TorchBackend(model, "fp32")
+    expected = reference(input_ids, attention_mask)
+    best, best_ms = reference, None
+    for name in BACKENDS:
+        backend = backends(model, directory, threads, (name,)).get(name)
+        if backend is None:
+            continue
+        error = float(np.abs(backend(input_ids, attention_mask) - expected).max())
+        # the call above also warmed it up
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            backend(input_ids, attention_mask)
+            samples.append((time.perf_counter() - start) * 1000)
+        ms = statistics.median(samples)
+        print(f"[rating regressor] {name}: {ms:.1f}ms, max abs error {error:.4f}")
+        if error <= tolerance and (best_ms is None or ms < best_ms):
+            best, best_ms = backend, ms
+        # a losing session or quantized copy is freed before the next one is built
+        del backend
+        gc.collect()
+    print(f"[rating regressor] using {best.name}")
+    return best
+
+
+def select_backend(model, directory, backend="auto", threads=None, tolerance=0.05):
+    """
+    `backend` by name, or with "auto" the fastest of those available. The first
+    process to pick for `directory` (a set of weights) times them and saves its
+    choice there, the others build that one
+    """
+    if backend != "auto":
+        built = backends(model, directory, threads, (backend,))
+        if backend not in built:
+            raise ValueError(f"rating regressor backend {backend} is not available")
+        return built[backend]
+    os.makedirs(directory, exist_ok=True)
+    choice = os.path.join(directory, f"backend-{threads or 0}-{tolerance:g}")
+    # the others wait for the first one's choice instead of timing their own
+    with open(os.path.join(directory, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(choice):
+            with open(choice) as file:
+                name = file.read().strip()
+            built = backends(model, directory, threads, (name,))
+            if name in built:
+                print(f"[rating regressor] using {name}, chosen earlier")
+                return built[name]
+        inputs = sample_inputs(model.bert.config.vocab_size)
+        best = fastest(model, directory, *inputs, threads=threads, tolerance=tolerance)
+        temporary = f"{choice}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(best.name)
+        os.replace(temporary, choice)
+        return best
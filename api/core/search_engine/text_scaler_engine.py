@@ -1,96 +1,384 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
 import torch
 from torch import nn
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler, Subset, TensorDataset
 import torch.optim as optim
 from sklearn.model_selection import train_test_split
 from transformers import BertModel
+from api.core.search_engine.rating_export import TorchBackend
+
+LABELS = [
+    "average_menu",
+    "average_taste",
+    "average_indoor_atmosphere",
+    "average_outdoor_atmosphere",
+]
+
+
+# Token ids of every review, tokenized once and without padding
+class TokenStore:
+    """
+    In `directory`: `tokens.i32` (int32 ids of every text back to back,
+    memory-mapped) and `offsets.npy` (int64, text i is tokens[offsets[i]:offsets[i + 1]]).
+    Batches are padded to their own longest text only, in `batch`
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.lengths = np.diff(self.offsets)
+        size = int(self.offsets[-1])
+        self.tokens = (
+            np.memmap(os.path.join(directory, "tokens.i32"), np.int32, "r", shape=(size,))
+            if size
+            else np.zeros(0, dtype=np.int32)
+        )
+
+    @staticmethod
+    def build(directory, texts, tokenizer, max_length=512, chunk_size=1024):
+        """Tokenizes `texts` a chunk at a time, straight to the files"""
+        os.makedirs(directory, exist_ok=True)
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        with open(os.path.join(directory, "tokens.i32"), "wb") as file:
+            for start in range(0, len(texts), chunk_size):
+                chunk = texts[start : start + chunk_size]
+                encodings = tokenizer(chunk, truncation=True, max_length=max_length)
+                for i, ids in enumerate(encodings["input_ids"], start):
+                    file.write(np.asarray(ids, dtype=np.int32).tobytes())
+                    offsets[i + 1] = offsets[i] + len(ids)
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        return TokenStore(directory)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def batch(self, rows, pad_id=0):
+        """(input_ids, attention_mask) of `rows`, int64, as wide as the longest row"""
+        lengths = self.lengths[rows]
+        positions = np.arange(lengths.max() if len(rows) else 0)
+        attention_mask = positions < lengths[:, None]
+        input_ids = np.full(attention_mask.shape, pad_id, dtype=np.int64)
+        input_ids[attention_mask] = self.tokens[
+            (self.offsets[rows][:, None] + positions)[attention_mask]
+        ]
+        return input_ids, attention_mask.astype(np.int64)
 
 
 # Define a custom dataset
 class ReviewDataset(Dataset):
-    def __init__(self, encodings, labels):
-        self.encodings = encodings
-        self.labels = labels
+    """
+    Reviews `indices` (all of them by default) of a TokenStore with their labels.
+    Items are only positions, `collate` builds each batch from the store at once
+    """
+
+    def __init__(self, store, labels, indices=None, pad_id=0):
+        self.store = store
+        self.labels = np.asarray(labels, dtype=np.float32)
+        self.indices = np.arange(len(self.labels)) if indices is None else np.asarray(indices)
+        self.pad_id = pad_id
 
     def __getitem__(self, idx):
-        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-        item["labels"] = torch.tensor(self.labels[idx], dtype=torch.float)
-        return item
+        return idx
+
+    def __len__(self):
+        return len(self.indices)
+
+    def lengths(self):
+        return self.store.lengths[self.indices]
+
+    def collate(self, items):
+        rows = self.indices[np.asarray(items, dtype=np.intp)]
+        input_ids, attention_mask = self.store.batch(rows, self.pad_id)
+        return {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask),
+            "labels": torch.from_numpy(self.labels[rows]),
+        }
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Batches of positions of similar `lengths`: shuffled, cut into buckets of
+    `bucket_batches` batches sorted by length, batched, and the batches shuffled.
+    Without `shuffle`, batches in length order
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_batches=50, seed=None):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_batches
+        self.rng = np.random.default_rng(seed)
+
+    def __iter__(self):
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind="stable")
+            for start in range(0, len(order), self.batch_size):
+                yield order[start : start + self.batch_size].tolist()
+            return
+        order = self.rng.permutation(len(self.lengths))
+        batches = []
+        for start in range(0, len(order), self.bucket_size):
+            bucket = order[start : start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            batches.extend(
+                bucket[i : i + self.batch_size] for i in range(0, len(bucket), self.batch_size)
+            )
+        for batch in self.rng.permutation(len(batches)):
+            yield batches[batch].tolist()
+
+    def __len__(self):
+        return -(-len(self.lengths) // self.batch_size)
+
+
+# Pooled outputs of the frozen BERT, computed once per review text
+class EmbeddingCache:
+    """
+    Append only, in `directory`: `embeddings.f32` (float32, one row of `width`
+    per text, memory-mapped) and `keys.bin` (sha1 of each row's text). Rows are
+    only valid for the backbone that made them, see `for_model`
+    """
+
+    KEY_SIZE = 20
+
+    def __init__(self, directory, width):
+        self.directory = directory
+        self.width = width
+        os.makedirs(directory, exist_ok=True)
+        self.embeddings_path = os.path.join(directory, "embeddings.f32")
+        self.keys_path = os.path.join(directory, "keys.bin")
+        for path in (self.embeddings_path, self.keys_path):
+            open(path, "ab").close()
+        self._load()
+
+    @staticmethod
+    def for_model(directory, bert, tokenizer):
+        """
+        The cache of `bert`'s pooled outputs of `tokenizer`'s ids, one subdirectory
+        per config, weights and vocabulary: another checkpoint of the same config
+        starts its own cache
+        """
+        fingerprint = hashlib.sha1(bert.config.to_json_string(use_diff=False).encode())
+        for name, tensor in bert.state_dict().items():
+            fingerprint.update(name.encode())
+            fingerprint.update(tensor.detach().cpu().contiguous().numpy())
+        for token, token_id in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1]):
+            fingerprint.update(f"{token_id}:{token}\n".encode())
+        directory = os.path.join(directory, fingerprint.hexdigest()[:16])
+        return EmbeddingCache(directory, bert.config.hidden_size)
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(text.encode()).digest()
+
+    def _load(self):
+        row_size = self.width * 4
+        # keys are written after their rows, an interrupted append leaves extra rows
+        count = min(
+            os.path.getsize(self.keys_path) // self.KEY_SIZE,
+            os.path.getsize(self.embeddings_path) // row_size,
+        )
+        with open(self.keys_path, "rb") as file:
+            keys = file.read(count * self.KEY_SIZE)
+        self.rows = {
+            keys[row * self.KEY_SIZE : (row + 1) * self.KEY_SIZE]: row for row in range(count)
+        }
+        self.embeddings = (
+            np.memmap(self.embeddings_path, np.float32, "r", shape=(count, self.width))
+            if count
+            else np.zeros((0, self.width), dtype=np.float32)
+        )
 
     def __len__(self):
-        return len(self.labels)
+        return len(self.rows)
+
+    def missing(self, texts):
+        """Distinct `texts` without a row, in order"""
+        seen = set()
+        missing = []
+        for text in texts:
+            key = self.key(text)
+            if key not in self.rows and key not in seen:
+                seen.add(key)
+                missing.append(text)
+        return missing
+
+    def add(self, texts, embeddings):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        count = len(self.rows)
+        # rows first, then keys: a row only counts once its key is written
+        with open(self.embeddings_path, "r+b") as file:
+            file.seek(count * self.width * 4)
+            file.write(embeddings.tobytes())
+        with open(self.keys_path, "r+b") as file:
+            file.seek(count * self.KEY_SIZE)
+            file.write(b"".join(self.key(text) for text in texts))
+        self._load()
+
+    def get(self, texts):
+        """(len(texts), width) float32 rows of `texts`, all cached"""
+        rows = np.fromiter((self.rows[self.key(text)] for text in texts), np.intp, len(texts))
+        return self.embeddings[rows] if len(rows) else np.zeros((0, self.width), np.float32)
 
 
 # Define the model
 class RatingRegressor(nn.Module):
-    def __init__(self):
+    def __init__(self, bert=None):
         super(RatingRegressor, self).__init__()
-        self.bert = BertModel.from_pretrained("bert-base-uncased")
+        self.bert = BertModel.from_pretrained("bert-base-uncased") if bert is None else bert
         for param in self.bert.parameters():
             param.requires_grad = False
         self.regressor = nn.Linear(self.bert.config.hidden_size, 4)
 
-    def forward(self, input_ids, attention_mask):
+    def embed(self, input_ids, attention_mask):
+        """Pooled outputs of the frozen BERT, what the regressor is trained on"""
         outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask)
-        pooled_output = outputs.pooler_output
+        return outputs.pooler_output
+
+    def forward(self, input_ids, attention_mask):
+        pooled_output = self.embed(input_ids, attention_mask)
         return self.regressor(pooled_output)
 
 
+def predictor(model, tokenizer, threads=None, max_length=512):
+    """
+    `predict(texts)` for the ReviewScorer: `model`'s (len(texts), 4) outputs, the
+    texts in one batch padded to its longest. `model` is a RatingRegressor, run
+    without autograd, or a rating_export backend
+    """
+    if isinstance(model, nn.Module):
+        if threads:
+            torch.set_num_threads(threads)
+        model = TorchBackend(model)
+
+    def predict(texts):
+        encodings = tokenizer(
+            list(texts),
+            padding="longest",
+            truncation=True,
+            max_length=max_length,
+            return_tensors="np",
+        )
+        input_ids = encodings["input_ids"].astype(np.int64)
+        return model(input_ids, encodings["attention_mask"].astype(np.int64))
+
+    return predict
+
+
 # Engine for training and inference
 class TextScalerEngine:
-    def __init__(self, dataframe, model, tokenizer):
+    """
+    With an EmbeddingCache the frozen BERT runs once per review text, in `embed`,
+    and training only runs the regressor over the cached pooled outputs. Without
+    one every batch of every epoch goes through BERT, from a TokenStore in
+    `token_directory` (a temporary one by default) in length bucketed batches
+    """
+
+    def __init__(self, dataframe, model, tokenizer, cache=None, token_directory=None):
         self.dataframe = dataframe
         self.tokenizer = tokenizer
         self.model = model
+        self.cache = cache
+        self.token_directory = token_directory
+        self.token_store = None
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        # Extract labels
+        self.labels = self.dataframe[LABELS].values
+
+    def tokens(self):
+        """The TokenStore of the dataframe's texts, tokenized on first use"""
+        if self.token_store is None:
+            if self.token_directory is None:
+                self._temporary = tempfile.TemporaryDirectory()
+                self.token_directory = self._temporary.name
+            texts = self.dataframe["text"].tolist()
+            self.token_store = TokenStore.build(self.token_directory, texts, self.tokenizer)
+        return self.token_store
 
-        # Tokenize the text
-        self.encodings = tokenizer.batch_encode_plus(
-            self.dataframe["text"].tolist(),
+    def tokenize(self, texts):
+        return self.tokenizer.batch_encode_plus(
+            texts,
             padding="longest",
             truncation=True,
             max_length=512,
             return_tensors="pt",
         )
 
-        # Extract labels
-        self.labels = self.dataframe[
-            [
-                "average_menu",
-                "average_taste",
-                "average_indoor_atmosphere",
-                "average_outdoor_atmosphere",
-            ]
-        ].values
+    def embed(self, batch_size=32):
+        """
+        (reviews, hidden size) pooled outputs of the dataframe's texts, running
+        BERT only over the texts not in the cache yet
+        """
+        texts = self.dataframe["text"].tolist()
+        # similar lengths together, less padding per batch
+        missing = sorted(self.cache.missing(texts), key=len)
+        if missing:
+            print(f"[embeddings] embedding {len(missing)} of {len(texts)} reviews")
+            self.model = self.model.to(self.device)
+            self.model.eval()
+            with torch.no_grad():
+                for start in range(0, len(missing), batch_size):
+                    chunk = missing[start : start + batch_size]
+                    encodings = self.tokenize(chunk)
+                    pooled = self.model.embed(
+                        encodings["input_ids"].to(self.device),
+                        encodings["attention_mask"].to(self.device),
+                    )
+                    self.cache.add(chunk, pooled.cpu().numpy())
+        return self.cache.get(texts)
 
     def create_data_loaders(self, test_size=0.1, batch_size=16):
         # Train-test split
-        train_encodings, val_encodings, train_labels, val_labels = train_test_split(
-            self.encodings, self.labels, test_size=test_size
+        train_indices, val_indices = train_test_split(
+            np.arange(len(self.labels)), test_size=test_size
         )
 
-        # Create datasets
-        train_dataset = ReviewDataset(train_encodings, train_labels)
-        val_dataset = ReviewDataset(val_encodings, val_labels)
+        # Cached embeddings when there is a cache
+        if self.cache is not None:
+            dataset = TensorDataset(
+                torch.from_numpy(np.array(self.embed(), dtype=np.float32)),
+                torch.tensor(self.labels, dtype=torch.float),
+            )
+            train_loader = DataLoader(
+                Subset(dataset, train_indices), batch_size=batch_size, shuffle=True
+            )
+            val_loader = DataLoader(Subset(dataset, val_indices), batch_size=batch_size)
+            return train_loader, val_loader
+
+        # Token batches padded to their own longest review otherwise
+        loaders = []
+        for indices, shuffle in ((train_indices, True), (val_indices, False)):
+            dataset = ReviewDataset(
+                self.tokens(), self.labels, indices, self.tokenizer.pad_token_id or 0
+            )
+            sampler = LengthBucketSampler(dataset.lengths(), batch_size, shuffle=shuffle)
+            loaders.append(DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate))
+        return tuple(loaders)
 
-        # Create data loaders
-        train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-        val_loader = DataLoader(val_dataset, batch_size=batch_size)
-        return train_loader, val_loader
+    def _outputs(self, batch):
+        # (embeddings, labels) batches only need the regressor
+        if isinstance(batch, (list, tuple)):
+            return self.model.regressor(batch[0].to(self.device)), batch[1].to(self.device)
+        input_ids = batch["input_ids"].to(self.device)
+        attention_mask = batch["attention_mask"].to(self.device)
+        return self.model(input_ids, attention_mask), batch["labels"].to(self.device)
 
     def train(self, train_loader, val_loader, epochs=3):
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        device = self.device
         self.model = self.model.to(device)
         criterion = nn.MSELoss()
-        optimizer = optim.Adam(self.model.parameters(), lr=2e-5)
+        parameters = [param for param in self.model.parameters() if param.requires_grad]
+        optimizer = optim.Adam(parameters, lr=2e-5)
 
         for epoch in range(epochs):
             self.model.train()
             for batch in train_loader:
                 optimizer.zero_grad()
-                input_ids = batch["input_ids"].to(device)
-                attention_mask = batch["attention_mask"].to(device)
-                labels = batch["labels"].to(device)
-                outputs = self.model(input_ids, attention_mask)
+                outputs, labels = self._outputs(batch)
                 loss = criterion(outputs, labels)
                 loss.backward()
                 optimizer.step()
@@ -101,10 +389,7 @@ class TextScalerEngine:
             total_loss = 0
             with torch.no_grad():
                 for batch in val_loader:
-                    input_ids = batch["input_ids"].to(device)
-                    attention_mask = batch["attention_mask"].to(device)
-                    labels = batch["labels"].to(device)
-                    outputs = self.model(input_ids, attention_mask)
+                    outputs, labels = self._outputs(batch)
                     loss = criterion(outputs, labels)
                     total_loss += loss.item()
             print(f"Validation Loss: {total_loss / len(val_loader)}")
@@ -0,0 +1,200 @@
+import argparse
+from collections import defaultdict
+from functools import lru_cache
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from api.config import Config, get_config
+from api.core.query_stats import current_route, fingerprint
+
+_EXPLAIN_SAVEPOINT = "slow_query_explain"
+# an executemany record carries this many of its parameter sets
+_MAX_PARAMETER_SETS = 10
+
+
+def _setting(config: Config, name: str):
+    # .env.example ships LOGGER_* empty, fall back to the Config defaults
+    return getattr(config, name) or Config.model_fields[name].default
+
+
+def _redact(statement: str, parameters):
+    """
+    Passwords masked: named parameters by key, positional ones (asyncpg's tuples)
+    have no names, they are all masked when the statement mentions a password
+    """
+    if isinstance(parameters, dict):
+        return {
+            key: "***" if "password" in key else value for key, value in parameters.items()
+        }
+    if isinstance(parameters, (tuple, list)):
+        if "password" in statement.lower():
+            return ["***"] * len(parameters)
+        return list(parameters)
+    return parameters
+
+
+class SlowQueryLog:
+    """
+    Writes statements slower than `threshold_ms` (negative disables) to a rotating
+    log, one JSON object per line, with the route, bound parameters and the plan.
+
+    SELECTs are re-run under EXPLAIN (ANALYZE, BUFFERS) so the plan has real
+    timings; anything that writes only gets a plain EXPLAIN. The EXPLAIN runs in
+    a savepoint on a fresh cursor so a failure can't poison the caller's
+    transaction or result set.
+    """
+
+    def __init__(self, path: str, threshold_ms: int, explain: bool, logger: logging.Logger):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.logger = logger
+
+    def observe(self, dbapi_connection, statement, parameters, seconds, executemany):
+        if self.threshold_ms < 0 or seconds * 1000 < self.threshold_ms:
+            return
+        if statement.lstrip().upper().startswith(("EXPLAIN", "SAVEPOINT", "RELEASE", "ROLLBACK")):
+            return
+        record = {
+            "ms": round(seconds * 1000, 3),
+            "route": current_route(),
+            "fingerprint": fingerprint(statement),
+            "statement": statement,
+            "parameters": (
+                [_redact(statement, each) for each in parameters[:_MAX_PARAMETER_SETS]]
+                if executemany
+                else _redact(statement, parameters)
+            ),
+            "plan": None,
+        }
+        if self.explain and not executemany:
+            record["plan"] = SlowQueryLog.capture_plan(dbapi_connection, statement, parameters)
+        self.logger.warning(json.dumps(record, default=str))
+
+    @staticmethod
+    def capture_plan(dbapi_connection, statement, parameters):
+        head = statement.lstrip().upper()
+        read_only = head.startswith(("SELECT", "WITH")) and not any(
+            verb in head for verb in ("INSERT ", "UPDATE ", "DELETE ")
+        )
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if read_only else "FORMAT JSON"
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            try:
+                cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+                plan = cursor.fetchone()[0]
+                cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            except Exception as e:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                return {"error": str(e)}
+        except Exception as e:
+            # not in a transaction (autocommit) or the connection is gone
+            return {"error": str(e)}
+        finally:
+            cursor.close()
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+
+@lru_cache()
+def get_slow_query_log():
+    config = get_config()
+    path = _setting(config, "LOGGER_FILE")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=config.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=config.SLOW_QUERY_LOG_BACKUPS,
+    )
+    handler.setFormatter(
+        logging.Formatter(_setting(config, "LOGGER_FORMAT"), _setting(config, "DATE_FORMAT"))
+    )
+    logger = logging.getLogger("sitesync.slow_query")
+    logger.handlers = [handler]
+    logger.propagate = False
+    return SlowQueryLog(path, config.SLOW_QUERY_MS, config.SLOW_QUERY_EXPLAIN, logger)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, _cursor, statement, parameters, _context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    get_slow_query_log().observe(
+        conn.connection.dbapi_connection, statement, parameters, seconds, executemany
+    )
+
+
+def read_log(path: str):
+    """Records from the log and its rotated backups, oldest file first"""
+    paths = [path]
+    while os.path.exists(f"{path}.{len(paths)}"):
+        paths.insert(0, f"{path}.{len(paths)}")
+    for file in paths:
+        if not os.path.exists(file):
+            continue
+        with open(file) as lines:
+            for line in lines:
+                if "{" not in line:
+                    continue
+                try:
+                    yield json.loads(line[line.index("{") :])
+                except ValueError:
+                    continue
+
+
+def worst(records, top: int = 10, by: str = "total"):
+    """Aggregates records per fingerprint, heaviest first"""
+    groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set()})
+    for record in records:
+        group = groups[record["fingerprint"]]
+        group["count"] += 1
+        group["total_ms"] += record["ms"]
+        if record["ms"] >= group["max_ms"]:
+            group["max_ms"] = record["ms"]
+            group["slowest"] = record
+        if record.get("route"):
+            group["routes"].add(record["route"])
+    key = {"total": "total_ms", "max": "max_ms", "count": "count"}[by]
+    ranked = sorted(groups.items(), key=lambda item: -item[1][key])
+    return [{"fingerprint": fp, **group} for fp, group in ranked[:top]]
+
+
+def main():
+    """
+    List the worst slow queries
+
+        poetry run slow-queries --top 20 --by max --plan
+    """
+    parser = argparse.ArgumentParser(description="worst offenders from the slow query log")
+    parser.add_argument("--file", default=None, help="defaults to LOGGER_FILE")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--by", choices=["total", "max", "count"], default="total")
+    parser.add_argument("--plan", action="store_true", help="print the slowest run's plan")
+    args = parser.parse_args()
+
+    path = args.file or _setting(get_config(), "LOGGER_FILE")
+    for n, group in enumerate(worst(read_log(path), args.top, args.by), start=1):
+        print(
+            f"#{n} count={group['count']} total={group['total_ms']:.1f}ms "
+            f"max={group['max_ms']:.1f}ms avg={group['total_ms'] / group['count']:.1f}ms"
+        )
+        print(f"   routes: {', '.join(sorted(group['routes'])) or '-'}")
+        print(f"   {group['fingerprint'][:300]}")
+        if args.plan and group["slowest"].get("plan"):
+            print(json.dumps(group["slowest"]["plan"], indent=2))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
+import asyncio
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from functools import lru_cache
+import threading
+import time
 from passlib.context import CryptContext
 from pydantic import model_validator
 
@@ -8,14 +12,116 @@ def get_crypt_context():
     return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def hash_password(password: str):
+def _hash(password: str):
     return get_crypt_context().hash(password)
 
 
-def verify_password(password, expected_hash):
+def _verify(password, expected_hash):
     return get_crypt_context().verify(password, expected_hash)
 
 
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated pool so password work never occupies the anyio
+    threadpool that serves every other route.
+
+    - `workers` caps how many hashes run at once
+    - `max_queue` caps how many may be waiting; beyond it calls fail fast with
+    PasswordHasherBusy instead of piling up behind a login storm
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor: Executor = (
+            ProcessPoolExecutor(max_workers=workers)
+            if kind == "process"
+            else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        )
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+
+    def depth(self):
+        """Jobs submitted but not finished, running ones included"""
+        return self.submitted - self.completed
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.max_queue and self.depth() >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth())
+        start = time.perf_counter()
+        future = self.executor.submit(fn, *args)
+
+        def done(_):
+            with self._lock:
+                self.completed += 1
+                self.total_wait += time.perf_counter() - start
+
+        future.add_done_callback(done)
+        return future
+
+    def hash(self, password: str) -> str:
+        return self._submit(_hash, password).result()
+
+    def verify(self, password, expected_hash) -> bool:
+        return self._submit(_verify, password, expected_hash).result()
+
+    async def verify_async(self, password, expected_hash) -> bool:
+        return await asyncio.wrap_future(self._submit(_verify, password, expected_hash))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "depth": self.depth(),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_latency_ms": (self.total_wait / self.completed * 1000)
+                if self.completed
+                else 0.0,
+            }
+
+
+@lru_cache()
+def get_password_hasher():
+    from api.config import get_config
+
+    config = get_config()
+    return PasswordHasher(
+        config.PASSWORD_HASH_POOL,
+        config.PASSWORD_HASH_WORKERS,
+        config.PASSWORD_HASH_MAX_QUEUE,
+    )
+
+
+def hash_password(password: str):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(password, expected_hash):
+    return get_password_hasher().verify(password, expected_hash)
+
+
+async def verify_password_async(password, expected_hash):
+    return await get_password_hasher().verify_async(password, expected_hash)
+
+
 class HashedPassword(str):
     """Takes a plain text password and hashes it"""
 
@@ -14,7 +14,7 @@ from api.models.utils import (
     HomeownerReviewItem,
 )
 from api.models.user import User, UserRole, UserCreate, UserCreateView
-from api.models.quiz.model import WorkUnit, WorkUnitView
+from api.models.quiz.model import WorkUnit, WorkUnitView, WorkUnitSearchView
 from api.models.contractor import (
     Contractor,
     ContractorCreate,
@@ -23,6 +23,8 @@ from api.models.contractor import (
     ContractorAnalytics,
     ContractorAreaPreference,
     ContractorUnitPreference,
+    ContractorPreferenceChange,
+    ContractorProfile,
     ContractorPreferencesView,
     ContractorPreferencesCreate,
     ContractorPrivateView,
@@ -95,3 +97,4 @@ from api.models.quote import (
 from api.models.search_filter import (
     Filter,
 )
+from api.models.search_page import SearchPage, SearchSort
@@ -10,27 +10,37 @@ from sqlalchemy import (
     UUID,
     Column,
     ForeignKey,
+    Index,
     and_,
     func,
+    text,
 )
 from sqlmodel import SQLModel, Session, select, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
 from api.config import get_config
 from api.core.error import APIError
 from api.models.contractor import (
     Contractor,
     ContractorAreaPreference,
     ContractorPreferencesCreate,
+    ContractorProfile,
     ContractorPublicView,
     ContractorUnitPreference,
 )
 from api.models.homeowner import Homeowner, HomeownerPublicView
+from api.models.matching import get_match_index_async, search_async
+from api.models.quiz.catalog import get_work_unit_catalog
 from api.models.quiz.model import WorkUnit
+from api.models.search_page import SearchPage
 from api.models.utils import Image, ImageView
 from api.utils.faky import Faky
 
 
 class BookingImage(Image, table=True):
     __tablename__ = "booking_images"
+    __table_args__ = (
+        Index("ix_booking_images_booking_id", "booking_id"),
+    )
 
     booking_id: uuid.UUID = Field(
         sa_column=Column(
@@ -98,6 +108,9 @@ class BookingUnitCreate(BookingUnitBase):
 
 class BookingUnit(BookingUnitBase, table=True):
     __tablename__ = "booking_units"
+    __table_args__ = (
+        Index("ix_booking_units_booking_id", "booking_id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, nullable=False, unique=True)
     booking_id: uuid.UUID = Field(
         sa_column=Column(
@@ -126,16 +139,20 @@ class BookingUnitView(BookingUnitBase):
 
     @staticmethod
     def create(units, db: Session):
-        work_units = WorkUnit.by_ids([unit["work_unit_id"] for unit in units], db)
+        catalog = get_work_unit_catalog(db)
         models: List[BookingUnitView] = []
-        for idx, unit in enumerate(units):
+        for unit in units:
+            # units gone from the catalog are skipped, like in the portfolio views
+            work_unit = catalog.concat(unit["work_unit_id"])
+            if work_unit is None:
+                continue
             models.append(
                 BookingUnitView(
                     work_unit_id=unit["work_unit_id"],
                     quantity=unit["quantity"],
                     description=unit["description"],
                     booking_id=unit["booking_unit_id"],
-                    work_unit=work_units[idx][0].concat(),
+                    work_unit=work_unit,
                 )
             )
         return models
@@ -208,6 +225,15 @@ class BookingDetailCreate(BookingDetailBase):
 
 class BookingDetail(BookingDetailBase, table=True):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_homeowner_id", "homeowner_id", "created_at"),
+        # open bookings, what the homeowner lists and contractor matching read
+        Index(
+            "ix_bookings_homeowner_id_open",
+            "homeowner_id",
+            postgresql_where=text("is_active AND NOT is_booked"),
+        ),
+    )
 
     id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, unique=True, primary_key=True)
     homeowner_id: uuid.UUID = Field(foreign_key="homeowners.id", nullable=False)
@@ -216,8 +242,8 @@ class BookingDetail(BookingDetailBase, table=True):
     is_booked: Optional[bool] = Field(default=False)
 
     @staticmethod
-    def by_hid_active_list(hid: uuid.UUID, db: Session):
-        return db.exec(
+    def by_hid_active_list_query(hid: uuid.UUID):
+        return (
             select(
                 BookingDetail,
                 func.jsonb_agg(
@@ -253,7 +279,15 @@ class BookingDetail(BookingDetailBase, table=True):
             .join(BookingUnit, BookingUnit.booking_id == BookingDetail.id)
             .join(WorkUnit, WorkUnit.id == BookingUnit.work_unit_id)
             .group_by(BookingDetail)
-        ).all()
+        )
+
+    @staticmethod
+    def by_hid_active_list(hid: uuid.UUID, db: Session):
+        return db.exec(BookingDetail.by_hid_active_list_query(hid)).all()
+
+    @staticmethod
+    async def by_hid_active_list_async(hid: uuid.UUID, db: AsyncSession):
+        return (await db.exec(BookingDetail.by_hid_active_list_query(hid))).all()
 
     @staticmethod
     def by_hid_active(bid: uuid.UUID, hid: uuid.UUID, db: Session):
@@ -462,7 +496,7 @@ class BookingDetail(BookingDetailBase, table=True):
         return booking
 
     @staticmethod
-    def match_all(bid: uuid.UUID, db: Session):
+    def match_all_query(bid: uuid.UUID):
         units_q = (
             select(
                 BookingDetail.zipcode,
@@ -532,35 +566,34 @@ class BookingDetail(BookingDetailBase, table=True):
             .cte("cnt_units_ids")
         )
         query = (
-            select(
-                Contractor,
-                func.array_agg(WorkUnit.profession.distinct()).filter(
-                    WorkUnit.profession.isnot(None),
-                ),
-                func.array_agg(ContractorAreaPreference.area.distinct()).filter(
-                    ContractorAreaPreference.area.isnot(None),
-                ),
-            )
+            select(Contractor, ContractorProfile.professions, ContractorProfile.areas)
             .where(Contractor.id == cnt_ids_q.c.id)
-            .outerjoin(
-                ContractorUnitPreference,
-                ContractorUnitPreference.contractor_id == Contractor.id,
-            )
-            .outerjoin(WorkUnit, WorkUnit.id == ContractorUnitPreference.work_unit_id)
-            .outerjoin(
-                ContractorAreaPreference,
-                ContractorAreaPreference.contractor_id == Contractor.id,
-            )
-            .distinct()
-            .group_by(Contractor)
+            .outerjoin(ContractorProfile, ContractorProfile.contractor_id == Contractor.id)
         )
+        return query
 
-        contractors = db.execute(query).all()
+    @staticmethod
+    def match_all(bid: uuid.UUID, db: Session):
+        return db.execute(BookingDetail.match_all_query(bid)).all()
 
-        return contractors
+    @staticmethod
+    async def match_all_async(bid: uuid.UUID, page: SearchPage, db: AsyncSession):
+        """
+        `page` of the rows of `match_all`, matched by the in-process
+        ContractorMatchIndex, and the next page's cursor
+        """
+        query = (
+            select(BookingDetail.zipcode, BookingUnit.work_unit_id)
+            .join(BookingUnit, BookingUnit.booking_id == BookingDetail.id)
+            .where(BookingDetail.id == bid)
+        )
+        units = (await db.exec(query)).all()
+        if not units:
+            return [], None
+        return await search_async([unit[1] for unit in units], units[0][0], page, db)
 
     @staticmethod
-    def match_all_by_hid_and_cid(hid: uuid.UUID, cid: uuid.UUID, db: Session):
+    def match_all_by_hid_and_cid_query(hid: uuid.UUID, cid: uuid.UUID):
         units_q = (
             select(ContractorUnitPreference.work_unit_id)
             .where(ContractorUnitPreference.contractor_id == cid)
@@ -630,7 +663,27 @@ class BookingDetail(BookingDetailBase, table=True):
             .group_by(BookingDetail)
             .distinct()
         )
-        return db.exec(query).all()
+        return query
+
+    @staticmethod
+    def match_all_by_hid_and_cid(hid: uuid.UUID, cid: uuid.UUID, db: Session):
+        return db.exec(BookingDetail.match_all_by_hid_and_cid_query(hid, cid)).all()
+
+    @staticmethod
+    async def match_all_by_hid_and_cid_async(
+        hid: uuid.UUID, cid: uuid.UUID, db: AsyncSession
+    ):
+        """Open bookings whose units the contractor all covers, units from the match index"""
+        index = await get_match_index_async(db)
+        units, _ = index.preferences(cid)
+        if not units:
+            return []
+        bookings = await BookingDetail.by_hid_active_list_async(hid, db)
+        return [
+            booking
+            for booking in bookings
+            if {unit["work_unit_id"] for unit in booking[1]} <= units
+        ]
 
     @staticmethod
     def create(hid: uuid.UUID, booking: BookingDetailCreate, db: Session):
@@ -685,6 +738,9 @@ class BookingInviteCreate(SQLModel):
 
 class BookingInvite(SQLModel, table=True):
     __tablename__ = "booking_invites"
+    __table_args__ = (
+        Index("ix_booking_invites_contractor_id", "contractor_id", "accepted", "rejected"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, nullable=False, unique=True)
     booking_id: uuid.UUID = Field(foreign_key="bookings.id", primary_key=True)
     contractor_id: uuid.UUID = Field(foreign_key="contractors.id", primary_key=True)
@@ -760,7 +816,7 @@ class BookingInvite(SQLModel, table=True):
         return model
 
     @staticmethod
-    def accepted_by_cid(cid: uuid.UUID, db: Session):
+    def accepted_by_cid_query(cid: uuid.UUID):
         query = (
             select(
                 BookingInvite.booking_id,
@@ -812,11 +868,18 @@ class BookingInvite(SQLModel, table=True):
             .join(Homeowner, Homeowner.id == BookingDetail.homeowner_id)
             .group_by(BookingInvite, BookingDetail, Homeowner)
         )
-        models = db.execute(query).all()
-        return models
+        return query
 
     @staticmethod
-    def invites_ids_by_cid(cid: uuid.UUID, db: Session):
+    def accepted_by_cid(cid: uuid.UUID, db: Session):
+        return db.execute(BookingInvite.accepted_by_cid_query(cid)).all()
+
+    @staticmethod
+    async def accepted_by_cid_async(cid: uuid.UUID, db: AsyncSession):
+        return (await db.execute(BookingInvite.accepted_by_cid_query(cid))).all()
+
+    @staticmethod
+    def invites_ids_by_cid_query(cid: uuid.UUID):
         query = (
             select(
                 BookingInvite.booking_id,
@@ -868,8 +931,15 @@ class BookingInvite(SQLModel, table=True):
             .join(WorkUnit, WorkUnit.id == BookingUnit.work_unit_id)
             .group_by(BookingInvite, BookingDetail, Homeowner)
         )
-        models = db.execute(query).all()
-        return models
+        return query
+
+    @staticmethod
+    def invites_ids_by_cid(cid: uuid.UUID, db: Session):
+        return db.execute(BookingInvite.invites_ids_by_cid_query(cid)).all()
+
+    @staticmethod
+    async def invites_ids_by_cid_async(cid: uuid.UUID, db: AsyncSession):
+        return (await db.execute(BookingInvite.invites_ids_by_cid_query(cid))).all()
 
     @staticmethod
     def create(booking: BookingInviteCreate, db: Session):
@@ -1,14 +1,27 @@
+from datetime import datetime
 import os
 from posixpath import splitext
 import uuid
 from fastapi import Form
 from pydantic import BaseModel, EmailStr, SecretStr
 import requests
-from sqlalchemy import UUID, ForeignKey, func
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    BigInteger,
+    DateTime,
+    Engine,
+    ForeignKey,
+    Index,
+    String,
+    func,
+    text,
+)
 from sqlmodel import SQLModel, Field, Column, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Annotated, List, Optional
 from api.config import get_config
-from api.models.quiz.model import WorkUnit
+from api.models.quiz.catalog import get_work_unit_catalog
 from api.models.user import User, UserCreate, UserRole
 from api.models.utils import RatingBase
 from api.utils.faky import Faky
@@ -40,6 +53,10 @@ class ContractorRating(RatingBase):
 
 class ContractorAreaPreference(SQLModel, table=True):
     __tablename__ = "contractor_area_preferences"
+    __table_args__ = (
+        # (area, contractor_id) primary key already serves lookups by area
+        Index("ix_contractor_area_preferences_contractor_id", "contractor_id"),
+    )
 
     area: str = Field(primary_key=True)
     contractor_id: uuid.UUID = Field(
@@ -91,6 +108,9 @@ class ContractorAreaPreference(SQLModel, table=True):
 
 class ContractorUnitPreference(SQLModel, table=True):
     __tablename__ = "contractor_profession_preferences"
+    __table_args__ = (
+        Index("ix_contractor_profession_preferences_contractor_id", "contractor_id"),
+    )
 
     work_unit_id: int = Field(foreign_key="work_units.id", primary_key=True)
     contractor_id: uuid.UUID = Field(
@@ -120,10 +140,10 @@ class ContractorUnitPreference(SQLModel, table=True):
 
     @staticmethod
     def create_from_professions(cid: uuid.UUID, professions: List[str], db: Session):
-        unit_ids = WorkUnit.professions_to_ids(professions, db)
+        unit_ids = get_work_unit_catalog(db).professions_to_ids(professions)
         models: List[ContractorUnitPreference] = []
-        for unit in unit_ids:
-            models.append(ContractorUnitPreference(contractor_id=cid, work_unit_id=unit[0]))
+        for unit_id in unit_ids:
+            models.append(ContractorUnitPreference(contractor_id=cid, work_unit_id=unit_id))
         db.add_all(models)
         return models
 
@@ -147,6 +167,228 @@ class ContractorUnitPreference(SQLModel, table=True):
         return models
 
 
+# (table, event, transition tables) of the statement level triggers on the preference tables
+PREFERENCE_TRIGGER_EVENTS = [
+    (table, event, transition)
+    for table in ("contractor_profession_preferences", "contractor_area_preferences")
+    for event, transition in (
+        ("INSERT", "NEW TABLE AS new_rows"),
+        ("UPDATE", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+        ("DELETE", "OLD TABLE AS old_rows"),
+    )
+]
+
+# one row per contractor per statement that touched their unit or area preferences.
+# The trigger lists below are copied into their migrations (4429e120c5ce, b3f08c6e41d2,
+# 7b1e5d20a9f4): a change here needs a new revision carrying it
+PREFERENCE_CHANGE_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION log_contractor_preference_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO contractor_preference_changes (contractor_id)
+            SELECT DISTINCT contractor_id FROM new_rows;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            INSERT INTO contractor_preference_changes (contractor_id)
+            SELECT DISTINCT contractor_id FROM old_rows;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    f"""
+    CREATE OR REPLACE TRIGGER {table}_{event.lower()}_log AFTER {event} ON {table}
+    REFERENCING {transition} FOR EACH STATEMENT
+    EXECUTE FUNCTION log_contractor_preference_change()
+    """
+    for table, event, transition in PREFERENCE_TRIGGER_EVENTS
+]
+
+# and per statement that changed their ratings
+RATING_CHANGE_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION log_contractor_rating_change() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO contractor_preference_changes (contractor_id)
+        SELECT n.id FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.quality_rating, n.budget_rating, n.on_schedule_rating)
+            IS DISTINCT FROM (o.quality_rating, o.budget_rating, o.on_schedule_rating);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER contractors_update_log AFTER UPDATE ON contractors
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION log_contractor_rating_change()
+    """,
+]
+
+
+class ContractorPreferenceChange(SQLModel, table=True):
+    """
+    Written by triggers on the preference tables and on rating updates, so every
+    writer (routes, mocks, manual SQL) reaches the in-process match index. `xid`
+    is the writing transaction, readers poll by it (see api.models.matching)
+    """
+
+    __tablename__ = "contractor_preference_changes"
+    __table_args__ = (Index("ix_contractor_preference_changes_xid", "xid"),)
+
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger, primary_key=True))
+    contractor_id: uuid.UUID = Field(sa_column=Column(UUID(as_uuid=True), nullable=False))
+    xid: int = Field(
+        sa_column=Column(
+            BigInteger,
+            nullable=False,
+            server_default=text("pg_current_xact_id()::text::bigint"),
+        )
+    )
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    )
+
+    @staticmethod
+    def init_table(engine: Engine):
+        with engine.connect() as db:
+            for statement in PREFERENCE_CHANGE_TRIGGERS + RATING_CHANGE_TRIGGERS:
+                db.execute(text(statement))
+            db.commit()
+
+
+# contractor_profiles rows are recomputed by these, in the transaction that wrote the
+# preferences
+CONTRACTOR_PROFILE_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION contractor_profile_of(
+        cid uuid, OUT professions varchar[], OUT areas varchar[]
+    ) AS $$
+        SELECT
+            (SELECT array_agg(DISTINCT w.profession)
+            FROM contractor_profession_preferences u JOIN work_units w ON w.id = u.work_unit_id
+            WHERE u.contractor_id = cid),
+            (SELECT array_agg(DISTINCT a.area)
+            FROM contractor_area_preferences a WHERE a.contractor_id = cid)
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_contractor_profiles(cids uuid[]) RETURNS void AS $$
+    BEGIN
+        -- one writer per contractor at a time, the next one recomputes from committed rows
+        PERFORM pg_advisory_xact_lock(hashtextextended(cid::text, 0))
+        FROM (SELECT DISTINCT unnest(cids) AS cid ORDER BY 1) c;
+        DELETE FROM contractor_profiles WHERE contractor_id = ANY(cids);
+        INSERT INTO contractor_profiles (contractor_id, professions, areas)
+        SELECT c.cid, p.professions, p.areas
+        FROM (SELECT DISTINCT unnest(cids) AS cid) c, contractor_profile_of(c.cid) p
+        WHERE p.professions IS NOT NULL OR p.areas IS NOT NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION contractor_profiles_on_preferences() RETURNS trigger AS $$
+    DECLARE
+        cids uuid[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(DISTINCT contractor_id) INTO cids FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(DISTINCT contractor_id) INTO cids FROM old_rows;
+        ELSE
+            SELECT array_agg(contractor_id) INTO cids FROM (
+                SELECT contractor_id FROM new_rows UNION SELECT contractor_id FROM old_rows
+            ) r;
+        END IF;
+        IF cids IS NOT NULL THEN
+            PERFORM sync_contractor_profiles(cids);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # renaming a profession renames it in the profiles of everyone who picked its units
+    """
+    CREATE OR REPLACE FUNCTION contractor_profiles_on_work_units() RETURNS trigger AS $$
+    DECLARE
+        cids uuid[];
+    BEGIN
+        SELECT array_agg(DISTINCT u.contractor_id) INTO cids
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN contractor_profession_preferences u ON u.work_unit_id = n.id
+        WHERE n.profession IS DISTINCT FROM o.profession;
+        IF cids IS NOT NULL THEN
+            PERFORM sync_contractor_profiles(cids);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER work_units_update_profile AFTER UPDATE ON work_units
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows FOR EACH STATEMENT
+    EXECUTE FUNCTION contractor_profiles_on_work_units()
+    """,
+] + [
+    f"""
+    CREATE OR REPLACE TRIGGER {table}_{event.lower()}_profile AFTER {event} ON {table}
+    REFERENCING {transition} FOR EACH STATEMENT
+    EXECUTE FUNCTION contractor_profiles_on_preferences()
+    """
+    for table, event, transition in PREFERENCE_TRIGGER_EVENTS
+]
+
+# contractors whose stored profile differs from the one computed from their preferences
+_PROFILE_DRIFT = text(
+    """
+    SELECT c.id, p.professions, p.areas, e.professions, e.areas
+    FROM contractors c
+    LEFT JOIN contractor_profiles p ON p.contractor_id = c.id
+    CROSS JOIN LATERAL contractor_profile_of(c.id) e
+    WHERE p.professions IS DISTINCT FROM e.professions OR p.areas IS DISTINCT FROM e.areas
+    """
+)
+
+
+class ContractorProfile(SQLModel, table=True):
+    """
+    Professions and areas of each contractor with any preference, sorted and
+    distinct, the same arrays the old array_agg GROUP BY produced. Kept in sync
+    by triggers on the preference tables (and on work unit renames), so profile
+    and search reads are one primary key join.
+    """
+
+    __tablename__ = "contractor_profiles"
+
+    contractor_id: uuid.UUID = Field(
+        sa_column=Column(
+            UUID(as_uuid=True),
+            ForeignKey("contractors.id", initially="DEFERRED", deferrable=True),
+            primary_key=True,
+        )
+    )
+    professions: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    areas: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+
+    @staticmethod
+    def init_table(engine: Engine):
+        with engine.connect() as db:
+            for statement in CONTRACTOR_PROFILE_TRIGGERS:
+                db.execute(text(statement))
+            db.commit()
+
+    @staticmethod
+    def drift(db: Session):
+        """(contractor id, stored professions, stored areas, expected professions, expected areas)"""
+        return db.execute(_PROFILE_DRIFT).all()
+
+    @staticmethod
+    def sync(cids: List[uuid.UUID], db: Session):
+        db.execute(text("SELECT sync_contractor_profiles(:cids)"), {"cids": list(cids)})
+
+
 class ContractorPreferencesCreate(BaseModel):
     areas: Optional[List[str]]
     professions: Optional[List[str]]
@@ -169,10 +411,9 @@ class ContractorPreferencesCreate(BaseModel):
     ):
         return ContractorPreferencesCreate(
             areas=[area.area for area in areas],
-            professions=[
-                unit[0]
-                for unit in WorkUnit.ids_to_professions([unit.work_unit_id for unit in units], db)
-            ],
+            professions=get_work_unit_catalog(db).ids_to_professions(
+                [unit.work_unit_id for unit in units]
+            ),
         )
 
 
@@ -192,10 +433,9 @@ class ContractorPreferencesView(BaseModel):
     ):
         return ContractorPreferencesView(
             areas=[area.area for area in areas],
-            professions=[
-                unit[0]
-                for unit in WorkUnit.ids_to_professions([unit.work_unit_id for unit in units], db)
-            ],
+            professions=get_work_unit_catalog(db).ids_to_professions(
+                [unit.work_unit_id for unit in units]
+            ),
         )
 
 
@@ -249,56 +489,27 @@ class Contractor(ContractorRating, table=True):
     avatar_uri: Optional[str] = Field(nullable=True, default=None)
 
     @staticmethod
-    def by_cid(cid: uuid.UUID, db: Session):
-        query = (
-            select(
-                Contractor,
-                func.array_agg(WorkUnit.profession.distinct()).filter(
-                    WorkUnit.profession.isnot(None),
-                ),
-                func.array_agg(ContractorAreaPreference.area.distinct()).filter(
-                    ContractorAreaPreference.area.isnot(None),
-                ),
-            )
+    def by_cid_query(cid: uuid.UUID):
+        return (
+            select(Contractor, ContractorProfile.professions, ContractorProfile.areas)
             .where(Contractor.id == cid)
-            .outerjoin(
-                ContractorUnitPreference,
-                ContractorUnitPreference.contractor_id == Contractor.id,
-            )
-            .outerjoin(WorkUnit, WorkUnit.id == ContractorUnitPreference.work_unit_id)
-            .outerjoin(
-                ContractorAreaPreference,
-                ContractorAreaPreference.contractor_id == Contractor.id,
-            )
-            .group_by(Contractor)
+            .outerjoin(ContractorProfile, ContractorProfile.contractor_id == Contractor.id)
         )
-        contractor = db.exec(query).first()
-        return contractor
+
+    @staticmethod
+    def by_cid(cid: uuid.UUID, db: Session):
+        return db.exec(Contractor.by_cid_query(cid)).first()
+
+    @staticmethod
+    async def by_cid_async(cid: uuid.UUID, db: AsyncSession):
+        return (await db.exec(Contractor.by_cid_query(cid))).first()
 
     @staticmethod
     def by_cids(cids: List[uuid.UUID], db: Session):
         query = (
-            select(
-                Contractor,
-                func.array_agg(WorkUnit.profession.distinct()).filter(
-                    WorkUnit.profession.isnot(None),
-                ),
-                func.array_agg(ContractorAreaPreference.area.distinct()).filter(
-                    ContractorAreaPreference.area.isnot(None),
-                ),
-            )
+            select(Contractor, ContractorProfile.professions, ContractorProfile.areas)
             .where(Contractor.id.in_(cids))
-            .outerjoin(
-                ContractorUnitPreference,
-                ContractorUnitPreference.contractor_id == Contractor.id,
-            )
-            .outerjoin(WorkUnit, WorkUnit.id == ContractorUnitPreference.work_unit_id)
-            .outerjoin(
-                ContractorAreaPreference,
-                ContractorAreaPreference.contractor_id == Contractor.id,
-            )
-            .distinct()
-            .group_by(Contractor)
+            .outerjoin(ContractorProfile, ContractorProfile.contractor_id == Contractor.id)
         )
         contractor = db.exec(query).all()
         return contractor
@@ -388,3 +599,5 @@ class ContractorPrivateView(ContractorRating):
 
 class SearchContractorList(SQLModel):
     contractors: List[ContractorPublicView]
+    # pass back as `cursor` for the next page, None on the last one
+    next: Optional[str] = None
@@ -8,6 +8,7 @@ from pydantic import EmailStr, SecretStr
 import requests
 from sqlalchemy import UUID, CheckConstraint
 from sqlmodel import Field, SQLModel, Column, ForeignKey, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from api.config import get_config
 from api.models.user import User, UserCreate, UserRole
 from api.utils.faky import Faky
@@ -74,6 +75,12 @@ class Homeowner(HomeownerBase, table=True):
         homeowner = db.exec(query).first()
         return homeowner
 
+    @staticmethod
+    async def by_hid_async(hid: uuid.UUID, db: AsyncSession):
+        query = select(Homeowner).where(Homeowner.id == hid)
+        homeowner = (await db.exec(query)).first()
+        return homeowner
+
     @staticmethod
     def by_email(email: str, db: Session):
         query = (
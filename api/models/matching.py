@@ -0,0 +1,514 @@
+from collections import defaultdict
+import glob
+import os
+import shutil
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+import uuid
+import numpy as np
+from sqlalchemy import Connection, Engine, any_, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from api.config import get_config
+from api.core.search_engine.projection_engine import RATING_LABELS, RecommendationEngine
+from api.models.contractor import Contractor
+from api.models.quiz.catalog import WorkUnitCatalog, get_work_unit_catalog_async
+from api.models.rating_snapshot import RankingSnapshot, RatingSnapshot
+from api.models.search_page import SearchPage, SearchSort
+
+# everything below the snapshot's xmin has committed (or aborted) and is visible
+_XMIN = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+_RATINGS = ", ".join(RATING_LABELS)
+
+_ALL_PREFERENCES = text(
+    """
+    SELECT contractor_id, work_unit_id, NULL AS area FROM contractor_profession_preferences
+    UNION ALL
+    SELECT contractor_id, NULL, area FROM contractor_area_preferences
+    """
+)
+
+_ALL_RATINGS = text(f"SELECT id, {_RATINGS} FROM contractors")
+
+# names the database's rating snapshots: databases of the same name on two clusters (a
+# node serving staging and prod) differ by system identifier, shared with the replicas,
+# and a recreated database gets a new change log table
+_SNAPSHOT_DIRECTORY = text(
+    "SELECT current_database(), (SELECT system_identifier FROM pg_control_system()), "
+    "'contractor_preference_changes'::regclass::oid"
+)
+
+# current preferences and ratings of every contractor changed by a transaction at or
+# after :since, plus a row without contractor carrying this statement's xmin, the next
+# poll's :since. Rows are (contractor, unit, area, xmin, *ratings)
+_CHANGES = text(
+    f"""
+    WITH changed AS (
+        SELECT DISTINCT contractor_id FROM contractor_preference_changes WHERE xid >= :since
+    )
+    SELECT NULL::uuid AS contractor_id, NULL::int AS work_unit_id, NULL::text AS area,
+        {_XMIN} AS xmin, NULL::int, NULL::int, NULL::int
+    UNION ALL
+    SELECT c.contractor_id, NULL, NULL, NULL, {_RATINGS}
+    FROM changed c LEFT JOIN contractors ON contractors.id = c.contractor_id
+    UNION ALL
+    SELECT u.contractor_id, u.work_unit_id, NULL, NULL, NULL, NULL, NULL
+    FROM changed c JOIN contractor_profession_preferences u USING (contractor_id)
+    UNION ALL
+    SELECT a.contractor_id, NULL, a.area, NULL, NULL, NULL, NULL
+    FROM changed c JOIN contractor_area_preferences a USING (contractor_id)
+    """
+)
+
+_PRUNE = text(
+    "DELETE FROM contractor_preference_changes "
+    "WHERE created_at < now() - make_interval(hours => :hours)"
+)
+
+Preferences = Dict[uuid.UUID, Tuple[Set[int], Set[str]]]
+
+
+def _group(rows) -> Preferences:
+    preferences = defaultdict(lambda: (set(), set()))
+    for cid, unit, area, *_ in rows:
+        units, areas = preferences[cid]
+        if unit is not None:
+            units.add(unit)
+        if area is not None:
+            areas.add(area)
+    return preferences
+
+
+class ContractorMatchIndex:
+    """
+    Answers "which contractors cover every one of these work units in this area"
+    with bitmaps: each contractor gets an ordinal, each work unit and each area a
+    uint64 bitmap over the ordinals, and a match is the AND of the area's bitmap
+    with the units' ones.
+
+    Also holds every contractor's ratings as a float32 matrix, column = ordinal,
+    so matches can be ranked by RecommendationEngine without going back to SQL.
+    The ratings are an immutable RankingSnapshot, replaced on every change: a
+    search only holds the lock for the bitmaps and ranks against the snapshot it
+    got, concurrently with the others and with changes. Their base can be a mapped
+    RatingSnapshot shared with the other workers, see MATCH_SNAPSHOT_DIR.
+
+    Built from the preference tables at startup, then kept current by polling
+    contractor_preference_changes (filled by triggers) on every use: contractors
+    written by a transaction at or after the last poll's snapshot xmin get their
+    bits and ratings reloaded. A poll costs one indexed statement and is a no-op
+    when nothing changed.
+    """
+
+    def __init__(self):
+        self.capacity = 0
+        self.ordinals: Dict[uuid.UUID, int] = {}
+        self.cids: List[uuid.UUID] = []
+        self.units_of: List[FrozenSet[int]] = []
+        self.areas_of: List[FrozenSet[str]] = []
+        self.unit_bits: Dict[int, np.ndarray] = {}
+        self.area_bits: Dict[str, np.ndarray] = {}
+        # one row per rating, one column per ordinal: gathering the matches' columns and
+        # z-scoring them runs over contiguous memory. Keys are uuid bytes, numpy compares
+        # them in the same order as Postgres compares uuids
+        self.ranking = RankingSnapshot(
+            np.zeros((len(RATING_LABELS), 0), dtype=np.float32), np.zeros(0, dtype="S16")
+        )
+        # {ordinal: (ratings, key)} of the change being applied, published by _publish
+        self.pending: Dict[int, Tuple[list, bytes]] = {}
+        self.folding = False
+        self.fold_lock = threading.Lock()
+        self.snapshot: Optional[RatingSnapshot] = None
+        self.since = 0
+        # xmin of the newest snapshot applied (a build's or a poll's), polls apply one at a time
+        self.applied_xmin = 0
+        self.poll_lock = threading.Lock()
+        self.synced_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cids)
+
+    def _grow(self, size: int):
+        capacity = max(self.capacity, 64)
+        while capacity < size:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        words = capacity // 64
+        for bitmaps in (self.unit_bits, self.area_bits):
+            for key, bits in bitmaps.items():
+                grown = np.zeros(words, dtype=np.uint64)
+                grown[: len(bits)] = bits
+                bitmaps[key] = grown
+        self.capacity = capacity
+
+    def attach(self, snapshot: RatingSnapshot):
+        """Takes the snapshot's ordinals and ratings, on an empty index"""
+        with self.lock:
+            self.snapshot = snapshot
+            self.ranking = RankingSnapshot(snapshot.ratings, snapshot.cid_keys)
+            self._grow(snapshot.count)
+            # numpy drops the trailing zero bytes of S16 values
+            self.cids = [
+                uuid.UUID(bytes=key.ljust(16, b"\0"))
+                for key in snapshot.cid_keys[: snapshot.count].tolist()
+            ]
+            self.ordinals = {cid: ordinal for ordinal, cid in enumerate(self.cids)}
+            self.units_of = [frozenset()] * snapshot.count
+            self.areas_of = [frozenset()] * snapshot.count
+
+    def _ordinal(self, cid: uuid.UUID) -> int:
+        ordinal = self.ordinals.get(cid)
+        if ordinal is None:
+            ordinal = self.ordinals[cid] = len(self.cids)
+            self.cids.append(cid)
+            self.units_of.append(frozenset())
+            self.areas_of.append(frozenset())
+            self._grow(len(self.cids))
+            self.pending[ordinal] = ([0] * len(RATING_LABELS), cid.bytes)
+        return ordinal
+
+    def _publish(self):
+        """Replaces the ranking snapshot with one carrying `pending`, under the lock"""
+        ranking = self.ranking.changed(self.pending)
+        self.pending = {}
+        if len(ranking.delta) > len(ranking.cid_keys):
+            # mostly new columns (a build), cheaper folded now than searched through
+            ranking = ranking.folded()
+        self.ranking = ranking
+        if len(ranking.delta) > max(len(ranking.cid_keys) // 16, 256) and not self.folding:
+            self.folding = True
+            threading.Thread(target=self.fold, daemon=True).start()
+
+    def fold(self):
+        """
+        Merges the ranking snapshot's delta into new base arrays, off the lock:
+        searches keep using the current one meanwhile, changes published meanwhile
+        are carried over
+        """
+        # one at a time: a fold's delta must be relative to the base it folds
+        with self.fold_lock:
+            try:
+                source = self.ranking
+                folded = source.folded()
+                with self.lock:
+                    self.ranking = self.ranking.rebased(folded, source)
+            finally:
+                self.folding = False
+
+    @staticmethod
+    def _flip(bitmaps: dict, keys: Iterable, words: int, word: int, mask: np.uint64, on: bool):
+        for key in keys:
+            bits = bitmaps.get(key)
+            if bits is None:
+                bits = bitmaps[key] = np.zeros(words, dtype=np.uint64)
+            if on:
+                bits[word] |= mask
+            else:
+                bits[word] &= ~mask
+
+    def update(self, preferences: Preferences):
+        """Replaces the units and areas of each contractor in `preferences`"""
+        with self.lock:
+            for cid, (units, areas) in preferences.items():
+                ordinal = self._ordinal(cid)
+                words = self.capacity // 64
+                word, mask = ordinal // 64, np.uint64(1 << (ordinal % 64))
+                units, areas = frozenset(units), frozenset(areas)
+                old_units, old_areas = self.units_of[ordinal], self.areas_of[ordinal]
+                self._flip(self.unit_bits, old_units - units, words, word, mask, False)
+                self._flip(self.unit_bits, units - old_units, words, word, mask, True)
+                self._flip(self.area_bits, old_areas - areas, words, word, mask, False)
+                self._flip(self.area_bits, areas - old_areas, words, word, mask, True)
+                self.units_of[ordinal], self.areas_of[ordinal] = units, areas
+            self._publish()
+
+    def load(self, preferences: Preferences):
+        """Bulk version of `update` for an empty index"""
+        with self.lock:
+            by_unit, by_area = defaultdict(list), defaultdict(list)
+            for cid, (units, areas) in preferences.items():
+                ordinal = self._ordinal(cid)
+                self.units_of[ordinal], self.areas_of[ordinal] = frozenset(units), frozenset(areas)
+                for unit in units:
+                    by_unit[unit].append(ordinal)
+                for area in areas:
+                    by_area[area].append(ordinal)
+            words = self.capacity // 64
+            for bitmaps, members in ((self.unit_bits, by_unit), (self.area_bits, by_area)):
+                for key, ordinals in members.items():
+                    ordinals = np.asarray(ordinals, dtype=np.uint64)
+                    bits = np.zeros(words, dtype=np.uint64)
+                    np.bitwise_or.at(
+                        bits,
+                        (ordinals // 64).astype(np.intp),
+                        np.left_shift(np.uint64(1), ordinals % np.uint64(64)),
+                    )
+                    bitmaps[key] = bits
+            self._publish()
+
+    def _match_ordinals(self, unit_ids: Iterable[int], area: str) -> np.ndarray:
+        unit_ids = set(unit_ids)
+        if not unit_ids:
+            return np.zeros(0, dtype=np.intp)
+        bits = self.area_bits.get(area)
+        if bits is None:
+            return np.zeros(0, dtype=np.intp)
+        matches = bits.copy()
+        for unit in unit_ids:
+            unit_bits = self.unit_bits.get(unit)
+            if unit_bits is None:
+                return np.zeros(0, dtype=np.intp)
+            np.bitwise_and(matches, unit_bits, out=matches)
+        return np.flatnonzero(np.unpackbits(matches.view(np.uint8), bitorder="little"))
+
+    def match(self, unit_ids: Iterable[int], area: str) -> List[uuid.UUID]:
+        """Contractors with `area` and every unit in `unit_ids`, none if `unit_ids` is empty"""
+        with self.lock:
+            return [self.cids[ordinal] for ordinal in self._match_ordinals(unit_ids, area)]
+
+    def recommend(
+        self, unit_ids: Iterable[int], area: str, page: SearchPage
+    ) -> Tuple[List[uuid.UUID], List[float]]:
+        """
+        The `page.limit` + 1 best matches after `page.after` by RecommendationEngine
+        score (ties by id), with their scores. Scores are z-scored over all the
+        matches, so pages of one search agree as long as the matches do
+        """
+        with self.lock:
+            ordinals = self._match_ordinals(unit_ids, area)
+            ranking = self.ranking
+        if not len(ordinals):
+            return [], []
+        # this search's own arrays and engine, `ranking` is never written
+        ratings, keys = ranking.gather(ordinals)
+        engine = RecommendationEngine(dataset_matrix=ratings.T, copy=False)
+        engine.set_static_vector(get_config().SEARCH_RANK_WEIGHTS)
+        scores = engine.scores_many(engine.vectors([page.weights]))[0]
+        eligible = None
+        if page.after:
+            score, cid = np.float32(page.after[0]), page.after[1].bytes
+            eligible = (scores < score) | ((scores == score) & (keys > cid))
+        rows = engine.top_k(page.limit + 1, scores, eligible, tiebreak=keys)
+        # ordinals are only ever appended to cids
+        return [self.cids[ordinal] for ordinal in ordinals[rows]], scores[rows].tolist()
+
+    def page(self, unit_ids: Iterable[int], area: str, page: SearchPage) -> List[uuid.UUID]:
+        """
+        The `page.limit` + 1 matches after `page.after` in `page.sort` order, a rating
+        (best first, ties by id descending) or id: the keyset runs over the index's
+        ratings, only the page's contractors are read from the database
+        """
+        with self.lock:
+            ordinals = self._match_ordinals(unit_ids, area)
+            ranking = self.ranking
+        if not len(ordinals):
+            return []
+        ratings, keys = ranking.gather(ordinals)
+        if page.sort == SearchSort.id:
+            rows = np.flatnonzero(keys > page.after[1].bytes) if page.after else None
+            order = np.argsort(keys if rows is None else keys[rows], kind="stable")
+        else:
+            values = ratings[RATING_LABELS.index(page.sort.value)]
+            rows = None
+            if page.after:
+                value, cid = np.float32(page.after[0]), page.after[1].bytes
+                rows = np.flatnonzero((values < value) | ((values == value) & (keys < cid)))
+                values, keys = values[rows], keys[rows]
+            order = np.lexsort((keys, values))[::-1]
+        order = order[: page.limit + 1]
+        rows = order if rows is None else rows[order]
+        return [self.cids[ordinal] for ordinal in ordinals[rows]]
+
+    def preferences(self, cid: uuid.UUID) -> Tuple[FrozenSet[int], FrozenSet[str]]:
+        with self.lock:
+            ordinal = self.ordinals.get(cid)
+            if ordinal is None:
+                return frozenset(), frozenset()
+            return self.units_of[ordinal], self.areas_of[ordinal]
+
+    def set_ratings(self, rows):
+        """(contractor id, *ratings) rows"""
+        with self.lock:
+            for cid, *ratings in rows:
+                # before touching `pending`: _ordinal grows the index for a new contractor
+                ordinal = self._ordinal(cid)
+                self.pending[ordinal] = (ratings, cid.bytes)
+            self._publish()
+
+    def apply_changes(self, rows) -> bool:
+        """
+        Applies a poll's rows, each contractor's state as of the poll's snapshot.
+        A poll from a snapshot older than one already applied (a lagging replica's,
+        or one overtaken by a concurrent poll) would put older state back: it is
+        dropped, the index is already at least as current as that snapshot
+        """
+        xmin, changes, ratings = None, [], []
+        for row in rows:
+            if row[0] is None:
+                xmin = row[3]
+            elif row[4] is not None:
+                ratings.append((row[0], *row[4:]))
+                changes.append(row)
+            else:
+                changes.append(row)
+        with self.poll_lock:
+            if xmin is not None and xmin < self.applied_xmin:
+                return False
+            changed = _group(changes)
+            if changed:
+                self.update(changed)
+                self.set_ratings(ratings)
+            if xmin is not None:
+                self.applied_xmin = xmin
+                self.since = max(self.since, xmin)
+            self.synced_at = time.monotonic()
+        return True
+
+    def refresh(self, db: Session):
+        self.apply_changes(db.execute(_CHANGES, {"since": self.since}).all())
+
+    async def refresh_async(self, db: AsyncSession):
+        self.apply_changes((await db.execute(_CHANGES, {"since": self.since})).all())
+
+    def stale(self) -> bool:
+        # changes older than the retention are pruned, a poll that far back could miss some
+        retention = get_config().MATCH_CHANGES_RETENTION_HOURS * 3600
+        if time.monotonic() - self.synced_at > retention / 2:
+            return True
+        # another worker published newer ratings, rebuilding maps them
+        return self.snapshot is not None and self.snapshot.superseded()
+
+    @staticmethod
+    def shared_ratings(db: Connection, since: int) -> Optional[RatingSnapshot]:
+        """
+        The latest published ratings, published first from `db` when there are none
+        or they are older than half the change log retention (the changes since
+        them may be pruned). None when MATCH_SNAPSHOT_DIR is not set or usable
+        """
+        root = get_config().MATCH_SNAPSHOT_DIR
+        if not root:
+            return None
+        name, cluster, oid = db.execute(_SNAPSHOT_DIRECTORY).one()
+        database = f"{name}-{cluster}"
+        directory = os.path.join(root, f"{database}-{oid}")
+        max_age = get_config().MATCH_CHANGES_RETENTION_HOURS * 3600 / 2
+        try:
+            with RatingSnapshot.lock(directory):
+                snapshot = RatingSnapshot.current(directory)
+                if snapshot is None:
+                    # earlier incarnations of the database are gone for good
+                    for stale in glob.glob(os.path.join(root, f"{glob.escape(database)}-*")):
+                        if stale != directory:
+                            shutil.rmtree(stale, ignore_errors=True)
+                if snapshot is None or snapshot.age() > max_age:
+                    ratings = ContractorMatchIndex()
+                    ratings.set_ratings(db.execute(_ALL_RATINGS))
+                    snapshot = RatingSnapshot.publish(
+                        directory,
+                        since,
+                        len(ratings),
+                        ratings.ranking.ratings,
+                        ratings.ranking.cid_keys,
+                    )
+                    print(f"[match index] published ratings {snapshot.version}")
+                return snapshot
+        except OSError as e:
+            print(f"[match index] ratings not shared: {e}")
+            return None
+
+    @staticmethod
+    def build(engine: Engine) -> "ContractorMatchIndex":
+        index = ContractorMatchIndex()
+        # one snapshot for the xmin and the rows
+        with engine.connect().execution_options(isolation_level="REPEATABLE READ") as db:
+            since = index.applied_xmin = db.execute(text(f"SELECT {_XMIN}")).scalar()
+            snapshot = ContractorMatchIndex.shared_ratings(db, since)
+            if snapshot is not None:
+                index.attach(snapshot)
+                # replaying the changes since the ratings were read catches them up
+                since = min(since, snapshot.since)
+            index.load(_group(db.execute(_ALL_PREFERENCES)))
+            if snapshot is None:
+                index.set_ratings(db.execute(_ALL_RATINGS))
+        index.since = since
+        return index
+
+
+_index: Optional[ContractorMatchIndex] = None
+_build_lock = threading.Lock()
+
+
+def build_match_index(engine: Engine) -> ContractorMatchIndex:
+    """(Re)builds the index from the primary and prunes the change log, unless fresh"""
+    global _index
+    with _build_lock:
+        # requests that found it stale together wait here, only the first rebuilds
+        if _index is not None and not _index.stale():
+            return _index
+        with engine.begin() as db:
+            db.execute(_PRUNE, {"hours": get_config().MATCH_CHANGES_RETENTION_HOURS})
+        start = time.perf_counter()
+        _index = ContractorMatchIndex.build(engine)
+        shared = f", ratings {_index.snapshot.version}" if _index.snapshot else ""
+        print(
+            f"[match index] {len(_index)} contractors, {len(_index.unit_bits)} units, "
+            f"{len(_index.area_bits)} areas{shared} in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return _index
+
+
+async def get_match_index_async(db: AsyncSession) -> ContractorMatchIndex:
+    """The index, caught up with every preference change `db` can see"""
+    from api.core.db import get_db
+
+    index = _index
+    if index is None or index.stale():
+        index = await run_in_threadpool(build_match_index, get_db().engine)
+    await index.refresh_async(db)
+    return index
+
+
+async def contractor_rows_async(
+    cids: List[uuid.UUID],
+    index: ContractorMatchIndex,
+    catalog: WorkUnitCatalog,
+    db: AsyncSession,
+):
+    """
+    (Contractor, professions, areas) rows of `cids` in `cids` order, the shape of
+    the SQL matchers. A contractor gone since the index saw them is skipped
+    """
+    if not cids:
+        return []
+    # one array parameter, however many ids
+    ids = bindparam("ids", cids, type_=ARRAY(UUID(as_uuid=True)))
+    contractors = (await db.exec(select(Contractor).where(Contractor.id == any_(ids)))).all()
+    by_id = {contractor.id: contractor for contractor in contractors}
+    rows = []
+    for contractor in (by_id[cid] for cid in cids if cid in by_id):
+        units, areas = index.preferences(contractor.id)
+        rows.append((contractor, catalog.ids_to_professions(units), sorted(areas)))
+    return rows
+
+
+async def search_async(unit_ids: List[int], area: str, page: SearchPage, db: AsyncSession):
+    """
+    `page` of the (Contractor, professions, areas) rows of the contractors with
+    `area` and every unit of `unit_ids`, and the next page's cursor
+    """
+    catalog = await get_work_unit_catalog_async(db)
+    index = await get_match_index_async(db)
+    if page.sort == SearchSort.recommended:
+        cids, scores = index.recommend(unit_ids, area, page)
+        rows = await contractor_rows_async(cids, index, catalog, db)
+        # scores stay aligned with the rows of contractors still there
+        found = {row[0].id for row in rows}
+        return page.split(rows, [score for cid, score in zip(cids, scores) if cid in found])
+    cids = index.page(unit_ids, area, page)
+    return page.split(await contractor_rows_async(cids, index, catalog, db))
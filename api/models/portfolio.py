@@ -6,17 +6,20 @@ from typing import Annotated, List, Optional
 import uuid
 from fastapi import Form, UploadFile
 from pydantic import TypeAdapter
-from sqlalchemy import UUID, Column, ForeignKey, func
+from sqlalchemy import UUID, Column, ForeignKey, Index, func
 from sqlmodel import Field, SQLModel, Session, select
 from api.config import get_config
 from api.core.error import APIError
-from api.models.quiz.model import WorkUnit
+from api.models.quiz.catalog import get_work_unit_catalog
 from api.models.utils import Image, ImageBase
 from api.utils.faky import Faky
 
 
 class PortfolioImage(Image, table=True):
     __tablename__ = "external_portfolio_images"
+    __table_args__ = (
+        Index("ix_external_portfolio_images_portfolio_project_id", "portfolio_project_id"),
+    )
 
     portfolio_project_id: uuid.UUID = Field(
         sa_column=Column(
@@ -64,6 +67,9 @@ class PortfolioImage(Image, table=True):
 
 class PortfolioProjectTask(SQLModel, table=True):
     __tablename__ = "external_portfolio_project_units"
+    __table_args__ = (
+        Index("ix_external_portfolio_project_units_portfolio_project_id", "portfolio_project_id"),
+    )
     work_unit_id: int = Field(foreign_key="work_units.id", primary_key=True)
     portfolio_project_id: uuid.UUID = Field(
         sa_column=Column(
@@ -117,6 +123,9 @@ class PortfolioProjectCreate(SQLModel):
 
 class ExternalPortfolioProject(SQLModel, table=True):
     __tablename__ = "external_portfolio_projects"
+    __table_args__ = (
+        Index("ix_external_portfolio_projects_contractor_id", "contractor_id"),
+    )
 
     id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, primary_key=True)
     contractor_id: uuid.UUID = Field(foreign_key="contractors.id")
@@ -211,10 +220,10 @@ class PortfolioExternalProjectView(SQLModel):
             ta = TypeAdapter(list[ImageBase])
             imgs = ta.validate_python(images)
         if units:
-            work_units = WorkUnit.by_ids(
-                list(map(lambda unit: unit.get("work_unit_id", None), units)), db
+            work_units = get_work_unit_catalog(db).by_ids(
+                unit.get("work_unit_id", None) for unit in units
             )
-            work_units = [unit[0].concat() for unit in work_units]
+            work_units = [unit.concat for unit in work_units]
         return PortfolioExternalProjectView(
             id=ptf.id, title=ptf.title, images=imgs, units=work_units
         )
@@ -7,10 +7,12 @@ from pydantic import TypeAdapter
 from sqlalchemy import (
     UUID,
     ForeignKey,
+    Index,
     and_,
     func,
 )
 from sqlmodel import SQLModel, Field, Column, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from api.config import get_config
 from api.models.booking import (
     BookingDetail,
@@ -42,6 +44,9 @@ class ProjectCreate(ProjectBase):
 
 class ProjectImage(Image, table=True):
     __tablename__ = "project_images"
+    __table_args__ = (
+        Index("ix_project_images_booking_id", "booking_id"),
+    )
 
     booking_id: uuid.UUID = Field(
         sa_column=Column(
@@ -88,6 +93,9 @@ class ProjectImage(Image, table=True):
 
 class Project(ProjectBase, table=True):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_contractor_id", "contractor_id"),
+    )
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     completed_at: datetime = Field(nullable=True)
     signal_completion: Optional[bool] = Field(default=False)
@@ -101,7 +109,7 @@ class Project(ProjectBase, table=True):
         return model
 
     @staticmethod
-    def list_by_hid(hid: uuid.UUID, db: Session):
+    def list_by_hid_query(hid: uuid.UUID):
         query = (
             select(
                 BookingDetail.id,
@@ -149,8 +157,15 @@ class Project(ProjectBase, table=True):
             .join(WorkUnit, WorkUnit.id == BookingUnit.work_unit_id)
             .group_by(BookingDetail, Project, Contractor)
         )
-        models = db.execute(query).all()
-        return models
+        return query
+
+    @staticmethod
+    def list_by_hid(hid: uuid.UUID, db: Session):
+        return db.execute(Project.list_by_hid_query(hid)).all()
+
+    @staticmethod
+    async def list_by_hid_async(hid: uuid.UUID, db: AsyncSession):
+        return (await db.execute(Project.list_by_hid_query(hid))).all()
 
     @staticmethod
     def past_projects_by_hid(hid: uuid.UUID, db: Session):
@@ -172,7 +187,7 @@ class Project(ProjectBase, table=True):
         return models
 
     @staticmethod
-    def list_by_cid(cid: uuid.UUID, db: Session):
+    def list_by_cid_query(cid: uuid.UUID):
         query = (
             select(
                 Project.booking_id,
@@ -211,8 +226,15 @@ class Project(ProjectBase, table=True):
             .join(WorkUnit, WorkUnit.id == BookingUnit.work_unit_id)
             .group_by(Project, BookingDetail, Homeowner)
         )
-        models = db.execute(query).all()
-        return models
+        return query
+
+    @staticmethod
+    def list_by_cid(cid: uuid.UUID, db: Session):
+        return db.execute(Project.list_by_cid_query(cid)).all()
+
+    @staticmethod
+    async def list_by_cid_async(cid: uuid.UUID, db: AsyncSession):
+        return (await db.execute(Project.list_by_cid_query(cid))).all()
 
     @staticmethod
     def by_id(bid: uuid.UUID, db: Session):
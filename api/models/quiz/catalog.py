@@ -0,0 +1,254 @@
+from functools import cached_property
+import gzip
+import hashlib
+import json
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from api.config import get_config
+from api.models.quiz.model import WorkUnit, WorkUnitSearchItem, WorkUnitSearchView, WorkUnitView
+from api.models.quiz.search import QuizSearchIndex
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+_VERSION_QUERY = text(
+    "SELECT count(*) || ':' || "
+    "coalesce(md5(string_agg(id || '-' || digest, ',' ORDER BY id)), '') "
+    "FROM work_units"
+)
+
+
+class CatalogUnit(NamedTuple):
+    id: int
+    area: str
+    location: str
+    category: str
+    subcategory: str
+    action: str
+    quantity: str
+    profession: str
+    concat: str
+
+
+class QuizDocument:
+    """
+    The /quiz body for one catalog version: serialized once, with its compressed
+    variants and their ETags, so serving it is a dict lookup
+    """
+
+    # best first
+    ENCODINGS = ("br", "gzip", "identity")
+
+    def __init__(self, tree: dict):
+        self.body = json.dumps(tree, separators=(",", ":")).encode()
+        self.digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.variants = {
+            "identity": self.body,
+            "gzip": gzip.compress(self.body, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        # strong ETags identify the bytes, each encoding gets its own
+        if encoding == "identity":
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def negotiate(self, accept_encoding: Optional[str]) -> str:
+        accepted = {}
+        for coding in (accept_encoding or "").lower().split(","):
+            name, _, params = coding.strip().partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip()] = q
+        for encoding in self.ENCODINGS:
+            if encoding in self.variants and accepted.get(encoding, 0.0) > 0:
+                return encoding
+        return "identity"
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match uses the weak comparison, any of our tags (or *) matches"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or any(self.etag(encoding) in tags for encoding in self.variants)
+
+
+class WorkUnitCatalog:
+    """
+    Read-only snapshot of the work_units table, built once and swapped whole when
+    the table's version changes, so readers never see a half loaded catalog and
+    don't need a lock.
+    """
+
+    def __init__(self, version: str, units: Iterable[WorkUnit]):
+        self.version = version
+        entries = sorted(
+            (
+                CatalogUnit(
+                    id=unit.id,
+                    area=unit.area,
+                    location=unit.location,
+                    category=unit.category,
+                    subcategory=unit.subcategory,
+                    action=unit.action,
+                    quantity=unit.quantity,
+                    profession=unit.profession,
+                    concat=unit.concat(),
+                )
+                for unit in units
+            ),
+            key=lambda unit: unit.id,
+        )
+        self.ids = tuple(unit.id for unit in entries)
+        self.units = MappingProxyType({unit.id: unit for unit in entries})
+        by_profession = {}
+        for unit in entries:
+            by_profession.setdefault(unit.profession, set()).add(unit.id)
+        self.by_profession = MappingProxyType(
+            {profession: frozenset(ids) for profession, ids in by_profession.items()}
+        )
+        self.professions = tuple(sorted(by_profession))
+        self._subtrees = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @cached_property
+    def quiz_tree(self) -> dict:
+        return WorkUnitView.tree(self.units.values())
+
+    @cached_property
+    def quiz(self) -> QuizDocument:
+        return QuizDocument(self.quiz_tree)
+
+    def quiz_subtree(self, path: Tuple[str, ...]) -> Optional[QuizDocument]:
+        """area, location, category, subcategory prefix of the tree, None if it doesn't exist"""
+        document = self._subtrees.get(path)
+        if document is None:
+            node = self.quiz_tree
+            for name in path:
+                if not isinstance(node, dict) or name not in node:
+                    return None
+                node = node[name]
+            document = self._subtrees.setdefault(path, QuizDocument(node))
+        return document
+
+    @cached_property
+    def unit_index(self) -> QuizSearchIndex:
+        return QuizSearchIndex(
+            (unit.id, f"{unit.concat} {unit.profession}") for unit in self.units.values()
+        )
+
+    @cached_property
+    def profession_index(self) -> QuizSearchIndex:
+        return QuizSearchIndex((profession, profession) for profession in self.professions)
+
+    def search(self, query: str, limit: int = 20) -> WorkUnitSearchView:
+        units = [
+            WorkUnitSearchItem(
+                id=unit_id,
+                work_unit=self.units[unit_id].concat,
+                quantity=self.units[unit_id].quantity,
+                profession=self.units[unit_id].profession,
+                score=score,
+            )
+            for unit_id, score in self.unit_index.search(query, limit)
+        ]
+        professions = [profession for profession, _ in self.profession_index.search(query, limit)]
+        return WorkUnitSearchView(professions=professions, units=units)
+
+    def concat(self, unit_id: int) -> Optional[str]:
+        unit = self.units.get(unit_id)
+        return unit.concat if unit else None
+
+    def by_ids(self, ids: Iterable[int]) -> List[CatalogUnit]:
+        """Units in the order of `ids`, unknown ids are skipped"""
+        return [self.units[unit_id] for unit_id in ids if unit_id in self.units]
+
+    def professions_to_ids(self, professions: Iterable[str]) -> List[int]:
+        ids = set()
+        for profession in professions:
+            ids |= self.by_profession.get(profession, frozenset())
+        return sorted(ids)
+
+    def ids_to_professions(self, ids: Iterable[int]) -> List[str]:
+        return sorted(
+            {self.units[unit_id].profession for unit_id in ids if unit_id in self.units}
+        )
+
+    @staticmethod
+    def version_of(db: Session) -> str:
+        return db.execute(_VERSION_QUERY).scalar()
+
+    @staticmethod
+    def load(db: Session) -> "WorkUnitCatalog":
+        # version first: if the table changes in between, the next check sees a newer
+        # version than the one recorded here and loads again
+        version = WorkUnitCatalog.version_of(db)
+        return WorkUnitCatalog(version, db.exec(select(WorkUnit)).all())
+
+
+_catalog: Optional[WorkUnitCatalog] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _swap(catalog: WorkUnitCatalog):
+    # caller holds _lock
+    global _catalog, _checked_at
+    if _catalog is not None and _catalog.version != catalog.version:
+        print(f"[work units] catalog reloaded, {len(catalog)} units")
+    _catalog = catalog
+    _checked_at = time.monotonic()
+
+
+def _check_due() -> bool:
+    interval = get_config().WORK_UNIT_CATALOG_CHECK_SECONDS
+    return _catalog is None or 0 <= interval <= time.monotonic() - _checked_at
+
+
+def refresh_work_unit_catalog(db: Session, force: bool = False) -> WorkUnitCatalog:
+    """Reloads the catalog if the table's version moved (or `force`), returns the current one"""
+    with _lock:
+        catalog = _catalog
+        if catalog is None or force or WorkUnitCatalog.version_of(db) != catalog.version:
+            catalog = WorkUnitCatalog.load(db)
+        _swap(catalog)
+        return catalog
+
+
+def get_work_unit_catalog(db: Session) -> WorkUnitCatalog:
+    """
+    Current catalog, `db` is only used for the first load and the periodic version
+    check (WORK_UNIT_CATALOG_CHECK_SECONDS)
+    """
+    if _check_due():
+        return refresh_work_unit_catalog(db)
+    return _catalog
+
+
+async def get_work_unit_catalog_async(db: AsyncSession) -> WorkUnitCatalog:
+    """get_work_unit_catalog for async routes, the lock is only held for the swap"""
+    catalog = _catalog
+    if not _check_due():
+        return catalog
+    version = (await db.execute(_VERSION_QUERY)).scalar()
+    if catalog is None or version != catalog.version:
+        catalog = WorkUnitCatalog(version, (await db.exec(select(WorkUnit))).all())
+    with _lock:
+        _swap(catalog)
+    return catalog
@@ -117,15 +117,32 @@ class WorkUnit(SQLModel, table=True):
         return f"{self.area}:{self.location}:{self.category}:{self.subcategory}:{self.action}"
 
 
+class WorkUnitSearchItem(SQLModel):
+    id: int
+    work_unit: str
+    quantity: str
+    profession: str
+    score: float
+
+
+class WorkUnitSearchView(SQLModel):
+    professions: List[str]
+    units: List[WorkUnitSearchItem]
+
+
 class WorkUnitView(SQLModel):
     # TODO custom pydantic class
 
     @staticmethod
     def to_json(db: Session):
-        raw_units = WorkUnit.all(db)
+        from api.models.quiz.catalog import get_work_unit_catalog
+
+        return WorkUnitView.tree(get_work_unit_catalog(db).units.values())
+
+    @staticmethod
+    def tree(units):
         view = {}
-        for raw_unit in raw_units:
-            unit: WorkUnit = raw_unit[0]
+        for unit in units:
 
             if unit.area not in view:
                 view[unit.area] = {}
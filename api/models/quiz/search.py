@@ -0,0 +1,102 @@
+from bisect import bisect_left
+from collections import defaultdict
+import re
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def words(value: str) -> List[str]:
+    return _WORD.findall(value.lower())
+
+
+def trigrams(word: str) -> frozenset:
+    # padded the way pg_trgm does, so short words and word starts still count
+    padded = f"  {word} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(left: frozenset, right: frozenset) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class QuizSearchIndex:
+    """
+    Prefix and typo tolerant search over work unit concat strings and professions.
+
+    Documents are indexed by their words. A query word matches a document word it
+    is a prefix of (score 1), found by bisecting the sorted vocabulary, or one with
+    trigram similarity of at least `min_similarity` (score = similarity), found
+    through a trigram -> words index. A document matches when every query word
+    does; its score is the sum of its best per-word scores.
+    """
+
+    def __init__(self, documents: Iterable[Tuple[object, str]], min_similarity: float = 0.35):
+        self.min_similarity = min_similarity
+        self.keys: List[object] = []
+        self.texts: List[str] = []
+        postings = defaultdict(set)
+        for doc, (key, text) in enumerate(documents):
+            self.keys.append(key)
+            self.texts.append(text)
+            for word in words(text):
+                postings[word].add(doc)
+        self.vocabulary = tuple(sorted(postings))
+        self.postings = MappingProxyType(
+            {word: frozenset(docs) for word, docs in postings.items()}
+        )
+        self.word_trigrams = MappingProxyType(
+            {word: trigrams(word) for word in self.vocabulary}
+        )
+        by_trigram = defaultdict(set)
+        for word, grams in self.word_trigrams.items():
+            for gram in grams:
+                by_trigram[gram].add(word)
+        self.by_trigram = MappingProxyType(
+            {gram: frozenset(vocabulary) for gram, vocabulary in by_trigram.items()}
+        )
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        start = bisect_left(self.vocabulary, prefix)
+        matches = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            matches.append(word)
+        return matches
+
+    def _word_scores(self, query_word: str) -> Dict[str, float]:
+        scores = {word: 1.0 for word in self._prefixed(query_word)}
+        grams = trigrams(query_word)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.by_trigram.get(gram, frozenset())
+        for word in candidates - scores.keys():
+            score = similarity(grams, self.word_trigrams[word])
+            if score >= self.min_similarity:
+                scores[word] = score
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[object, float]]:
+        """Best matches first as (key, score)"""
+        query_words = words(query)
+        if not query_words:
+            return []
+        totals = None
+        for query_word in query_words:
+            best = {}
+            for word, score in self._word_scores(query_word).items():
+                for doc in self.postings[word]:
+                    if score > best.get(doc, 0.0):
+                        best[doc] = score
+            if totals is None:
+                totals = best
+            else:
+                totals = {doc: totals[doc] + score for doc, score in best.items() if doc in totals}
+            if not totals:
+                return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], len(self.texts[item[0]])))
+        return [(self.keys[doc], round(score, 3)) for doc, score in ranked[:limit]]
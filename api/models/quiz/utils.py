@@ -1,3 +1,5 @@
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session
 from api.models.quiz.model import (
     WorkUnit,
@@ -5,21 +7,30 @@ from api.models.quiz.model import (
     WorkUnits,
 )
 
+# pg_advisory_xact_lock key, any constant unique to this job
+WORK_UNITS_SEED_LOCK = 0x5173_0001
+
+
+def work_unit_rows():
+    return [
+        unit.model_dump() for line in WorkUnits for unit in WorkUnitCreate.from_line(line)
+    ]
+
 
 def create_work_units(db: Session):
-    raw_units = WorkUnits
-    for line in raw_units:
-        units = WorkUnitCreate.from_line(line)
-        for unit in units:
-            work_unit = WorkUnit(
-                area=unit.area,
-                location=unit.location,
-                category=unit.category,
-                subcategory=unit.subcategory,
-                action=unit.action,
-                quantity=unit.quantity,
-                profession=unit.profession,
-            )
-            db.add(work_unit)
-        db.commit()
-    # view = models.WorkUnitView.to_json(db)
+    """
+    Seeds the catalog with one INSERT, rows whose digest already exists are skipped
+    so it is safe on every boot. Concurrent seeders (uvicorn workers, nodes) queue
+    on an advisory lock, the ones that come after the first insert nothing.
+
+    Returns the number of rows inserted
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": WORK_UNITS_SEED_LOCK})
+    query = (
+        insert(WorkUnit)
+        .values(work_unit_rows())
+        .on_conflict_do_nothing(constraint="ensure_unique_work_unit")
+    )
+    inserted = db.execute(query).rowcount
+    db.commit()
+    return inserted
@@ -3,7 +3,7 @@ import enum
 import random
 import uuid
 from pydantic import condecimal
-from sqlalchemy import TIMESTAMP, UUID, Column, ForeignKey, and_, func
+from sqlalchemy import TIMESTAMP, UUID, Column, ForeignKey, Index, and_, func
 from sqlmodel import Field, SQLModel, Session, select
 from typing import List
 
@@ -43,6 +43,10 @@ class QuoteItemUpdate(SQLModel):
 
 class QuoteItem(SQLModel, table=True):
     __tablename__ = "quote_items"
+    __table_args__ = (
+        Index("ix_quote_items_qoute_id", "qoute_id"),
+        Index("ix_quote_items_booking_unit_id", "booking_unit_id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     qoute_id: uuid.UUID = Field(
         sa_column=Column(
@@ -78,6 +82,9 @@ class QuoteItem(SQLModel, table=True):
 
 class MaterialUnit(SQLModel, table=True):
     __tablename__ = "material_units"
+    __table_args__ = (
+        Index("ix_material_units_quote_item_id", "quote_item_id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     quote_item_id: uuid.UUID = Field(
         sa_column=Column(
@@ -115,6 +122,10 @@ class QuoteCreate(SQLModel):
 
 class Quote(SQLModel, table=True):
     __tablename__ = "quotes"
+    __table_args__ = (
+        Index("ix_quotes_booking_id", "booking_id"),
+        Index("ix_quotes_booking_invite_id", "booking_invite_id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     booking_id: uuid.UUID = Field(foreign_key="bookings.id", nullable=False)
     booking_invite_id: uuid.UUID = Field(
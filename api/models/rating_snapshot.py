@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+import fcntl
+import glob
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+import numpy as np
+from api.config import get_config
+
+
+class RatingSnapshot:
+    """
+    The match index's contractor ratings and ids as published for every worker of a
+    node, in a directory per database:
+
+    - `{version}.ratings.npy`: float32, one row per rating, one column per ordinal
+    - `{version}.ids.npy`: uuid bytes per ordinal
+    - `current`: json pointer to the latest version, replaced atomically
+
+    Workers map the arrays read-only, one copy per node: their own changes go to
+    the RankingSnapshot delta. Files are never written in place, a new version gets
+    new files and older ones are unlinked once superseded (mappings of them stay
+    valid).
+    """
+
+    def __init__(self, directory: str, pointer: dict):
+        self.directory = directory
+        self.version: str = pointer["version"]
+        # xmin the ratings were read at, workers replay the change log from there
+        self.since: int = pointer["since"]
+        self.count: int = pointer["count"]
+        self.published: float = pointer["published"]
+        self.ratings = np.load(self._path(directory, self.version, "ratings"), mmap_mode="r")
+        self.cid_keys = np.load(self._path(directory, self.version, "ids"), mmap_mode="r")
+        self.checked_at = time.monotonic()
+
+    @staticmethod
+    def _path(directory: str, version: str, name: str) -> str:
+        return os.path.join(directory, f"{version}.{name}.npy")
+
+    @staticmethod
+    def _pointer(directory: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(directory, "current")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _replace(path: str, write):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            write(file)
+        os.replace(temporary, path)
+
+    @staticmethod
+    @contextmanager
+    def lock(directory: str):
+        """Serializes publishers of `directory`, workers of other processes included"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "lock"), "w") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def current(directory: str) -> Optional["RatingSnapshot"]:
+        pointer = RatingSnapshot._pointer(directory)
+        return None if pointer is None else RatingSnapshot(directory, pointer)
+
+    @staticmethod
+    def publish(
+        directory: str, since: int, count: int, ratings: np.ndarray, cid_keys: np.ndarray
+    ) -> "RatingSnapshot":
+        """Writes a new version and points `current` at it, under `lock`"""
+        previous = RatingSnapshot._pointer(directory)
+        version = f"{since}-{time.time_ns()}"
+        for name, array in (("ratings", ratings), ("ids", cid_keys)):
+            path = RatingSnapshot._path(directory, version, name)
+            RatingSnapshot._replace(path, lambda file: np.save(file, array))
+        pointer = {"version": version, "since": since, "count": count, "published": time.time()}
+        current = os.path.join(directory, "current")
+        RatingSnapshot._replace(current, lambda file: file.write(json.dumps(pointer).encode()))
+        # the previous version may still be being mapped by a worker that just read its pointer
+        keep = {version, previous and previous["version"]}
+        for path in glob.glob(os.path.join(directory, "*.npy")):
+            if os.path.basename(path).split(".")[0] not in keep:
+                os.unlink(path)
+        return RatingSnapshot(directory, pointer)
+
+    def age(self) -> float:
+        return time.time() - self.published
+
+    def superseded(self) -> bool:
+        """
+        Whether a newer version was published, checked at most every
+        MATCH_SNAPSHOT_CHECK_SECONDS
+        """
+        now = time.monotonic()
+        if now - self.checked_at < get_config().MATCH_SNAPSHOT_CHECK_SECONDS:
+            return False
+        self.checked_at = now
+        pointer = self._pointer(self.directory)
+        return pointer is None or pointer["version"] != self.version
+
+
+class RankingSnapshot:
+    """
+    Immutable ratings and ids of the match index's ordinals, what its searches rank
+    against: `ratings` (one row per rating, one column per ordinal, eg a mapped
+    RatingSnapshot) and `cid_keys` are never written, the columns changed or added
+    since are a sorted `delta` that each change replaces, copy on write, with a new
+    snapshot. Threads holding a snapshot rank against it without any lock while the
+    index publishes newer ones; `folded` merges the delta into new base arrays.
+    """
+
+    def __init__(
+        self,
+        ratings: np.ndarray,
+        cid_keys: np.ndarray,
+        delta: np.ndarray = None,
+        delta_ratings: np.ndarray = None,
+        delta_keys: np.ndarray = None,
+    ):
+        self.ratings = ratings
+        self.cid_keys = cid_keys
+        self.delta = np.zeros(0, dtype=np.intp) if delta is None else delta
+        self.delta_ratings = (
+            np.zeros((len(ratings), 0), dtype=np.float32) if delta_ratings is None else delta_ratings
+        )
+        self.delta_keys = np.zeros(0, dtype="S16") if delta_keys is None else delta_keys
+        for array in (self.ratings, self.cid_keys, self.delta, self.delta_ratings, self.delta_keys):
+            if array.flags.writeable:
+                array.flags.writeable = False
+
+    def gather(self, ordinals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(ratings x len(ordinals), keys) of ascending `ordinals`, new arrays"""
+        size = len(self.cid_keys)
+        if not len(ordinals) or ordinals[-1] < size:
+            ratings, keys = self.ratings.take(ordinals, axis=1), self.cid_keys.take(ordinals)
+        else:
+            inside = ordinals < size
+            ratings = np.zeros((len(self.ratings), len(ordinals)), dtype=np.float32)
+            keys = np.zeros(len(ordinals), dtype="S16")
+            ratings[:, inside] = self.ratings.take(ordinals[inside], axis=1)
+            keys[inside] = self.cid_keys.take(ordinals[inside])
+        if len(self.delta):
+            at = np.searchsorted(self.delta, ordinals).clip(max=len(self.delta) - 1)
+            changed = self.delta[at] == ordinals
+            if changed.any():
+                ratings[:, changed] = self.delta_ratings[:, at[changed]]
+                keys[changed] = self.delta_keys[at[changed]]
+        return ratings, keys
+
+    def changed(self, columns: Dict[int, Tuple[np.ndarray, bytes]]) -> "RankingSnapshot":
+        """A snapshot with the {ordinal: (ratings, key)} `columns` replaced or added"""
+        if not columns:
+            return self
+        ordinals = np.fromiter(columns, dtype=np.intp, count=len(columns))
+        kept = ~np.isin(self.delta, ordinals)
+        delta = np.concatenate([self.delta[kept], ordinals])
+        ratings = np.concatenate(
+            [
+                self.delta_ratings[:, kept],
+                np.array([column[0] for column in columns.values()], dtype=np.float32)
+                .reshape(len(columns), len(self.ratings))
+                .T,
+            ],
+            axis=1,
+        )
+        keys = np.concatenate(
+            [self.delta_keys[kept], np.array([column[1] for column in columns.values()], "S16")]
+        )
+        order = np.argsort(delta, kind="stable")
+        return RankingSnapshot(
+            self.ratings, self.cid_keys, delta[order], ratings[:, order], keys[order]
+        )
+
+    def rebased(self, folded: "RankingSnapshot", source: "RankingSnapshot") -> "RankingSnapshot":
+        """
+        This snapshot's columns over `folded`, `source.folded()`: of the delta, only
+        what changed since `source` is kept
+        """
+        keep = np.ones(len(self.delta), dtype=bool)
+        if len(source.delta):
+            at = np.searchsorted(source.delta, self.delta).clip(max=len(source.delta) - 1)
+            keep = (
+                (source.delta[at] != self.delta)
+                | (source.delta_ratings[:, at] != self.delta_ratings).any(axis=0)
+                | (source.delta_keys[at] != self.delta_keys)
+            )
+        return RankingSnapshot(
+            folded.ratings,
+            folded.cid_keys,
+            self.delta[keep],
+            self.delta_ratings[:, keep],
+            self.delta_keys[keep],
+        )
+
+    def folded(self) -> "RankingSnapshot":
+        """The same columns in new base arrays, without delta"""
+        size = max(len(self.cid_keys), self.delta[-1] + 1 if len(self.delta) else 0)
+        ratings = np.zeros((len(self.ratings), size), dtype=np.float32)
+        keys = np.zeros(size, dtype="S16")
+        ratings[:, : len(self.cid_keys)] = self.ratings
+        keys[: len(self.cid_keys)] = self.cid_keys
+        ratings[:, self.delta] = self.delta_ratings
+        keys[self.delta] = self.delta_keys
+        return RankingSnapshot(ratings, keys)
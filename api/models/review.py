@@ -1,8 +1,20 @@
 from datetime import datetime
 import random
-from typing import List
+from typing import List, Optional, Tuple
 import uuid
-from sqlalchemy import UUID, CheckConstraint, Column, ForeignKey, and_, func
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    CheckConstraint,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    and_,
+    bindparam,
+    func,
+    update,
+)
 
 from sqlmodel import Field, SQLModel, Session, select
 from api.models.booking import BookingDetail, BookingUnit
@@ -46,6 +58,7 @@ class ContractorReviewCreate(ContractorRating):
 
 class ContractorReview(ContractorRating, table=True):
     __tablename__ = "contractor_reviews"
+    __table_args__ = (Index("ix_contractor_reviews_to_", "to_"),)
 
     booking_id: uuid.UUID = Field(
         sa_column=Column(
@@ -61,6 +74,10 @@ class ContractorReview(ContractorRating, table=True):
     quality_words: str | None = Field(nullable=True)
     schedule_words: str | None = Field(nullable=True)
     description: str | None = Field(nullable=True)
+    # RatingRegressor outputs for `description`, written by the ReviewScorer after the review
+    description_scores: Optional[List[float]] = Field(
+        default=None, sa_column=Column(ARRAY(Float), nullable=True)
+    )
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
 
     @staticmethod
@@ -100,6 +117,17 @@ class ContractorReview(ContractorRating, table=True):
         db.add(cnt[0])
         return model
 
+    @staticmethod
+    def set_description_scores(scores: List[Tuple[uuid.UUID, List[float]]], db: Session):
+        """(booking_id, scores) of reviews, one statement for the whole batch"""
+        table = ContractorReview.__table__
+        query = (
+            update(table)
+            .where(table.c.booking_id == bindparam("bid"))
+            .values(description_scores=bindparam("scores"))
+        )
+        db.execute(query, [{"bid": bid, "scores": values} for bid, values in scores])
+
     @staticmethod
     def all_by_cid(cid: uuid.UUID, db: Session):
         query = (
@@ -226,6 +254,7 @@ class ContractorReviewView(ContractorRating):
     quality_words: List[str] | None = None
     schedule_words: List[str] | None = None
     description: str | None = None
+    description_scores: List[float] | None = None
     created_at: datetime
 
 
@@ -259,6 +288,7 @@ class HomeownerReviewCreate(SQLModel):
 
 class HomeownerReview(SQLModel, table=True):
     __tablename__ = "homeowner_reviews"
+    __table_args__ = (Index("ix_homeowner_reviews_to_", "to_"),)
 
     booking_id: uuid.UUID = Field(
         sa_column=Column(
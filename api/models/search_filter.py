@@ -1,13 +1,18 @@
 from typing import List, Optional
 from sqlalchemy import and_, func
 from sqlmodel import SQLModel, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.models.contractor import (
     Contractor,
     ContractorAreaPreference,
+    ContractorProfile,
     ContractorUnitPreference,
 )
+from api.models.matching import search_async
+from api.models.quiz.catalog import get_work_unit_catalog_async
 from api.models.quiz.model import WorkUnit
+from api.models.search_page import SearchPage
 
 
 class Filter(SQLModel):
@@ -19,7 +24,7 @@ class Filter(SQLModel):
         pass
 
     @staticmethod
-    def by_units_and_area(professions: List[str], area: str, db: Session):
+    def by_units_and_area_query(professions: List[str], area: str):
         units_q = (
             select(
                 func.array_agg(WorkUnit.id).label("wids"),
@@ -81,26 +86,23 @@ class Filter(SQLModel):
             .distinct()
         )
         query = (
-            select(
-                Contractor,
-                func.array_agg(WorkUnit.profession.distinct()).filter(
-                    WorkUnit.profession.isnot(None),
-                ),
-                func.array_agg(ContractorAreaPreference.area.distinct()).filter(
-                    ContractorAreaPreference.area.isnot(None),
-                ),
-            )
+            select(Contractor, ContractorProfile.professions, ContractorProfile.areas)
             .where(Contractor.id == cnt_ids_q.c.id)
-            .outerjoin(
-                ContractorUnitPreference,
-                ContractorUnitPreference.contractor_id == Contractor.id,
-            )
-            .outerjoin(WorkUnit, WorkUnit.id == ContractorUnitPreference.work_unit_id)
-            .outerjoin(
-                ContractorAreaPreference,
-                ContractorAreaPreference.contractor_id == Contractor.id,
-            )
-            .distinct()
-            .group_by(Contractor)
+            .outerjoin(ContractorProfile, ContractorProfile.contractor_id == Contractor.id)
         )
-        return db.exec(query).all()
+        return query
+
+    @staticmethod
+    def by_units_and_area(professions: List[str], area: str, db: Session):
+        return db.exec(Filter.by_units_and_area_query(professions, area)).all()
+
+    @staticmethod
+    async def by_units_and_area_async(
+        professions: List[str], area: str, page: SearchPage, db: AsyncSession
+    ):
+        """
+        `page` of the rows of `by_units_and_area`, matched by the in-process
+        ContractorMatchIndex, and the next page's cursor
+        """
+        catalog = await get_work_unit_catalog_async(db)
+        return await search_async(catalog.professions_to_ids(professions), area, page, db)
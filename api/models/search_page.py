@@ -0,0 +1,110 @@
+import base64
+from enum import Enum
+import json
+import math
+from typing import Annotated, Dict, List, Optional, Tuple, Union
+import uuid
+from fastapi import Query
+from sqlmodel import SQLModel
+from api.core.error import APIError
+from api.core.search_engine.projection_engine import RATING_LABELS
+
+
+class SearchSort(str, Enum):
+    id = "id"
+    quality_rating = "quality_rating"
+    budget_rating = "budget_rating"
+    on_schedule_rating = "on_schedule_rating"
+    # RecommendationEngine projection score, see `weights`
+    recommended = "recommended"
+
+
+# softmaxed with the static vector, weights further apart than this only saturate it
+MAX_WEIGHT = 100.0
+
+
+class SearchPage(SQLModel):
+    """
+    One keyset page of a contractor search. Rating sorts go best first with ties
+    broken by id, `id` goes by id, `recommended` by projection score then id.
+    `after` is the previous page's last (rating or score, id), so a page is
+    the matches with (rating, id) < after in order, never an OFFSET
+    """
+
+    sort: SearchSort = SearchSort.id
+    limit: int = 50
+    after: Optional[Tuple[Union[int, float, None], uuid.UUID]] = None
+    # per request RecommendationEngine importance of each rating, `recommended` only
+    weights: Dict[str, float] = {}
+
+    @staticmethod
+    def from_query(
+        sort: Annotated[SearchSort, Query()] = SearchSort.id,
+        limit: Annotated[int, Query(ge=1, le=200)] = 50,
+        cursor: Annotated[Optional[str], Query(max_length=300)] = None,
+        weights: Annotated[
+            Optional[str],
+            Query(max_length=200, description="eg `quality_rating:2,on_schedule_rating:1`"),
+        ] = None,
+    ):
+        page = SearchPage(sort=sort, limit=limit)
+        if weights:
+            try:
+                for weight in weights.split(","):
+                    label, value = weight.split(":")
+                    if label not in RATING_LABELS:
+                        raise ValueError(label)
+                    # float() also takes nan and inf
+                    value = float(value)
+                    if not math.isfinite(value) or abs(value) > MAX_WEIGHT:
+                        raise ValueError(value)
+                    page.weights[label] = value
+            except ValueError:
+                raise APIError.InvalidSearchWeights
+        if cursor:
+            try:
+                raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+                cursor_sort, value, cid, cursor_weights = json.loads(raw)
+                page.after = (value, uuid.UUID(cid))
+            except (ValueError, TypeError, AttributeError):
+                raise APIError.InvalidSearchCursor
+            # `id` pages carry no value, the other sorts a finite rating or score
+            if sort == SearchSort.id:
+                valid_value = value is None
+            else:
+                valid_value = (
+                    isinstance(value, (int, float))
+                    and not isinstance(value, bool)
+                    and math.isfinite(value)
+                )
+            # a cursor only continues the order it was made in
+            if (
+                not valid_value
+                or cursor_sort != sort.value
+                or cursor_weights != page.weights_key()
+            ):
+                raise APIError.InvalidSearchCursor
+        return page
+
+    def weights_key(self) -> Optional[str]:
+        if self.sort != SearchSort.recommended:
+            return None
+        return ",".join(f"{label}:{value:g}" for label, value in sorted(self.weights.items()))
+
+    def split(self, rows: list, scores: List[float] = None) -> Tuple[list, Optional[str]]:
+        """
+        `limit` + 1 ordered rows, rows[i][0] a Contractor, and for `recommended`
+        their `scores` -> (this page, next page's cursor)
+        """
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[: self.limit]
+        last = rows[-1][0]
+        if self.sort == SearchSort.id:
+            value = None
+        elif self.sort == SearchSort.recommended:
+            value = scores[self.limit - 1]
+        else:
+            value = getattr(last, self.sort.value)
+        raw = json.dumps([self.sort.value, value, str(last.id), self.weights_key()]).encode()
+        return rows, base64.urlsafe_b64encode(raw).decode().rstrip("=")
@@ -2,6 +2,7 @@ import enum
 from typing import Optional
 import uuid
 from sqlmodel import SQLModel, Field, CheckConstraint, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import EmailStr, BaseModel, SecretStr
 from api.core.utils import HashedPassword
 
@@ -52,6 +53,12 @@ class User(UserBase, table=True):
         user = db.exec(query).first()
         return user
 
+    @staticmethod
+    async def by_email_async(email: str, db: AsyncSession):
+        query = select(User).where(User.email == email)
+        user = (await db.exec(query)).first()
+        return user
+
     @staticmethod
     def create(user: UserCreate, db: Session):
         password = user.password.get_secret_value()
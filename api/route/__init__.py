@@ -3,6 +3,7 @@ from api.config import get_config
 
 from api.route.contractor import router as contractor
 from api.route.homeowner import router as homeowner
+from api.route.internal import router as internal
 from api.route.root import router as root
 
 
@@ -12,3 +13,5 @@ api = APIRouter(prefix=config.ROOT_PATH)
 api.include_router(root, prefix="", tags=["Utility"])
 api.include_router(contractor, prefix="/contractor", tags=["Contractor"])
 api.include_router(homeowner, prefix="/homeowner", tags=["Homeowner"])
+if config.INTERNAL_ROUTES:
+    api.include_router(internal, prefix="/internal", tags=["Internal"], include_in_schema=False)
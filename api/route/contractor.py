@@ -2,13 +2,15 @@ from typing import Annotated, List
 import uuid
 from fastapi import APIRouter, Depends, File, Form, Response, UploadFile, status
 from api.core.auth.auth import (
+    AsyncTokenAuthContractor,
+    AsyncTokenAuthHomeowner,
+    AsyncTokenAuthUser,
     TokenAuthContractor,
-    TokenAuthHomeowner,
     TokenAuthUser,
 )
-from api.core.db import SessionDB
+from api.core.db import ReadSessionDB, SessionDB
 from api.core.error import APIError
-from api.core.search_engine.projection_engine import RecommendationEngine
+from api.core.utils import PasswordHasherBusy
 import api.models as models
 
 router = APIRouter()
@@ -30,18 +32,21 @@ def signup(
     """
     if models.Contractor.by_email(contractor.email, db):
         raise APIError.SignupException
-    cnt, _ = models.Contractor.create(contractor, db, avatar=avatar)
+    try:
+        cnt, _ = models.Contractor.create(contractor, db, avatar=avatar)
+    except PasswordHasherBusy:
+        raise APIError.PasswordHasherBusy
     view = models.ContractorPublicView.create(cnt)
     db.commit()
     return view
 
 
 @router.get("/{cid}/public", response_model=models.ContractorPublicView)
-def public_info(cid: uuid.UUID, _user: TokenAuthUser, db: SessionDB):
+async def public_info(cid: uuid.UUID, _user: AsyncTokenAuthUser, db: ReadSessionDB):
     """
     Contractor public view as seen by everyone
     """
-    cnt = models.Contractor.by_cid(cid, db)
+    cnt = await models.Contractor.by_cid_async(cid, db)
     if cnt is None:
         raise APIError.ContractorNotFound
     model = models.ContractorPublicView.create(cnt[0], professions=cnt[1], areas=cnt[2])
@@ -358,7 +363,7 @@ def portfolio_external_project_upload(
     response_model=models.ContractorBookingList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active bookings"}},
 )
-def booking_invites_list(user: TokenAuthContractor, db: SessionDB):
+async def booking_invites_list(user: AsyncTokenAuthContractor, db: ReadSessionDB):
     """
     Get a list of all active booking invites IDs for a contractor
     - For each booking ID not present call `contractor/booking/{bid}/info`
@@ -366,7 +371,7 @@ def booking_invites_list(user: TokenAuthContractor, db: SessionDB):
     Return:
         -   [204 No Content] when no active booking invites
     """
-    invites = models.BookingInvite.invites_ids_by_cid(user.id, db)
+    invites = await models.BookingInvite.invites_ids_by_cid_async(user.id, db)
     if not invites:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     invites = models.ContractorBookingList(
@@ -391,7 +396,7 @@ def booking_invites_list(user: TokenAuthContractor, db: SessionDB):
     response_model=models.ContractorBookingList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active bookings"}},
 )
-def bookings_acccepted_list(user: TokenAuthContractor, db: SessionDB):
+async def bookings_acccepted_list(user: AsyncTokenAuthContractor, db: ReadSessionDB):
     """
     Get a list of all bookings with accepted invite IDs for a contractor
     - For each booking ID not present call `contractor/booking/{bid}/info`
@@ -399,7 +404,7 @@ def bookings_acccepted_list(user: TokenAuthContractor, db: SessionDB):
     Return:
         -   [204 No Content] when no active bookings
     """
-    bookings = models.BookingInvite.accepted_by_cid(user.id, db)
+    bookings = await models.BookingInvite.accepted_by_cid_async(user.id, db)
     if not bookings:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     bookings = models.ContractorBookingList(
@@ -603,7 +608,7 @@ def booking_quote_item_update(
     response_model=models.ProjectList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active projects"}},
 )
-def projects_list(user: TokenAuthContractor, db: SessionDB):
+async def projects_list(user: AsyncTokenAuthContractor, db: ReadSessionDB):
     """
     Get a list of all active projects IDs for a contractor
     - For each booking ID not present call `contractor/booking/{bid}/info`
@@ -611,7 +616,7 @@ def projects_list(user: TokenAuthContractor, db: SessionDB):
     Return:
         -   [204 No Content] when no active projects
     """
-    projects = models.Project.list_by_cid(user.id, db)
+    projects = await models.Project.list_by_cid_async(user.id, db)
     if not projects:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     projects = models.ProjectList(
@@ -704,9 +709,19 @@ def project_images_upload(
     response_model=models.SearchContractorList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No matching contractors"}},
 )
-def search_by_filter(filter: models.Filter, user: TokenAuthUser, db: SessionDB):
-    contractors = models.Filter.by_units_and_area(
-        filter.professions, str(filter.zipcode), db
+async def search_by_filter(
+    filter: models.Filter,
+    user: AsyncTokenAuthUser,
+    db: ReadSessionDB,
+    page: models.SearchPage = Depends(models.SearchPage.from_query),
+):
+    """
+    Contractors covering every profession in the zipcode, `limit` at a time
+    - `sort` by id or by a rating, best first
+    - `cursor` is the previous page's `next`
+    """
+    contractors, next_cursor = await models.Filter.by_units_and_area_async(
+        filter.professions, str(filter.zipcode), page, db
     )
     if not contractors:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -718,7 +733,8 @@ def search_by_filter(filter: models.Filter, user: TokenAuthUser, db: SessionDB):
                 areas=contractor[2],
             )
             for contractor in contractors
-        ]
+        ],
+        next=next_cursor,
     )
 
 
@@ -727,8 +743,18 @@ def search_by_filter(filter: models.Filter, user: TokenAuthUser, db: SessionDB):
     response_model=models.SearchContractorList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No matches bookings"}},
 )
-def search_by_booking(bid: uuid.UUID, user: TokenAuthHomeowner, db: SessionDB):    
-    contractors = models.BookingDetail.match_all(bid, db)
+async def search_by_booking(
+    bid: uuid.UUID,
+    user: AsyncTokenAuthHomeowner,
+    db: ReadSessionDB,
+    page: models.SearchPage = Depends(models.SearchPage.from_query),
+):
+    """
+    Contractors matching every unit of the booking, paged like /search
+    - `sort=recommended` ranks them with the RecommendationEngine, `weights` sets how
+    much each rating counts for this request, eg `quality_rating:2,budget_rating:1`
+    """
+    contractors, next_cursor = await models.BookingDetail.match_all_async(bid, page, db)
     if not contractors:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     return models.SearchContractorList(
@@ -739,17 +765,6 @@ def search_by_booking(bid: uuid.UUID, user: TokenAuthHomeowner, db: SessionDB):
                 areas=contractor[2],
             )
             for contractor in contractors
-        ]
+        ],
+        next=next_cursor,
     )
-
-    # recommendation = RecommendationEngine(SQL_Model=contractors)
-    # static_vec_preference = {
-    #     "quality_rating": 4,
-    #     "on_schedule_rating": 10,
-    #     "budget_rating": 3,
-    # }  # Tune parms later
-    # recommendation.set_static_vector(
-    #     static_vec_preference
-    # )  # TODO pass vec parameters as dict (preference)
-
-    # return recommendation.recommend()
@@ -2,12 +2,16 @@ from datetime import datetime
 import uuid
 from fastapi import APIRouter, Depends, File, Response, UploadFile, status
 from api.core.auth.auth import (
+    AsyncTokenAuthHomeowner,
+    AsyncTokenAuthUser,
     TokenAuthContractor,
     TokenAuthHomeowner,
     TokenAuthUser,
 )
-from api.core.db import SessionDB
+from api.core.db import ReadSessionDB, SessionDB
 from api.core.error import APIError
+from api.core.review_scorer import ReviewScorerBusy, get_review_scorer
+from api.core.utils import PasswordHasherBusy
 import api.models as models
 
 router = APIRouter()
@@ -29,18 +33,21 @@ def signup(
     """
     if models.Homeowner.by_email(homeowner.email, db):
         raise APIError.SignupException
-    hmw, _ = models.Homeowner.create(homeowner, db, avatar=avatar)
+    try:
+        hmw, _ = models.Homeowner.create(homeowner, db, avatar=avatar)
+    except PasswordHasherBusy:
+        raise APIError.PasswordHasherBusy
     view = models.HomeownerPublicView.create(hmw)
     db.commit()
     return view
 
 
 @router.get("/{hid}/public", response_model=models.HomeownerPublicView)
-def public_info(hid: uuid.UUID, _user: TokenAuthUser, db: SessionDB):
+async def public_info(hid: uuid.UUID, _user: AsyncTokenAuthUser, db: ReadSessionDB):
     """
     Homeowner public view as seen by everyone
     """
-    homeowner = models.Homeowner.by_hid(hid, db)
+    homeowner = await models.Homeowner.by_hid_async(hid, db)
     if not homeowner:
         raise APIError.HomeownerNotFound
     return models.HomeownerPublicView.create(homeowner)
@@ -224,7 +231,7 @@ def booking_info(bid: uuid.UUID, user: TokenAuthHomeowner, db: SessionDB):
     response_model=models.HomeownerBookingList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active bookings"}},
 )
-def bookings_list(user: TokenAuthHomeowner, db: SessionDB):
+async def bookings_list(user: AsyncTokenAuthHomeowner, db: ReadSessionDB):
     """
     Get a list of all active booking IDs for a homeowner
     - For each booking ID not present call `homeowner/booking/{bid}/info`
@@ -232,7 +239,7 @@ def bookings_list(user: TokenAuthHomeowner, db: SessionDB):
     Return:
         -   [204 No Content]: when no active bookings
     """
-    bookings = models.BookingDetail.by_hid_active_list(user.id, db)
+    bookings = await models.BookingDetail.by_hid_active_list_async(user.id, db)
     if not bookings:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     bookings = models.HomeownerBookingList(
@@ -249,7 +256,9 @@ def bookings_list(user: TokenAuthHomeowner, db: SessionDB):
     response_model=models.HomeownerBookingList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active bookings"}},
 )
-def bookings_list_by_cid_preferences(user: TokenAuthHomeowner, cid: uuid.UUID, db: SessionDB):
+async def bookings_list_by_cid_preferences(
+    user: AsyncTokenAuthHomeowner, cid: uuid.UUID, db: ReadSessionDB
+):
     """
     Get a list of all active booking IDs for a homeowner which matches the preferences
     from a contractor ID
@@ -258,7 +267,7 @@ def bookings_list_by_cid_preferences(user: TokenAuthHomeowner, cid: uuid.UUID, d
     Return:
         -   [204 No Content]: when no active bookings
     """
-    bookings = models.BookingDetail.match_all_by_hid_and_cid(user.id, cid, db)
+    bookings = await models.BookingDetail.match_all_by_hid_and_cid_async(user.id, cid, db)
     if not bookings:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     bookings = models.HomeownerBookingList(
@@ -369,7 +378,7 @@ def booking_quote_info(bid: uuid.UUID, cid: uuid.UUID, user: TokenAuthHomeowner,
     response_model=models.ProjectList,
     responses={status.HTTP_204_NO_CONTENT: {"description": "No active projects"}},
 )
-def projects_list(user: TokenAuthHomeowner, db: SessionDB):
+async def projects_list(user: AsyncTokenAuthHomeowner, db: ReadSessionDB):
     """
     Get a list of all active projects IDs for a homeowner
         - For each booking ID not present call `homeowner/booking/{bid}/info`
@@ -377,7 +386,7 @@ def projects_list(user: TokenAuthHomeowner, db: SessionDB):
     Return:
         -   [204 No Content]: when no active bookins
     """
-    projects = models.Project.list_by_hid(user.id, db)
+    projects = await models.Project.list_by_hid_async(user.id, db)
     if not projects:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     projects = models.ProjectList(
@@ -463,6 +472,13 @@ def accept_project_completion(
     )
     db.add(project)
     db.commit()
+    # scored in the background, the review is saved either way
+    scorer = get_review_scorer()
+    if scorer and review.description:
+        try:
+            scorer.submit(project.booking_id, review.description)
+        except ReviewScorerBusy:
+            print(f"[review scorer] queue full, review {project.booking_id} not scored")
 
 
 @router.post("/project/{bid}/complete/reject")
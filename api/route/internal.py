@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+from sqlalchemy import text
+from api.core.auth.cache import get_principal_cache
+from api.core.db import SessionDB, get_db
+from api.core.query_stats import route_query_stats
+from api.core.review_scorer import get_review_scorer
+from api.core.utils import get_password_hasher
+
+router = APIRouter()
+
+
+@router.get("/auth/cache")
+def auth_cache():
+    """
+    Principal cache counters
+    - hits are `users` lookups (and JWT decodes) that never happened
+    """
+    return get_principal_cache().stats()
+
+
+@router.get("/hasher")
+def hasher():
+    """
+    Password hashing pool depth and latency
+    """
+    return get_password_hasher().stats()
+
+
+@router.get("/db/pool")
+def db_pool(db: SessionDB):
+    """
+    Connection pool occupancy and checkout waits, per engine
+    - `max_connections` is the server limit, it must cover
+    (size + max_overflow) * engines * uvicorn workers
+    """
+    max_connections = db.exec(text("SHOW max_connections")).scalar()
+    return {
+        "max_connections": int(max_connections),
+        "pools": get_db().pool_stats(),
+        "read_routing": get_db().read_routing,
+    }
+
+
+@router.get("/db/queries")
+def db_queries():
+    """
+    SQL statements and DB time per route, heaviest first
+    """
+    return route_query_stats.stats()
+
+
+@router.get("/review-scorer")
+def review_scorer():
+    """
+    Review description scoring queue, batch size, queue wait and latency histograms
+    - null when REVIEW_SCORER_WEIGHTS is not set
+    """
+    scorer = get_review_scorer()
+    return scorer.stats() if scorer else None
@@ -1,10 +1,12 @@
-from typing import List
-from fastapi import APIRouter
+from typing import Annotated, List
+from fastapi import APIRouter, Query, Request, Response, status
 from api import models
 from api.config import SessionConfig, get_config
 from api.core.auth.auth import PasswordAuthUser, TokenAuthUser
 from api.core.auth.utils import Token, create_access_token
 from api.core.db import SessionDB
+from api.core.error import APIError
+from api.models.quiz.catalog import QuizDocument, get_work_unit_catalog
 
 router = APIRouter()
 
@@ -32,7 +34,7 @@ def token(user: PasswordAuthUser, config: SessionConfig):
 
 
 @router.get("/quiz")
-def quiz(_user: TokenAuthUser, db: SessionDB):
+def quiz(request: Request, _user: TokenAuthUser, db: SessionDB):
     """
     Return a JSON encoded string with the schema for the booking quiz
     area:room:category:subcategory:subcategory_idx:
@@ -47,8 +49,53 @@ def quiz(_user: TokenAuthUser, db: SessionDB):
     - quantity: "Count"
     - action: "Repair"
     - profession: "Furniture Repair Specialist"
+
+    Note: Responses carry an ETag, send it back as If-None-Match to get a 304
+    until the work units change
+    """
+    return quiz_response(request, get_work_unit_catalog(db).quiz)
+
+
+@router.get("/quiz/search", response_model=models.WorkUnitSearchView)
+def quiz_search(
+    _user: TokenAuthUser,
+    db: SessionDB,
+    q: Annotated[str, Query(min_length=1, max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """
+    Search work units and professions by prefix, tolerating typos
+
+    Example: `q=kitch sink` or `q=plumer`
     """
-    return models.WorkUnitView.to_json(db)
+    return get_work_unit_catalog(db).search(q, limit)
+
+
+@router.get("/quiz/{path:path}")
+def quiz_subtree(path: str, request: Request, _user: TokenAuthUser, db: SessionDB):
+    """
+    One branch of the quiz tree, eg `/quiz/Indoors/Kitchen` or
+    `/quiz/Indoors/Kitchen/Appliances/Sinks`, same shape as that part of /quiz
+    """
+    names = tuple(name for name in path.split("/") if name)
+    document = get_work_unit_catalog(db).quiz_subtree(names)
+    if document is None:
+        raise APIError.QuizBranchNotFound
+    return quiz_response(request, document)
+
+
+def quiz_response(request: Request, document: QuizDocument):
+    encoding = document.negotiate(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": document.etag(encoding),
+        "Cache-Control": f"private, max-age={config.QUIZ_MAX_AGE_SECONDS}",
+        "Vary": "Accept-Encoding",
+    }
+    if document.not_modified(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(document.variants[encoding], media_type="application/json", headers=headers)
 
 
 @router.get("/professions", response_model=List[str])
@@ -58,8 +105,7 @@ def list_professions(_user: TokenAuthUser, db: SessionDB):
 
     Usage: Initial profession selection when new contractor signs up
     """
-    units = models.WorkUnit.all_professions(db)
-    return [unit[0] for unit in units]
+    return list(get_work_unit_catalog(db).professions)
 
 
 @router.get("/review_words")
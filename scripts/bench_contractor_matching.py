@@ -0,0 +1,166 @@
+"""
+Contractor matching benchmark
+
+Loads a synthetic dataset into a scratch schema of the configured database
+(100k contractors, 1k work units by default), then times "which contractors
+cover every unit of these professions in this zipcode" three ways:
+
+- the SQL matcher (Filter.by_units_and_area)
+- ContractorMatchIndex.match alone
+- the index plus the contractor rows fetch, what /contractor/search does now
+
+The schema is dropped afterwards.
+
+    PYTHONPATH=. python scripts/bench_contractor_matching.py --contractors 100000 --units 1000
+"""
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+from api.core.db import get_db
+import api.models as models
+from api.models.matching import ContractorMatchIndex
+from api.models.quiz.catalog import WorkUnitCatalog
+
+SCHEMA = "bench_contractor_matching"
+
+DATASET = """
+INSERT INTO work_units (area, location, category, subcategory, action, quantity, profession)
+    SELECT 'Indoors', 'Room ' || (i % 10), 'Category ' || (i % 50), 'Sub ' || i, 'Repair',
+        'Count', 'Profession ' || (i % {professions})
+    FROM generate_series(1, {units}) i;
+
+INSERT INTO users (email, phone_number, id, password, admin, role)
+    SELECT 'c' || i || '@bench.test', 'c' || i, md5('c' || i)::uuid, 'x', false, 'contractor'
+    FROM generate_series(1, {contractors}) i;
+
+INSERT INTO contractors
+    (quality_rating, budget_rating, on_schedule_rating, id, first_name, last_name)
+    SELECT i % 5, i % 3, i % 4, md5('c' || i)::uuid, 'c', 'c' || i
+    FROM generate_series(1, {contractors}) i;
+
+INSERT INTO contractor_area_preferences (area, contractor_id)
+    SELECT lpad(((i * 7 + k * 13) % {zipcodes})::text, 5, '0'), md5('c' || i)::uuid
+    FROM generate_series(1, {contractors}) i CROSS JOIN generate_series(0, {areas_each} - 1) k
+    ON CONFLICT DO NOTHING;
+
+INSERT INTO contractor_profession_preferences (work_unit_id, contractor_id)
+    SELECT DISTINCT w.id, md5('c' || i)::uuid
+    FROM generate_series(1, {contractors}) i
+    CROSS JOIN generate_series(0, {professions_each} - 1) k
+    JOIN work_units w ON w.profession = 'Profession ' || ((i * 3 + k * 17) % {professions});
+
+ANALYZE;
+"""
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        f"p50 {statistics.median(samples):.2f}ms "
+        f"p95 {samples[int(len(samples) * 0.95) - 1]:.2f}ms "
+        f"max {samples[-1]:.2f}ms"
+    )
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contractors", type=int, default=100_000)
+    parser.add_argument("--units", type=int, default=1_000)
+    parser.add_argument("--professions", type=int, default=200)
+    parser.add_argument("--professions-each", type=int, default=3)
+    parser.add_argument("--zipcodes", type=int, default=1_000)
+    parser.add_argument("--areas-each", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    url = get_db().engine.url
+    with create_engine(url).begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        SQLModel.metadata.create_all(engine)
+        load, _ = timed(lambda: load_dataset(engine, args))
+        print(f"dataset loaded in {load / 1000:.1f}s")
+
+        build, index = timed(lambda: ContractorMatchIndex.build(engine))
+        bitmap_bytes = sum(
+            bits.nbytes for bitmaps in (index.unit_bits, index.area_bits) for bits in bitmaps.values()
+        )
+        print(
+            f"index built in {build:.0f}ms: {len(index)} contractors, "
+            f"{len(index.unit_bits)} units, {len(index.area_bits)} areas, "
+            f"{bitmap_bytes / 2**20:.1f}MiB of bitmaps"
+        )
+
+        with Session(engine) as db:
+            catalog = WorkUnitCatalog("bench", db.exec(select(models.WorkUnit)).all())
+            # queries taken from random contractors' preferences, so most have matches
+            rng = random.Random(7)
+            queries = []
+            for _ in range(args.queries):
+                units, areas = index.preferences(rng.choice(index.cids))
+                professions = sorted(catalog.ids_to_professions(units))
+                queries.append(
+                    (
+                        rng.sample(professions, min(len(professions), rng.randint(1, 2))),
+                        rng.choice(sorted(areas)),
+                    )
+                )
+
+            sql, bitmap, indexed, hits = [], [], [], 0
+            for professions, area in queries:
+                ms, expected = timed(
+                    lambda: models.Filter.by_units_and_area(professions, area, db)
+                )
+                sql.append(ms)
+                unit_ids = catalog.professions_to_ids(professions)
+                ms, cids = timed(lambda: index.match(unit_ids, area))
+                bitmap.append(ms)
+                ms, _ = timed(
+                    lambda: db.exec(
+                        select(models.Contractor).where(models.Contractor.id.in_(cids))
+                    ).all()
+                    if cids
+                    else []
+                )
+                indexed.append(ms + bitmap[-1])
+                assert {row[0].id for row in expected} == set(cids), (professions, area)
+                hits += len(cids)
+    finally:
+        with create_engine(url).begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    print(f"{args.queries} queries, {hits / args.queries:.1f} matches on average, same results")
+    print(f"SQL matcher:          {percentiles(sql)}")
+    print(f"index match:          {percentiles(bitmap)}")
+    print(f"index + contractors:  {percentiles(indexed)}")
+
+
+def load_dataset(engine, args):
+    with engine.begin() as connection:
+        # raw cursor, no bind params: the `%` in the script are modulo operators
+        with connection.connection.driver_connection.cursor() as cursor:
+            cursor.execute(
+                DATASET.format(
+                    units=args.units,
+                    professions=args.professions,
+                    contractors=args.contractors,
+                    zipcodes=args.zipcodes,
+                    areas_each=args.areas_each,
+                    professions_each=args.professions_each,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
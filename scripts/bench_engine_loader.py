@@ -0,0 +1,70 @@
+"""
+RecommendationEngine loader benchmark
+
+Builds the engine's z-scored rating matrix from `--rows` contractors two ways
+and reports the best time of `--runs` and the peak traced allocation of each:
+
+- RecommendationEngine.from_rows, the columnar loader, from (id, *ratings) rows
+- the previous path: Contractor models -> model_dump_json -> json.loads -> DataFrame
+
+    PYTHONPATH=. python scripts/bench_engine_loader.py --rows 2500
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+import numpy as np
+import pandas as pd
+from api.core.search_engine.projection_engine import RATING_LABELS, RecommendationEngine
+from api.models.contractor import Contractor
+
+
+def legacy_engine_data(contractors):
+    # what RecommendationEngine(SQL_Model=...) did before the columnar loader
+    frame = pd.DataFrame([json.loads(contractor.model_dump_json()) for contractor in contractors])
+    frame["name"] = frame["first_name"] + " " + frame["last_name"]
+    labels = [column for column in frame.columns if column.endswith("_rating")]
+    data = frame[["id", "name"] + labels][labels].to_numpy()
+    stds = data.std(axis=0)
+    return frame["id"].to_list(), (data - data.mean(axis=0)) / np.where(stds == 0, 1, stds)
+
+
+def measure(build, runs):
+    """(best time in ms, peak traced allocation in bytes) of `build()`"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        build()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    ratings = rng.integers(0, 6, (args.rows, len(RATING_LABELS))).tolist()
+    ids = [uuid.UUID(int=i) for i in range(args.rows)]
+    rows = [(cid, *row) for cid, row in zip(ids, ratings)]
+    contractors = [
+        Contractor(id=cid, first_name="c", last_name="c", **dict(zip(RATING_LABELS, row)))
+        for cid, row in zip(ids, ratings)
+    ]
+
+    columnar_time, columnar_peak = measure(lambda: RecommendationEngine.from_rows(rows), args.runs)
+    legacy_time, legacy_peak = measure(lambda: legacy_engine_data(contractors), args.runs)
+    print(f"{args.rows} rows")
+    print(f"columnar loader: {columnar_time:8.2f}ms {columnar_peak / 1024:8.0f}KiB peak")
+    print(f"previous path:   {legacy_time:8.2f}ms {legacy_peak / 1024:8.0f}KiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Login storm benchmark
+
+Hammers POST /token from many threads while a single prober polls an unrelated
+route, then reports /token throughput and the prober's latency percentiles.
+Run it against a live server (eg `docker compose up`) with INTERNAL_ROUTES=true
+for the pool counters:
+
+    python scripts/bench_login_storm.py --base http://localhost:8881 --seconds 20
+
+Compare runs with PASSWORD_HASH_POOL=thread|process and different
+PASSWORD_HASH_WORKERS to size the pool.
+"""
+import argparse
+import statistics
+import threading
+import time
+import uuid
+import httpx
+
+PASSWORD = "bench-password"
+
+
+def signup(client: httpx.Client):
+    suffix = uuid.uuid4().hex[:10]
+    email = f"bench-{suffix}@sitesync.me"
+    response = client.post(
+        "contractor/signup",
+        data={
+            "email": email,
+            "first_name": "bench",
+            "last_name": "storm",
+            "phone_number": f"555{int(suffix, 16) % 10_000_000:07d}",
+            "password": PASSWORD,
+        },
+    )
+    response.raise_for_status()
+    return email
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base", default="http://localhost:8881")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login threads")
+    parser.add_argument("--probe", default="health", help="unrelated route to time")
+    args = parser.parse_args()
+
+    base = args.base.rstrip("/") + "/"
+    with httpx.Client(base_url=base, timeout=30) as client:
+        email = signup(client)
+        baseline = []
+        for _ in range(50):
+            start = time.perf_counter()
+            client.get(args.probe)
+            baseline.append(time.perf_counter() - start)
+
+    stop = time.perf_counter() + args.seconds
+    counts = {"ok": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+    probe_latency = []
+
+    def login():
+        with httpx.Client(base_url=base, timeout=30) as client:
+            while time.perf_counter() < stop:
+                response = client.post(
+                    "token",
+                    data={"username": email, "password": PASSWORD, "scope": "contractor"},
+                )
+                key = {200: "ok", 503: "busy"}.get(response.status_code, "error")
+                with lock:
+                    counts[key] += 1
+
+    def probe():
+        with httpx.Client(base_url=base, timeout=30) as client:
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                client.get(args.probe)
+                probe_latency.append(time.perf_counter() - start)
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=login) for _ in range(args.logins)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with httpx.Client(base_url=base, timeout=30) as client:
+        response = client.get("internal/hasher")
+        hasher = response.json() if response.status_code == 200 else None
+
+    ms = 1000
+    print(f"/token: {counts['ok'] / args.seconds:.1f} req/s ok, {counts}")
+    print(
+        f"/{args.probe} idle:  p50={statistics.median(baseline) * ms:.1f}ms "
+        f"p99={percentile(baseline, 99) * ms:.1f}ms"
+    )
+    print(
+        f"/{args.probe} storm: p50={statistics.median(probe_latency) * ms:.1f}ms "
+        f"p99={percentile(probe_latency, 99) * ms:.1f}ms n={len(probe_latency)}"
+    )
+    if hasher:
+        print(f"hasher: {hasher}")
+
+
+if __name__ == "__main__":
+    main()
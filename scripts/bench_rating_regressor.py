@@ -0,0 +1,112 @@
+"""
+RatingRegressor inference backend benchmark
+
+Exports the model once (ONNX, ONNX int8), then times each backend of
+api.core.search_engine.rating_export in its own process, so its RSS is its own:
+batches of `--batch` reviews of `--tokens` tokens on `--threads` intra-op
+threads (docker-compose caps the API at 2 CPUs). Errors are max abs error of
+the scores against fp32 on the same batch.
+
+- steady RSS: after the backend is built and has run, what serving it costs
+- peak RSS: includes loading the fp32 model every backend starts from
+
+    PYTHONPATH=. python scripts/bench_rating_regressor.py --weights rating_regressor.pt
+    PYTHONPATH=. python scripts/bench_rating_regressor.py --tiny  # random weights, no download
+"""
+import argparse
+import gc
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from transformers import BertConfig, BertModel
+from api.core.search_engine import rating_export
+from api.core.search_engine.text_scaler_engine import RatingRegressor
+
+
+def build_model(args):
+    # the same random weights in every process
+    torch.manual_seed(0)
+    bert = None
+    if args.tiny:
+        config = BertConfig(
+            hidden_size=128, num_hidden_layers=2, num_attention_heads=2, intermediate_size=512
+        )
+        bert = BertModel(config)
+    model = RatingRegressor(bert)
+    if args.weights:
+        model.load_state_dict(torch.load(args.weights, map_location="cpu"))
+    return model.eval()
+
+
+def rss_mb():
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run(args):
+    model = build_model(args)
+    backend = rating_export.backends(model, args.directory, args.threads, (args.mode,))[args.mode]
+    if args.mode != "fp32":
+        del model
+        gc.collect()
+    # --tiny keeps bert-base's vocabulary size
+    inputs = rating_export.sample_inputs(BertConfig().vocab_size, args.batch, args.tokens, seed=1)
+    scores = backend(*inputs)
+    samples = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        backend(*inputs)
+        samples.append((time.perf_counter() - start) * 1000)
+    np.save(os.path.join(args.directory, f"{args.mode}.npy"), scores)
+    samples.sort()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{args.mode + ':':11}p50 {statistics.median(samples):8.1f}ms  "
+        f"p95 {samples[int(len(samples) * 0.95) - 1]:8.1f}ms  "
+        f"{args.batch * 1000 / statistics.median(samples):7.1f} reviews/s  "
+        f"steady RSS {rss_mb():6.0f}MB  peak RSS {peak:6.0f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", help="RatingRegressor state dict, random head without")
+    parser.add_argument("--tiny", action="store_true", help="small random BERT, no download")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--tokens", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--mode", choices=rating_export.BACKENDS)
+    parser.add_argument("--directory")
+    args = parser.parse_args()
+    if args.mode:
+        return run(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            rating_export.export_onnx(build_model(args), directory)
+            modes = ["fp32", "int8", "onnx", "onnx-int8"]
+        except ImportError:
+            print("onnxruntime not installed, torch backends only")
+            modes = ["fp32", "int8"]
+        print(f"batches of {args.batch} x {args.tokens} tokens, {args.threads} threads")
+        for mode in modes:
+            command = [sys.executable, *sys.argv, "--mode", mode, "--directory", directory]
+            subprocess.run(command, check=True)
+        expected = np.load(os.path.join(directory, "fp32.npy"))
+        for mode in modes[1:]:
+            error = np.abs(np.load(os.path.join(directory, f"{mode}.npy")) - expected).max()
+            print(f"{mode} max abs error against fp32: {error:.5f}")
+
+
+if __name__ == "__main__":
+    main()
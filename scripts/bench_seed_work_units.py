@@ -0,0 +1,96 @@
+"""
+Work unit seeding benchmark
+
+Times cold-start catalog seeding in a scratch schema of the configured database:
+the old line-by-line ORM inserts (one commit per line) against the bulk
+`INSERT ... ON CONFLICT DO NOTHING`, a warm re-run, and N seeders starting at
+once the way uvicorn workers do. The schema is dropped afterwards.
+
+    PYTHONPATH=. python scripts/bench_seed_work_units.py --seeders 4
+"""
+import argparse
+import threading
+import time
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+from api.core.db import get_db
+from api.models.quiz.model import WorkUnit, WorkUnitCreate, WorkUnits
+from api.models.quiz.utils import create_work_units
+
+SCHEMA = "bench_seed_work_units"
+
+
+def seed_line_by_line(db: Session):
+    """What create_work_units did before bulk seeding"""
+    for line in WorkUnits:
+        for unit in WorkUnitCreate.from_line(line):
+            db.add(WorkUnit(**unit.model_dump()))
+        db.commit()
+
+
+def reset(engine):
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {SCHEMA}.work_units"))
+    SQLModel.metadata.create_all(engine, tables=[WorkUnit.__table__])
+    WorkUnit.init_table(engine)
+
+
+def timed(engine, seed):
+    start = time.perf_counter()
+    with Session(engine) as db:
+        seed(db)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeders", type=int, default=4, help="concurrent cold-start seeders")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    url = get_db().engine.url
+    with create_engine(url).begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    try:
+        legacy, bulk, warm = [], [], []
+        for _ in range(args.runs):
+            reset(engine)
+            legacy.append(timed(engine, seed_line_by_line))
+            reset(engine)
+            bulk.append(timed(engine, create_work_units))
+            warm.append(timed(engine, create_work_units))
+
+        reset(engine)
+        inserted = []
+        barrier = threading.Barrier(args.seeders)
+
+        def seeder():
+            with Session(engine) as db:
+                barrier.wait()
+                inserted.append(create_work_units(db))
+
+        threads = [threading.Thread(target=seeder) for _ in range(args.seeders)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent = (time.perf_counter() - start) * 1000
+        with engine.connect() as connection:
+            rows = connection.execute(text("SELECT count(*) FROM work_units")).scalar()
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    print(f"line by line (cold): best {min(legacy):.1f}ms, worst {max(legacy):.1f}ms")
+    print(f"bulk (cold):         best {min(bulk):.1f}ms, worst {max(bulk):.1f}ms")
+    print(f"bulk (warm re-run):  best {min(warm):.1f}ms, worst {max(warm):.1f}ms")
+    print(
+        f"{args.seeders} concurrent seeders: {concurrent:.1f}ms, "
+        f"inserted per seeder {sorted(inserted, reverse=True)}, rows {rows}"
+    )
+
+
+if __name__ == "__main__":
+    main()
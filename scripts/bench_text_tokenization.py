@@ -0,0 +1,108 @@
+"""
+TextScalerEngine tokenization benchmark
+
+Tokenizes `--reviews` synthetic reviews of varied lengths and iterates one epoch
+of training batches (no model), each way in its own process for its peak RSS:
+
+- before: batch_encode_plus over the whole dataframe padded to its longest
+  review, then a DataLoader over per-item tensors
+- after: TokenStore.build streamed to memory-mapped files, then a DataLoader with
+  LengthBucketSampler and ReviewDataset.collate
+
+tokens/s counts real (not padding) tokens, tokenization and batching together;
+"padded tokens" is what BERT would run over per epoch.
+
+    PYTHONPATH=. python scripts/bench_text_tokenization.py --reviews 50000
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+from transformers import BertTokenizerFast
+from api.core.search_engine.text_scaler_engine import (
+    LengthBucketSampler,
+    ReviewDataset,
+    TokenStore,
+)
+
+WORDS = "the food was great bad cold tasty patio loud menu service slow friendly".split()
+
+
+def synthetic_reviews(count):
+    rng = np.random.default_rng(7)
+    # mostly short reviews, a long tail up to the 512 token limit
+    lengths = np.clip(rng.lognormal(3.5, 0.8, count).astype(int), 1, 600)
+    return [" ".join(rng.choice(WORDS, length)) for length in lengths]
+
+
+class EncodedDataset(Dataset):
+    # what ReviewDataset did before the TokenStore
+    def __init__(self, encodings, labels):
+        self.encodings = encodings
+        self.labels = labels
+
+    def __getitem__(self, idx):
+        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
+        item["labels"] = torch.tensor(self.labels[idx], dtype=torch.float)
+        return item
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def before(texts, labels, tokenizer, batch_size):
+    encodings = tokenizer.batch_encode_plus(
+        texts, padding="longest", truncation=True, max_length=512, return_tensors="pt"
+    )
+    loader = DataLoader(EncodedDataset(encodings, labels), batch_size=batch_size, shuffle=True)
+    padded = sum(batch["input_ids"].numel() for batch in loader)
+    return int(encodings["attention_mask"].sum()), padded
+
+
+def after(texts, labels, tokenizer, batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        store = TokenStore.build(directory, texts, tokenizer)
+        dataset = ReviewDataset(store, labels, pad_id=tokenizer.pad_token_id)
+        sampler = LengthBucketSampler(dataset.lengths(), batch_size)
+        loader = DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate)
+        padded = sum(batch["input_ids"].numel() for batch in loader)
+        return int(store.lengths.sum()), padded
+
+
+def run(args):
+    texts = synthetic_reviews(args.reviews)
+    labels = np.random.default_rng(7).uniform(1, 5, (len(texts), 4))
+    tokenizer = BertTokenizerFast.from_pretrained(args.tokenizer)
+    start = time.perf_counter()
+    measure = before if args.mode == "before" else after
+    real, padded = measure(texts, labels, tokenizer, args.batch_size)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{args.mode + ':':8}{real / seconds:12,.0f} tokens/s  "
+        f"padded tokens {padded:,} ({padded / real:.2f}x)  peak RSS {peak:,.0f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reviews", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tokenizer", default="bert-base-uncased")
+    parser.add_argument("--mode", choices=["before", "after"])
+    args = parser.parse_args()
+    if args.mode:
+        return run(args)
+
+    print(f"{args.reviews} reviews, batches of {args.batch_size}")
+    for mode in ("before", "after"):
+        subprocess.run([sys.executable, *sys.argv, "--mode", mode], check=True)
+
+
+if __name__ == "__main__":
+    main()
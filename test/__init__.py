@@ -0,0 +1,4 @@
+import os
+
+# the suite checks /internal/* counters, routes are mounted when api.route is imported
+os.environ.setdefault("INTERNAL_ROUTES", "true")
@@ -1,6 +1,17 @@
+import json
+import threading
 import unittest
+import uuid
 import numpy as np
-from api.core.search_engine.projection_engine import RecommendationEngine
+import pandas as pd
+from api.core.search_engine.projection_engine import (
+    RATING_LABELS,
+    ColumnStats,
+    RecommendationEngine,
+)
+from api.models.contractor import Contractor
+from api.models.matching import ContractorMatchIndex
+from api.models.search_page import SearchPage, SearchSort
 
 alternate_dataset = [[1, 2, 3, 4], [2, 2, 3, 4], [3, 3, 3, 4], [4, 4, 4, 4]]
 
@@ -33,13 +44,162 @@ class TestRecommendationEngine(unittest.TestCase):
         manual_normalized_data = np.vstack((x_normalized, y_normalized, z_normalized)).T
 
         # Retrieve the normalized data from the recommender
-        recommender_normalized_data = recommender.data
+        recommender_normalized_data = recommender.number_data
 
         # Assert that the two normalized datasets are almost equal
         np.testing.assert_array_almost_equal(
             recommender_normalized_data, manual_normalized_data, decimal=6
         )
 
+    def test_columnar_loader(self):
+        rng = np.random.default_rng(3)
+        ratings = rng.integers(0, 6, (2500, len(RATING_LABELS))).tolist()
+        ids = [uuid.UUID(int=i) for i in range(len(ratings))]
+        rows = [(cid, *row) for cid, row in zip(ids, ratings)]
+        contractors = [
+            Contractor(id=cid, first_name="c", last_name="c", **dict(zip(RATING_LABELS, row)))
+            for cid, row in zip(ids, ratings)
+        ]
+
+        # same engine from rows, from rows of unknown count, and from models
+        columnar = RecommendationEngine.from_rows(iter(rows))
+        self.assertEqual(columnar.ids, ids)
+        others = [
+            RecommendationEngine.from_rows(rows, count=len(rows)),
+            RecommendationEngine(SQL_Model=contractors),
+        ]
+        for other in others:
+            self.assertEqual(other.ids, ids)
+            np.testing.assert_array_equal(other.number_data, columnar.number_data)
+        self.assertEqual(columnar.number_data.dtype, np.float32)
+        legacy_ids, legacy_data = legacy_engine_data(contractors)
+        self.assertEqual(legacy_ids, [str(cid) for cid in ids])
+        np.testing.assert_array_almost_equal(columnar.number_data, legacy_data, decimal=5)
+
+    def test_incremental_z_score(self):
+        rng = np.random.default_rng(5)
+        dataset = rng.integers(0, 6, (500, len(RATING_LABELS))).astype(np.float32)
+        recommender = RecommendationEngine(dataset_matrix=dataset)
+        weights = {"quality_rating": 2.0, "budget_rating": -1.0}
+        recommender.scores(weights)
+
+        # a review at a time, as ContractorReview.create moves one contractor's ratings
+        for row in rng.integers(0, len(dataset), 300):
+            dataset[row] = rng.integers(0, 6, len(RATING_LABELS))
+            recommender.update_row(row, dataset[row])
+        batch = RecommendationEngine(dataset_matrix=dataset)
+        exact = dataset.astype(np.float64)
+        np.testing.assert_allclose(recommender.stats.mean, exact.mean(axis=0), atol=1e-6)
+        np.testing.assert_allclose(recommender.stats.std, exact.std(axis=0), atol=1e-6)
+        np.testing.assert_allclose(recommender.number_data, batch.number_data, atol=1e-6)
+        np.testing.assert_allclose(recommender.scores(), batch.scores(weights), atol=1e-5)
+
+        # merged halves agree with the whole
+        merged = ColumnStats.of(dataset[:123])
+        merged.merge(ColumnStats.of(dataset[123:]))
+        np.testing.assert_allclose(merged.mean, dataset.mean(axis=0), atol=1e-6)
+        np.testing.assert_allclose(merged.std, dataset.std(axis=0), atol=1e-6)
+
+        # a column left without spread scores 0
+        for row in range(len(dataset)):
+            recommender.update_row(row, [3, dataset[row, 1], dataset[row, 2]])
+        np.testing.assert_allclose(recommender.number_data[:, 0], 0, atol=1e-6)
+
+    def test_recommend_many(self):
+        rng = np.random.default_rng(9)
+        dataset = rng.integers(0, 6, (3000, len(RATING_LABELS)))
+        recommender = RecommendationEngine(dataset_matrix=dataset, ids=list(range(3000, 6000)))
+        recommender.set_static_vector({"on_schedule_rating": 1.0})
+        preferences = [{}, {"quality_rating": 2.0}, {"budget_rating": -3.0, "quality_rating": 1.5}]
+        preferences += [dict(zip(RATING_LABELS, rng.normal(size=3))) for _ in range(20)]
+
+        vectors = recommender.vectors(preferences)
+        scores = recommender.scores_many(vectors)
+        rankings = recommender.recommend_many(vectors, k=40)
+        # batched state is never touched
+        np.testing.assert_array_equal(recommender.dynamic_vector, 0)
+        for column, preference in enumerate(preferences):
+            single = RecommendationEngine(dataset_matrix=dataset, ids=list(range(3000, 6000)))
+            single.set_static_vector({"on_schedule_rating": 1.0})
+            # bit for bit, so integer ratings' many ties come out in the same order
+            np.testing.assert_array_equal(scores[column], single.scores(preference))
+            self.assertEqual(rankings[column], single.recommend(k=40))
+        self.assertEqual(len(recommender.recommend_many(vectors[:2], k=5000)[1]), 3000)
+
+        # mostly distinct rows are ranked without grouping them
+        distinct = RecommendationEngine(dataset_matrix=dataset + rng.random(dataset.shape))
+        rankings = distinct.recommend_many(vectors, k=40)
+        for column, preference in enumerate(preferences):
+            distinct.dynamic_vector[:] = 0
+            self.assertEqual(rankings[column], distinct.recommend(preference, k=40))
+
+    def test_older_polls_are_dropped(self):
+        cid = uuid.UUID(int=1)
+        index = ContractorMatchIndex()
+        index.load({cid: ({1}, {"10001"})})
+        index.set_ratings([(cid, 1, 1, 1)])
+
+        def poll(xmin, unit, area, rating):
+            # _CHANGES rows: the poll's xmin, then each changed contractor's state
+            return [
+                (None, None, None, xmin, None, None, None),
+                (cid, None, None, None, rating, rating, rating),
+                (cid, unit, None, None, None, None, None),
+                (cid, None, area, None, None, None, None),
+            ]
+
+        # the primary's poll lands first, a lagging replica's from the same `since` after it
+        self.assertTrue(index.apply_changes(poll(20, 2, "10002", 5)))
+        self.assertFalse(index.apply_changes(poll(10, 1, "10001", 3)))
+        self.assertEqual(index.preferences(cid), (frozenset({2}), frozenset({"10002"})))
+        self.assertEqual(index.match([2], "10002"), [cid])
+        ratings, _ = index.ranking.gather(np.array([index.ordinals[cid]]))
+        self.assertEqual(ratings[:, 0].tolist(), [5, 5, 5])
+        self.assertEqual(index.since, 20)
+
+    def test_ranking_snapshots_under_concurrent_changes(self):
+        rng = np.random.default_rng(11)
+        cids = [uuid.UUID(int=i + 1) for i in range(4000)]
+        ratings = {cid: rng.integers(0, 6, 3).tolist() for cid in cids}
+        index = ContractorMatchIndex()
+        index.load({cid: ({1}, {"10001"}) for cid in cids})
+        index.set_ratings((cid, *values) for cid, values in ratings.items())
+        ordinals = np.arange(len(cids))
+        before = index.ranking
+        published, _ = before.gather(ordinals)
+        page = SearchPage(sort=SearchSort.recommended, limit=20, weights={"quality_rating": 2})
+        errors, rankings = [], []
+
+        def search():
+            try:
+                for _ in range(50):
+                    rankings.append(index.recommend([1], "10001", page))
+            except Exception as e:
+                errors.append(e)
+
+        searches = [threading.Thread(target=search) for _ in range(4)]
+        for thread in searches:
+            thread.start()
+        # enough changes for background folds along the way
+        for _ in range(300):
+            changed = [cids[i] for i in rng.integers(0, len(cids), 5)]
+            for cid in changed:
+                ratings[cid] = rng.integers(0, 6, 3).tolist()
+            index.set_ratings((cid, *ratings[cid]) for cid in changed)
+        for thread in searches:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(rankings), 200)
+        for _, scores in rankings:
+            self.assertEqual(scores, sorted(scores, reverse=True))
+        # a published snapshot never changes
+        np.testing.assert_array_equal(before.gather(ordinals)[0], published)
+        index.fold()
+        self.assertEqual(len(index.ranking.delta), 0)
+        current = np.array([ratings[cid] for cid in index.cids], dtype=np.float32).T
+        np.testing.assert_array_equal(index.ranking.gather(ordinals)[0], current)
+
     # def test_reccomendation_function(self, recommender_normalized_data, manual_normalized_data):
     #     data_points = alternate_dataset
     #     recommender = RecommendationEngine(dataset_matrix=alternate_dataset)
@@ -61,6 +221,16 @@ class TestRecommendationEngine(unittest.TestCase):
     #     np.testing.assert_array_almost_equal(recommender_normalized_data, manual_normalized_data, decimal=6)
 
 
+def legacy_engine_data(contractors):
+    """The engine's matrix as built before the columnar loader: models -> JSON -> DataFrame"""
+    frame = pd.DataFrame([json.loads(contractor.model_dump_json()) for contractor in contractors])
+    frame["name"] = frame["first_name"] + " " + frame["last_name"]
+    labels = [column for column in frame.columns if column.endswith("_rating")]
+    data = frame[["id", "name"] + labels][labels].to_numpy()
+    stds = data.std(axis=0)
+    return frame["id"].to_list(), (data - data.mean(axis=0)) / np.where(stds == 0, 1, stds)
+
+
 # This allows the test to be run from the command line
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,12 @@
+import json
 from api import models  # prevetn ciruclar import
 from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+from sqlmodel import Session
 from api.core.error import APIError
+from api.models.quiz.catalog import get_work_unit_catalog, refresh_work_unit_catalog
+from api.models.quiz.utils import work_unit_rows
 from test.utils import TESTPASS, TestApp, test_app  # noqa: F401
 
 
@@ -53,3 +59,161 @@ def test_quiz(test_app: TestApp):
     hmw, user, access_token = app.create_homeowner_with_token(hmw)
     reponse = app.api.get("quiz", headers={"Authorization": f"Bearer {access_token}"})
     assert reponse.status_code == status.HTTP_200_OK
+    with Session(app.db.engine) as db:
+        tree = models.WorkUnitView.tree(unit[0] for unit in models.WorkUnit.all(db))
+    # same document the route used to build per request
+    assert reponse.json() == json.loads(json.dumps(jsonable_encoder(tree)))
+
+    etag = reponse.headers["ETag"]
+    reponse = app.api.get(
+        "quiz", headers={"Authorization": f"Bearer {access_token}", "If-None-Match": etag}
+    )
+    assert reponse.status_code == status.HTTP_304_NOT_MODIFIED
+    assert reponse.headers["ETag"] == etag
+    assert reponse.headers["X-SQL-Statements"] == "0"
+
+    # the test client asks for gzip, each encoding has its own tag
+    assert etag.endswith('-gzip"')
+    reponse = app.api.get(
+        "quiz",
+        headers={"Authorization": f"Bearer {access_token}", "Accept-Encoding": "identity"},
+    )
+    assert "Content-Encoding" not in reponse.headers
+    assert reponse.headers["ETag"] == etag.replace("-gzip", "")
+    assert reponse.json() == json.loads(json.dumps(jsonable_encoder(tree)))
+
+
+def test_quiz_subtree_and_search(test_app: TestApp):
+    app: TestApp = test_app
+
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, user, access_token = app.create_homeowner_with_token(hmw)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    tree = app.api.get("quiz", headers=headers).json()
+
+    reponse = app.api.get("quiz/Indoors/Kitchen", headers=headers)
+    assert reponse.status_code == status.HTTP_200_OK
+    assert reponse.json() == tree["Indoors"]["Kitchen"]
+    reponse = app.api.get("quiz/Indoors/Kitchen/Appliances/Sinks", headers=headers)
+    assert reponse.json() == tree["Indoors"]["Kitchen"]["Appliances"]["Sinks"]
+    etag = reponse.headers["ETag"]
+    reponse = app.api.get(
+        "quiz/Indoors/Kitchen/Appliances/Sinks", headers={**headers, "If-None-Match": etag}
+    )
+    assert reponse.status_code == status.HTTP_304_NOT_MODIFIED
+    reponse = app.api.get("quiz/Indoors/Garage", headers=headers)
+    assert reponse.status_code == status.HTTP_404_NOT_FOUND
+
+    reponse = app.api.get("quiz/search", params={"q": "kitch sink"}, headers=headers)
+    assert reponse.status_code == status.HTTP_200_OK
+    units = reponse.json()["units"]
+    assert units
+    assert all(unit["work_unit"].startswith("Indoors:Kitchen:Appliances:Sinks") for unit in units)
+    # typo tolerant
+    reponse = app.api.get("quiz/search", params={"q": "plumer"}, headers=headers)
+    assert reponse.json()["professions"][0] == "Plumber"
+    reponse = app.api.get("quiz/search", params={"q": "zzzz"}, headers=headers)
+    assert reponse.json() == {"professions": [], "units": []}
+
+
+def test_db_pool_metrics(test_app: TestApp):
+    app: TestApp = test_app
+
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, user, access_token = app.create_homeowner_with_token(hmw)
+    response = app.api.get(
+        f"homeowner/{hmw.id}/public", headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = app.api.get("internal/db/pool")
+    assert response.status_code == status.HTTP_200_OK
+    stats = response.json()
+    assert stats["max_connections"] > 0
+    pools = {pool["name"]: pool for pool in stats["pools"]}
+    assert pools["sync"]["size"] == app.config.DB_POOL_SIZE
+    assert pools["sync"]["checkouts"] > 0
+    assert pools["async"]["checkouts"] > 0
+    assert pools["sync"]["timeouts"] == 0
+
+
+def test_sql_statement_counter(test_app: TestApp):
+    app: TestApp = test_app
+
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, user, access_token = app.create_homeowner_with_token(hmw)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = app.api.get(f"homeowner/{hmw.id}/public", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    # users lookup for the token, then the homeowner
+    assert response.headers["X-SQL-Statements"] == "2"
+    response = app.api.get(f"homeowner/{hmw.id}/public", headers=headers)
+    # principal is cached now
+    assert response.headers["X-SQL-Statements"] == "1"
+    assert float(response.headers["X-SQL-Time-Ms"]) > 0
+
+    routes = app.api.get("internal/db/queries").json()
+    route = routes["GET /homeowner/{hid}/public"]
+    assert route["requests"] >= 1
+    assert route["max_statements"] >= 1
+
+
+def test_sql_fingerprint_collapses_parameters():
+    from api.core.query_stats import fingerprint
+
+    first = fingerprint("SELECT * FROM users WHERE id = %(id_1)s LIMIT 10")
+    second = fingerprint("SELECT *  FROM users\nWHERE id = %(id_2)s LIMIT 20")
+    assert first == second
+
+
+def test_work_units_seeding_is_idempotent(test_app: TestApp):
+    app: TestApp = test_app
+
+    with Session(app.db.engine) as db:
+        before = len(models.WorkUnit.all(db))
+    assert before == len(work_unit_rows())
+    # a second boot (or a concurrent worker) finds every digest and inserts nothing
+    assert app.db.init_work_units() == 0
+    with Session(app.db.engine) as db:
+        assert len(models.WorkUnit.all(db)) == before
+
+
+def test_work_unit_catalog_matches_by_id(test_app: TestApp):
+    app: TestApp = test_app
+
+    with Session(app.db.engine) as db:
+        catalog = get_work_unit_catalog(db)
+        assert len(catalog) == len(models.WorkUnit.all(db))
+        # units out of id order used to get each other's names
+        ids = [catalog.ids[-1], catalog.ids[0], catalog.ids[len(catalog) // 2]]
+        units = [
+            {"work_unit_id": uid, "quantity": 1, "description": "", "booking_unit_id": None}
+            for uid in ids
+        ]
+        views = models.BookingUnitView.create(units, db)
+        for uid, view in zip(ids, views):
+            assert view.work_unit == models.WorkUnit.by_ids([uid], db)[0][0].concat()
+
+        profession = catalog.professions[0]
+        assert catalog.professions_to_ids([profession]) == sorted(
+            unit[0] for unit in models.WorkUnit.professions_to_ids([profession], db)
+        )
+
+        db.execute(
+            insert(models.WorkUnit).values(
+                area="Outdoors",
+                location="Yard",
+                category="Structure",
+                subcategory="Fences",
+                action="Repair",
+                quantity="Length",
+                profession="Fence Installer",
+            )
+        )
+        db.commit()
+        reloaded = refresh_work_unit_catalog(db)
+        assert reloaded is not catalog
+        assert reloaded.version != catalog.version
+        assert "Fence Installer" in reloaded.professions
+        # the old snapshot is untouched for whoever still holds it
+        assert "Fence Installer" not in catalog.professions
+        assert refresh_work_unit_catalog(db) is reloaded
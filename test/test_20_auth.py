@@ -1,6 +1,9 @@
 import time
+from sqlmodel import Session
 from fastapi import status
+from api.core.auth.cache import get_principal_cache
 from api.core.error import APIError
+from api.core.utils import PasswordHasherBusy, get_password_hasher
 import api.models as models
 from test.utils import (
     TESTPASS,
@@ -114,3 +117,94 @@ def test_contractor_expired_jwt_token(test_app_with_1_second_token: TestApp):
     )
     assert response.status_code == APIError.TokenException.status_code
     assert response.json()["detail"] == APIError.TokenException.detail
+
+
+def test_contractor_token_principal_cache(test_app: TestApp):
+    app = test_app
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    cnt, _, access_token = app.create_contractor_with_token(cnt)
+    before = app.api.get("internal/auth/cache").json()
+    for _ in range(3):
+        response = app.api.get(
+            f"contractor/{cnt.id}/public",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+    after = app.api.get("internal/auth/cache").json()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+
+
+def test_contractor_token_principal_cache_invalidation(test_app: TestApp):
+    app = test_app
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    cnt, user, access_token = app.create_contractor_with_token(cnt)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = app.api.get(f"contractor/{cnt.id}/public", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    with Session(app.db.engine) as db:
+        model = models.User.by_id(cnt.id, db)
+        model.role = models.UserRole.Homeowner
+        db.add(model)
+        db.commit()
+
+    response = app.api.get("contractor/booking/invites", headers=headers)
+    assert response.status_code == APIError.TokenException.status_code
+
+
+def test_principal_cache_invalidated_on_commit(test_app: TestApp):
+    app = test_app
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    cnt, _, access_token = app.create_contractor_with_token(cnt)
+    response = app.api.get(
+        f"contractor/{cnt.id}/public", headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    cache = get_principal_cache()
+
+    with Session(app.db.engine) as db:
+        model = models.User.by_id(cnt.id, db)
+        model.role = models.UserRole.Homeowner
+        db.add(model)
+        db.flush()
+        # uncommitted, the cached principal is still the truth
+        assert cache.get(access_token) is not None
+        db.rollback()
+    assert cache.get(access_token) is not None
+
+    with Session(app.db.engine) as db:
+        model = models.User.by_id(cnt.id, db)
+        model.role = models.UserRole.Homeowner
+        db.add(model)
+        db.commit()
+    assert cache.get(access_token) is None
+
+
+def test_token_password_check_runs_on_hasher_pool(test_app: TestApp):
+    app = test_app
+    before = app.api.get("internal/hasher").json()
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    app.create_contractor_with_token(cnt)
+    after = app.api.get("internal/hasher").json()
+    # one hash at signup, one verify at /token
+    assert after["completed"] - before["completed"] >= 2
+    assert after["depth"] == 0
+
+
+def test_signup_with_busy_hasher(test_app: TestApp, monkeypatch):
+    app = test_app
+
+    def busy(password):
+        raise PasswordHasherBusy()
+
+    monkeypatch.setattr(get_password_hasher(), "hash", busy)
+    for role, create in (
+        ("contractor", models.ContractorCreate),
+        ("homeowner", models.HomeownerCreate),
+    ):
+        user = create.mock(app.faky, TESTPASS)
+        user.password = user.password.get_secret_value()
+        response = app.api.post(f"{role}/signup", data=user.model_dump())
+        assert response.status_code == APIError.PasswordHasherBusy.status_code
+        assert response.headers["Retry-After"] == "1"
@@ -1,9 +1,11 @@
 from collections import Counter
 import json
 
+from sqlalchemy import text
 from sqlmodel import Session
 from api import models
 from fastapi import status
+from api.core import profile_check
 from api.core.error import APIError
 import api.models as models
 from test.utils import (
@@ -198,6 +200,43 @@ def test_contractor_get_public_view_with_preferences(test_app: TestApp):
     assert response.status_code == status.HTTP_200_OK
 
 
+
+def test_contractor_profile_follows_preferences(test_app: TestApp):
+    app: TestApp = test_app
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    cnt, user, access_token = app.create_contractor_with_token(cnt)
+    areas = sorted({app.faky.fake.postcode() for _ in range(3)})
+    with Session(app.db.engine) as db:
+        professions = sorted(row[0] for row in models.WorkUnit.all_professions(db)[:2])
+    preferences = models.ContractorPreferencesCreate(areas=areas, professions=professions)
+    app.create_contractor_preference(access_token, preferences)
+    response = app.api.get(
+        f"contractor/{cnt.id}/public",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    view = models.ContractorPublicView.model_validate_json(response.text)
+    assert view.professions == professions
+    assert view.areas == areas
+
+    with Session(app.db.engine) as db:
+        assert models.ContractorProfile.drift(db) == []
+        models.ContractorAreaPreference.clear(cnt.id, db)
+        db.commit()
+        _, stored_professions, stored_areas = models.Contractor.by_cid(cnt.id, db)
+        assert stored_professions == professions
+        assert stored_areas is None
+
+        # drift from outside the triggers is reported and repaired
+        db.execute(
+            text("UPDATE contractor_profiles SET professions = NULL WHERE contractor_id = :cid"),
+            {"cid": cnt.id},
+        )
+        db.commit()
+        assert profile_check.check(db) == 1
+        assert profile_check.check(db, fix=True) == 1
+        assert profile_check.check(db) == 0
+
 # def test_contractor_get_private_view_with_empty_preferences(test_app: TestApp):
 #     app: TestApp = test_app
 #     cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
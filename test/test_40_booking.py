@@ -2,6 +2,7 @@ import json
 from sqlmodel import Session
 from api import models
 from fastapi import status
+from api.core.consistency import CONSISTENCY_HEADER, parse_token
 from api.core.error import APIError
 from test.utils import (
     TESTPASS,
@@ -347,6 +348,32 @@ def test_homeowner_get_booking_list_with_no_bookings(test_app: TestApp):
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
 
+def test_homeowner_reads_own_booking_with_consistency_token(test_app: TestApp):
+    app: TestApp = test_app
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, _, hmw_token = app.create_homeowner_with_token(hmw)
+    booking = models.BookingDetailCreate.mock(app.faky, unit_count=1)
+    response = app.api.post(
+        "homeowner/booking",
+        headers={"Authorization": f"Bearer {hmw_token}"},
+        data={"booking": json.dumps(booking.model_dump())},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    token = response.headers[CONSISTENCY_HEADER]
+    assert parse_token(token) is not None
+    booking = models.HomeownerBookingDetailView.model_validate_json(response.text)
+
+    response = app.api.get(
+        "homeowner/bookings",
+        headers={"Authorization": f"Bearer {hmw_token}", CONSISTENCY_HEADER: token},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    bookings = models.HomeownerBookingList.model_validate_json(response.text)
+    assert [item.id for item in bookings.bookings] == [booking.id]
+    # reads don't commit, so they don't hand out a new token
+    assert CONSISTENCY_HEADER not in response.headers
+
+
 def test_homeowner_create_booking_with_images(test_app: TestApp):
     app: TestApp = test_app
     hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
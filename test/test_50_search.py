@@ -1,7 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import json
+import logging
 import time
+import uuid
+import numpy as np
 from sqlmodel import Session
 from fastapi import status
 from api import models
+from api.core import slow_query
+from api.config import get_config
+from api.core.search_engine.projection_engine import RecommendationEngine
+from api.models.matching import ContractorMatchIndex, build_match_index
+from api.models.rating_snapshot import RatingSnapshot
 from test.utils import (
     TESTPASS,
     TestApp,
@@ -337,4 +348,309 @@ def test_search_by_booking_with_matches(test_app: TestApp):
     assert response.status_code == status.HTTP_200_OK
     response = models.SearchContractorList.model_validate_json(response.text)
     assert len(response.contractors) == len(matches)
-    assert set([contractor.id for contractor in response.contractors]) == set(matches)
\ No newline at end of file
+    assert set([contractor.id for contractor in response.contractors]) == set(matches)
+
+def test_search_slow_query_log_captures_plan(test_app: TestApp, tmp_path, monkeypatch):
+    app: TestApp = test_app
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, _, hmw_token = app.create_homeowner_with_token(hmw)
+
+    path = str(tmp_path / "slow.log")
+    logger = logging.getLogger("test.slow_query")
+    logger.handlers = [logging.FileHandler(path)]
+    logger.propagate = False
+    # threshold 0: every statement is "slow"
+    slow_log = slow_query.SlowQueryLog(path, 0, True, logger)
+    monkeypatch.setattr(slow_query, "get_slow_query_log", lambda: slow_log)
+
+    filter = models.Filter(
+        professions=["Carpentry"], zipcode=app.faky.fake.zipcode(), units=None
+    )
+    response = app.api.post(
+        "contractor/search",
+        json=filter.model_dump(),
+        headers={"Authorization": f"Bearer {hmw_token}"},
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    records = [
+        record
+        for record in slow_query.read_log(path)
+        if record["route"] == "POST /contractor/search"
+    ]
+    assert records
+    search = max(records, key=lambda record: len(record["statement"]))
+    assert "contractor_area_preferences" in search["statement"]
+    # SELECTs get EXPLAIN ANALYZE, so the plan carries actual timings
+    assert "Actual Total Time" in search["plan"][0]["Plan"]
+    offenders = slow_query.worst(slow_query.read_log(path), top=1)
+    assert offenders[0]["count"] >= 1
+
+
+def test_slow_query_log_redacts_passwords(tmp_path):
+    path = str(tmp_path / "slow.log")
+    logger = logging.getLogger("test.slow_query_redaction")
+    logger.handlers = [logging.FileHandler(path)]
+    logger.propagate = False
+    slow_log = slow_query.SlowQueryLog(path, 0, False, logger)
+    insert = "INSERT INTO users (email, password) VALUES ($1, $2)"
+    named = "INSERT INTO users (email, password) VALUES (%(email)s, %(password)s)"
+    slow_log.observe(None, insert, ("a@b.c", "secret"), 1, False)
+    slow_log.observe(None, named, [{"email": "a@b.c", "password": "secret"}] * 20, 1, True)
+    slow_log.observe(None, insert, [("a@b.c", "secret")] * 3, 1, True)
+    slow_log.observe(None, "SELECT $1::int", (5,), 1, False)
+
+    with open(path) as file:
+        assert "secret" not in file.read()
+    records = list(slow_query.read_log(path))
+    assert records[0]["parameters"] == ["***", "***"]
+    assert len(records[1]["parameters"]) == 10
+    assert records[1]["parameters"][0] == {"email": "a@b.c", "password": "***"}
+    assert records[2]["parameters"] == [["***", "***"]] * 3
+    assert records[3]["parameters"] == [5]
+
+
+def test_match_index_follows_preference_writes(test_app: TestApp):
+    app: TestApp = test_app
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, _, hmw_token = app.create_homeowner_with_token(hmw)
+    headers = {"Authorization": f"Bearer {hmw_token}"}
+    cnt = models.ContractorCreate.mock(app.faky, TESTPASS)
+    cnt, _, _ = app.create_contractor_with_token(cnt)
+    # Filter.zipcode is an int, no leading zeros
+    zipcode = str(app.faky.fake.random_int(10000, 99999))
+
+    with Session(app.db.engine) as db:
+        profession = models.WorkUnit.all_professions(db)[0][0]
+        filter = models.Filter(professions=[profession], zipcode=zipcode)
+        response = app.api.post("contractor/search", json=filter.model_dump(), headers=headers)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        # written behind the API's back, the triggers still log it for the index
+        models.ContractorUnitPreference.create_from_professions(cnt.id, [profession], db)
+        models.ContractorAreaPreference.create(cnt.id, [zipcode], db)
+        db.commit()
+        response = app.api.post("contractor/search", json=filter.model_dump(), headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        contractors = models.SearchContractorList.model_validate_json(response.text).contractors
+        assert [contractor.id for contractor in contractors] == [cnt.id]
+        assert contractors[0].professions == [profession]
+        assert contractors[0].areas == [zipcode]
+        sql = models.Filter.by_units_and_area([profession], zipcode, db)
+        assert [row[0].id for row in sql] == [cnt.id]
+
+        models.ContractorAreaPreference.clear(cnt.id, db)
+        db.commit()
+        response = app.api.post("contractor/search", json=filter.model_dump(), headers=headers)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+def test_match_index_shares_published_ratings(test_app: TestApp, tmp_path, monkeypatch):
+    app: TestApp = test_app
+    config = get_config()
+    monkeypatch.setattr(config, "MATCH_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "MATCH_SNAPSHOT_CHECK_SECONDS", 0)
+    with Session(app.db.engine) as db:
+        profession = models.WorkUnit.all_professions(db)[0][0]
+        [contractor] = add_matching_contractors(db, profession, "10001", [(1, 1, 1)])
+
+    first = ContractorMatchIndex.build(app.db.engine)
+    second = ContractorMatchIndex.build(app.db.engine)
+    # the second worker maps the first one's ratings instead of reading them again
+    assert isinstance(second.ranking.ratings, np.memmap)
+    assert second.snapshot.version == first.snapshot.version
+    assert second.cids == first.cids
+    assert ratings_of(second, contractor.id) == [1, 1, 1]
+
+    with Session(app.db.engine) as db:
+        db.get(models.Contractor, contractor.id).quality_rating = 5
+        db.commit()
+        second.refresh(db)
+    assert ratings_of(second, contractor.id) == [5, 1, 1]
+    # changes go to the worker's own delta, the published version is untouched
+    published = RatingSnapshot.current(second.snapshot.directory)
+    assert published.ratings[:, second.ordinals[contractor.id]].tolist() == [1, 1, 1]
+    assert not second.stale()
+
+    # too old to replay from: the next build publishes a version the others move to
+    monkeypatch.setattr(config, "MATCH_CHANGES_RETENTION_HOURS", 0)
+    third = ContractorMatchIndex.build(app.db.engine)
+    assert third.snapshot.version != second.snapshot.version
+    assert ratings_of(third, contractor.id) == [5, 1, 1]
+    assert second.snapshot.superseded()
+
+
+def test_match_index_rebuilds_once_when_stale(test_app: TestApp, monkeypatch):
+    app: TestApp = test_app
+    index = build_match_index(app.db.engine)
+    assert build_match_index(app.db.engine) is index
+
+    monkeypatch.setattr(index, "synced_at", index.synced_at - 10**9)
+    builds = []
+    build = ContractorMatchIndex.build
+
+    def counted(engine):
+        builds.append(engine)
+        return build(engine)
+
+    monkeypatch.setattr(ContractorMatchIndex, "build", staticmethod(counted))
+    # requests that all found it stale get the one rebuilt index
+    with ThreadPoolExecutor(4) as pool:
+        indexes = list(pool.map(lambda _: build_match_index(app.db.engine), range(4)))
+    assert len(builds) == 1
+    assert indexes[0] is not index and all(built is indexes[0] for built in indexes)
+
+
+def ratings_of(index: ContractorMatchIndex, cid: uuid.UUID) -> list:
+    return index.ranking.gather(np.array([index.ordinals[cid]]))[0][:, 0].tolist()
+
+
+def add_matching_contractors(db: Session, profession: str, zipcode: str, ratings: list):
+    """A contractor per (quality, budget, on schedule) rating, covering `profession` in `zipcode`"""
+    contractors = []
+    for quality, budget, on_schedule in ratings:
+        cid = uuid.uuid4()
+        db.add(
+            models.User(
+                id=cid,
+                email=f"{cid}@page.test",
+                phone_number=str(cid),
+                password=TESTPASS,
+                role=models.UserRole.Contractor,
+            )
+        )
+        contractor = models.Contractor(
+            id=cid,
+            first_name="c",
+            last_name="c",
+            quality_rating=quality,
+            budget_rating=budget,
+            on_schedule_rating=on_schedule,
+        )
+        db.add(contractor)
+        models.ContractorUnitPreference.create_from_professions(cid, [profession], db)
+        models.ContractorAreaPreference.create(cid, [zipcode], db)
+        contractors.append(contractor)
+    db.commit()
+    for contractor in contractors:
+        db.refresh(contractor)
+    return contractors
+
+
+def test_search_pages_follow_the_sort(test_app: TestApp):
+    app: TestApp = test_app
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, _, hmw_token = app.create_homeowner_with_token(hmw)
+    headers = {"Authorization": f"Bearer {hmw_token}"}
+    zipcode = str(app.faky.fake.random_int(10000, 99999))
+    with Session(app.db.engine) as db:
+        profession = models.WorkUnit.all_professions(db)[0][0]
+        contractors = add_matching_contractors(
+            db, profession, zipcode, [(3, 0, 0), (5, 0, 0), (3, 0, 0), (1, 0, 0), (5, 0, 0)]
+        )
+        cids = [(contractor.quality_rating, contractor.id) for contractor in contractors]
+    filter = models.Filter(professions=[profession], zipcode=zipcode)
+
+    def pages(sort: str):
+        params, seen = {"sort": sort, "limit": 2}, []
+        while True:
+            response = app.api.post(
+                "contractor/search", json=filter.model_dump(), params=params, headers=headers
+            )
+            assert response.status_code == status.HTTP_200_OK
+            page = models.SearchContractorList.model_validate_json(response.text)
+            assert len(page.contractors) <= 2
+            seen += [(contractor.quality_rating, contractor.id) for contractor in page.contractors]
+            if page.next is None:
+                return seen
+            params["cursor"] = page.next
+
+    assert pages("quality_rating") == sorted(cids, reverse=True)
+    assert [cid for _, cid in pages("id")] == sorted(cid for _, cid in cids)
+
+    response = app.api.post(
+        "contractor/search",
+        json=filter.model_dump(),
+        params={"sort": "quality_rating", "limit": 2},
+        headers=headers,
+    )
+    cursor = models.SearchContractorList.model_validate_json(response.text).next
+    cid = str(cids[0][1])
+    malformed = [
+        ("id", 5),
+        ("id", ["id", None, 5, None]),
+        ("id", ["id", None, None, None]),
+        ("quality_rating", ["quality_rating", "5", cid, None]),
+        ("quality_rating", ["quality_rating", None, cid, None]),
+        ("quality_rating", ["quality_rating", True, cid, None]),
+    ]
+    params = [{"sort": "id", "cursor": cursor}, {"cursor": "not-a-cursor"}] + [
+        {"sort": sort, "cursor": base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()}
+        for sort, raw in malformed
+    ]
+    for param in params:
+        response = app.api.post(
+            "contractor/search", json=filter.model_dump(), params=param, headers=headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "WWW-Authenticate" not in response.headers
+
+
+def test_search_by_booking_recommended(test_app: TestApp):
+    app: TestApp = test_app
+    hmw = models.HomeownerCreate.mock(app.faky, TESTPASS)
+    hmw, _, hmw_token = app.create_homeowner_with_token(hmw)
+    headers = {"Authorization": f"Bearer {hmw_token}"}
+    zipcode = str(app.faky.fake.random_int(10000, 99999))
+    with Session(app.db.engine) as db:
+        profession = models.WorkUnit.all_professions(db)[0][0]
+        units = [
+            models.BookingUnitCreate(work_unit_id=unit[0], quantity=1, description="d")
+            for unit in models.WorkUnit.professions_to_ids([profession], db)
+        ]
+        booking = models.BookingDetailCreate(
+            title="t", zipcode=zipcode, units=units, captions=[], address="a"
+        )
+        ratings = [(5, 1, 2), (2, 5, 5), (4, 4, 0), (0, 0, 5), (3, 3, 3), (5, 1, 2)]
+        contractors = add_matching_contractors(db, profession, zipcode, ratings)
+    booking_view = app.create_homeowner_booking(hmw_token, booking)
+
+    weights = {"quality_rating": 2.0, "on_schedule_rating": 1.0}
+    engine = RecommendationEngine(SQL_Model=contractors)
+    engine.set_dynamic_vector(weights)
+    scores = engine.scores()
+    ranked = sorted(range(len(contractors)), key=lambda row: (-scores[row], contractors[row].id))
+    expected = [contractors[row].id for row in ranked]
+    url = f"contractor/{booking_view.id}/search"
+
+    params = {
+        "sort": "recommended",
+        "limit": 4,
+        "weights": ",".join(f"{label}:{value}" for label, value in weights.items()),
+    }
+    seen = []
+    while True:
+        response = app.api.get(url, params=params, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        page = models.SearchContractorList.model_validate_json(response.text)
+        seen += [contractor.id for contractor in page.contractors]
+        if page.next is None:
+            break
+        params["cursor"] = page.next
+    assert seen == expected
+
+    # a rating update reaches the index through the contractors trigger
+    with Session(app.db.engine) as db:
+        last = db.get(models.Contractor, expected[-1])
+        last.quality_rating, last.on_schedule_rating = 5, 5
+        db.add(last)
+        db.commit()
+    params.pop("cursor")
+    response = app.api.get(url, params=params, headers=headers)
+    page = models.SearchContractorList.model_validate_json(response.text)
+    assert page.contractors[0].id == expected[-1]
+
+    for weights in ("speed:1", "quality_rating:nan", "quality_rating:-inf", "quality_rating:1e9"):
+        params["weights"] = weights
+        response = app.api.get(url, params=params, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,270 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import uuid
+import numpy as np
+import pandas as pd
+from api.core.review_scorer import ReviewScorer, ReviewScorerBusy
+
+try:
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizer
+    from api.core.search_engine import rating_export
+    from api.core.search_engine.text_scaler_engine import (
+        LABELS,
+        EmbeddingCache,
+        RatingRegressor,
+        TextScalerEngine,
+        predictor,
+    )
+except ImportError:
+    torch = None
+
+WORDS = ["the", "food", "was", "great", "bad", "cold", "tasty", "patio", "loud", "menu"]
+
+
+def tiny_model(directory):
+    # randomly initialized, nothing to download
+    vocab = os.path.join(directory, "vocab.txt")
+    with open(vocab, "w") as file:
+        file.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS]))
+    config = BertConfig(
+        vocab_size=len(WORDS) + 5,
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+    )
+    torch.manual_seed(0)
+    return RatingRegressor(BertModel(config)), BertTokenizer(vocab)
+
+
+def reviews(count, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.uniform(1, 5, (count, len(LABELS))), columns=LABELS)
+    # the numbers only make every text distinct, they tokenize to [UNK]
+    frame["text"] = [
+        " ".join(rng.choice(WORDS, rng.integers(2, 12))) + f" {seed}-{i}" for i in range(count)
+    ]
+    return frame
+
+
+@unittest.skipIf(torch is None, "needs the rec_engine dependencies")
+class TestTextScalerEngine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.model, self.tokenizer = tiny_model(self.directory.name)
+        self.cache = EmbeddingCache.for_model(self.directory.name, self.model.bert, self.tokenizer)
+        self.calls = 0
+
+        def count_calls(module, args):
+            self.calls += 1
+
+        self.model.bert.register_forward_pre_hook(count_calls)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_embedding_cache(self):
+        frame = reviews(40)
+        engine = TextScalerEngine(frame, self.model, self.tokenizer, cache=self.cache)
+        embeddings = engine.embed(batch_size=8)
+        self.assertEqual(embeddings.shape, (40, 16))
+        self.assertEqual(self.calls, 5)
+
+        # the same pooled outputs as running BERT on each review alone
+        self.model.eval()
+        with torch.no_grad():
+            for i in (0, 17, 39):
+                encodings = engine.tokenize([frame["text"][i]])
+                pooled = self.model.embed(encodings["input_ids"], encodings["attention_mask"])
+                np.testing.assert_allclose(embeddings[i], pooled[0].numpy(), atol=1e-5)
+
+        # a new engine over the same directory, with 10 new reviews, embeds only those
+        more = pd.concat([frame, reviews(10, seed=1)], ignore_index=True)
+        cache = EmbeddingCache.for_model(self.directory.name, self.model.bert, self.tokenizer)
+        self.assertEqual(len(cache), 40)
+        self.calls = 0
+        engine = TextScalerEngine(more, self.model, self.tokenizer, cache=cache)
+        updated = engine.embed(batch_size=8)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(len(cache), 50)
+        np.testing.assert_array_equal(updated[:40], embeddings)
+
+    def test_embedding_cache_per_checkpoint(self):
+        engine = TextScalerEngine(reviews(10), self.model, self.tokenizer, cache=self.cache)
+        engine.embed(batch_size=8)
+        same = EmbeddingCache.for_model(self.directory.name, self.model.bert, self.tokenizer)
+        self.assertEqual(same.directory, self.cache.directory)
+
+        # the same config with other weights, or another vocabulary, starts empty
+        other, tokenizer = tiny_model(tempfile.mkdtemp(dir=self.directory.name))
+        with torch.no_grad():
+            other.bert.embeddings.word_embeddings.weight.add_(1)
+        cache = EmbeddingCache.for_model(self.directory.name, other.bert, tokenizer)
+        self.assertNotEqual(cache.directory, self.cache.directory)
+        self.assertEqual(len(cache), 0)
+        tokenizer.add_tokens(["terrace"])
+        vocab = EmbeddingCache.for_model(self.directory.name, self.model.bert, tokenizer)
+        self.assertNotEqual(vocab.directory, self.cache.directory)
+
+    def test_length_bucketed_batches(self):
+        frame = reviews(100)
+        engine = TextScalerEngine(frame, self.model, self.tokenizer)
+        store = engine.tokens()
+        for i in (0, 42, 99):
+            tokens = store.tokens[store.offsets[i] : store.offsets[i + 1]].tolist()
+            self.assertEqual(tokens, self.tokenizer(frame["text"][i])["input_ids"])
+
+        train_loader, val_loader = engine.create_data_loaders(test_size=0.2, batch_size=8)
+        sizes = []
+        for batch in train_loader:
+            # padded to the batch's own longest review
+            mask = batch["attention_mask"]
+            self.assertEqual(mask.shape[1], mask.sum(dim=1).max().item())
+            sizes.append(len(mask))
+        self.assertEqual(sum(sizes), 80)
+
+        # the same predictions as reviews padded to the longest of the corpus
+        dataset = val_loader.dataset
+        rows = dataset.indices[next(iter(val_loader.batch_sampler))]
+        batch = next(iter(val_loader))
+        padded = engine.tokenize(frame["text"].tolist())
+        self.model.eval()
+        with torch.no_grad():
+            bucketed = self.model(batch["input_ids"], batch["attention_mask"])
+            full = self.model(padded["input_ids"][rows], padded["attention_mask"][rows])
+        np.testing.assert_allclose(bucketed.numpy(), full.numpy(), atol=1e-5)
+        np.testing.assert_allclose(batch["labels"].numpy(), frame[LABELS].values[rows], 1e-6)
+
+        self.calls = 0
+        engine.train(train_loader, val_loader, epochs=1)
+        self.assertEqual(self.calls, len(train_loader) + len(val_loader))
+
+    def test_train_on_cached_embeddings(self):
+        engine = TextScalerEngine(reviews(60), self.model, self.tokenizer, cache=self.cache)
+        bert = {name: param.clone() for name, param in self.model.bert.named_parameters()}
+        regressor = self.model.regressor.weight.clone()
+        train_loader, val_loader = engine.create_data_loaders(test_size=0.2, batch_size=8)
+        self.calls = 0
+        engine.train(train_loader, val_loader, epochs=5)
+
+        # the epochs never ran BERT, only its head learned
+        self.assertEqual(self.calls, 0)
+        self.assertFalse(torch.equal(regressor, self.model.regressor.weight))
+        for name, param in self.model.bert.named_parameters():
+            self.assertTrue(torch.equal(bert[name], param), name)
+
+    def test_review_scorer(self):
+        texts = reviews(12)["text"].tolist()
+        written = []
+        scorer = ReviewScorer(predictor(self.model, self.tokenizer, 1), written.extend, 8, 50, 0)
+        keys = [uuid.uuid4() for _ in texts]
+        futures = [scorer.submit(key, text) for key, text in zip(keys, texts)]
+        scores = [future.result(timeout=30) for future in futures]
+        scorer.close()
+
+        # batched with padding, the same outputs as each text alone
+        with torch.no_grad():
+            for text, row in zip(texts, scores):
+                encodings = self.tokenizer([text], return_tensors="pt")
+                alone = self.model(encodings["input_ids"], encodings["attention_mask"])
+                np.testing.assert_allclose(row, alone[0].numpy(), atol=1e-5)
+        self.assertEqual(dict(written), dict(zip(keys, scores)))
+        self.assertEqual(scorer.stats()["batch_size"]["buckets"]["le_8"], 1)
+
+    def test_quantized_and_onnx_parity(self):
+        input_ids, attention_mask = rating_export.sample_inputs(len(WORDS) + 5, 8, 32)
+        attention_mask[::2, 20:] = 0
+        candidates = rating_export.backends(self.model, self.directory.name, threads=1)
+        errors = {
+            name: rating_export.max_error(backend, candidates["fp32"], input_ids, attention_mask)
+            for name, backend in candidates.items()
+        }
+        # onnxruntime is optional, the torch backends are always there
+        self.assertLessEqual({"fp32", "int8"}, set(errors))
+        self.assertEqual(errors["fp32"], 0)
+        self.assertLess(errors["int8"], 0.05)
+        self.assertLess(errors.get("onnx", 0), 1e-4)
+        self.assertLess(errors.get("onnx-int8", 0), 0.05)
+        chosen = rating_export.fastest(
+            self.model, self.directory.name, input_ids, attention_mask, threads=1, runs=2
+        )
+        self.assertIn(chosen.name, candidates)
+
+        # the first "auto" pick is saved, later ones build it without timing
+        picked = rating_export.select_backend(self.model, self.directory.name, threads=1)
+        with mock.patch.object(rating_export, "fastest") as fastest:
+            again = rating_export.select_backend(self.model, self.directory.name, threads=1)
+        fastest.assert_not_called()
+        self.assertEqual(again.name, picked.name)
+
+        # predictors run any backend the same way
+        texts = reviews(4)["text"].tolist()
+        scores = predictor(chosen, self.tokenizer)(texts)
+        np.testing.assert_allclose(scores, predictor(self.model, self.tokenizer)(texts), atol=0.05)
+
+
+def sums(texts):
+    return [[len(text), text.count(" ")] for text in texts]
+
+
+class TestReviewScorer(unittest.TestCase):
+    def test_batches_by_size_and_deadline(self):
+        batches = []
+
+        def predict(texts):
+            batches.append(len(texts))
+            return sums(texts)
+
+        written = []
+        scorer = ReviewScorer(predict, written.extend, 4, 200, 0)
+        keys = [uuid.uuid4() for _ in range(10)]
+        futures = [scorer.submit(key, "a b" * i) for i, key in enumerate(keys)]
+        scores = [future.result(timeout=5) for future in futures]
+        self.assertEqual(scores, sums(["a b" * i for i in range(10)]))
+        # full batches right away, the rest once the first of it waited 200ms
+        self.assertEqual(batches, [4, 4, 2])
+        self.assertEqual([key for key, _ in written], keys)
+
+        batches.clear()
+        scorer.submit(uuid.uuid4(), "late").result(timeout=5)
+        self.assertEqual(batches, [1])
+        scorer.close()
+        stats = scorer.stats()
+        self.assertEqual(stats["completed"], 11)
+        self.assertEqual(stats["batch_size"]["count"], 4)
+        self.assertGreaterEqual(stats["queue_wait_ms"]["max"], 150)
+        self.assertEqual(stats["latency_ms"]["count"], 11)
+
+    def test_busy_and_failures(self):
+        started, release = threading.Event(), threading.Event()
+
+        def predict(texts):
+            started.set()
+            release.wait(5)
+            if "bad" in texts:
+                raise ValueError("bad")
+            return sums(texts)
+
+        scorer = ReviewScorer(predict, lambda results: None, 1, 0, 2)
+        first = scorer.submit(uuid.uuid4(), "first")
+        started.wait(5)
+        # one running, two waiting, the next is turned away
+        bad = scorer.submit(uuid.uuid4(), "bad")
+        scorer.submit(uuid.uuid4(), "third")
+        with self.assertRaises(ReviewScorerBusy):
+            scorer.submit(uuid.uuid4(), "fourth")
+        release.set()
+        self.assertEqual(first.result(timeout=5), [5, 0])
+        with self.assertRaises(ValueError):
+            bad.result(timeout=5)
+        scorer.close(timeout=5)
+        stats = scorer.stats()
+        self.assertEqual((stats["completed"], stats["failed"], stats["rejected"]), (2, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ import shutil
 import uuid
 
 import httpx
+from api.core.auth.cache import get_principal_cache
 from api.core.auth.utils import Token, TokenData
 import api.models as models
 from fastapi import FastAPI, status
@@ -45,6 +46,9 @@ class TestApp:
         testapp.api = TestClient(
             api, base_url=f"http://testserver{testapp.config.ROOT_PATH}"
         )
+        # keep a single event loop for the whole test, pooled asyncpg
+        # connections are bound to the loop that opened them
+        testapp.api.__enter__()
         testapp.db = db
         with Session(db.engine) as session:
             testapp.faky = create_faky(session)
@@ -195,7 +199,10 @@ class TestApp:
 
     def cleanup(self):
         # time.sleep(10000)
+        if isinstance(self.api, TestClient):
+            self.api.__exit__(None, None, None)
         SQLModel.metadata.drop_all(self.db.engine)
+        get_principal_cache().clear()
         try:
             shutil.rmtree("img/")
         except OSError: